@@ -0,0 +1,48 @@
+import sys
+
+import psycopg2.extras
+from django.db.backends.postgresql.base import DatabaseWrapper as PostgresDatabaseWrapper
+from psycopg2 import extensions
+
+from .pool import gevent_wait_callback, get_pool
+
+# воркер Celery с -P gevent патчит процесс до первого обращения к базе, тогда и psycopg2 уступает цикл gevent
+if 'gevent.monkey' in sys.modules and sys.modules['gevent.monkey'].is_module_patched('socket'):
+    extensions.set_wait_callback(gevent_wait_callback)
+
+
+def connect(conn_params):
+    connection = psycopg2.connect(**conn_params)
+    # как в get_new_connection бэкенда Django, один раз на физическое соединение
+    psycopg2.extras.register_default_jsonb(conn_or_curs=connection, loads=lambda x: x)
+    return connection
+
+
+class DatabaseWrapper(PostgresDatabaseWrapper):
+    """
+    PostgreSQL backend that takes connections from a per-process pool and returns them on close().
+
+    Django closes the connection at the end of every request and Celery task (CONN_MAX_AGE = 0), so a connection is
+    held only while it is used and the TCP + authentication handshake is paid once per pooled connection instead of
+    once per request. Pool limits come from the POOL dict of the database settings.
+    """
+
+    pool = None
+
+    def get_new_connection(self, conn_params):
+        self.pool = get_pool(self.alias, self.settings_dict.get('POOL', {}), conn_params, connect)
+        connection = self.pool.checkout()
+        options = self.settings_dict['OPTIONS']
+        try:
+            self.isolation_level = options['isolation_level']
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.checkin(self.connection)
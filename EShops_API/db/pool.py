@@ -0,0 +1,233 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions
+
+from orders import metrics
+
+logger = logging.getLogger(__name__)
+
+wait_time = metrics.Timer('db.pool.wait', 'Ожидание соединения из пула')
+opened = metrics.counter('db.pool.opened', 'Открыто новых соединений с базой')
+timeouts = metrics.counter('db.pool.timeout', 'Соединение не получено за POOL TIMEOUT')
+unhealthy = metrics.counter('db.pool.unhealthy', 'Соединение из пула не прошло проверку и закрыто')
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    pass
+
+
+class ConnectionPool:
+    """
+    Pool of open psycopg2 connections shared by the threads (greenlets under gevent) of one process.
+
+    Up to max_size idle connections are kept open, max_overflow more can be opened under load and are closed when
+    returned. A connection idle for longer than check_idle seconds is pinged with SELECT 1 before it is handed out,
+    one older than recycle seconds is reopened. threading.Condition becomes greenlet-aware once gevent monkey-patches
+    the process, so the same pool works in Celery workers started with -P gevent.
+    """
+
+    def __init__(self, connect, max_size=10, max_overflow=10, timeout=5, recycle=None, check_idle=30):
+        self.connect = connect
+        self.max_size = max_size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.check_idle = check_idle
+        self.pid = os.getpid()
+        # параметры подключения, с которыми пул создан get_pool
+        self.params = None
+        # (соединение, когда вернули в пул), последнее вернувшееся выдаётся первым
+        self._idle = deque()
+        self._created = {}
+        self._in_use = 0
+        self._opening = 0
+        self._cond = threading.Condition()
+
+    def checkout(self):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        connection = None
+        with self._cond:
+            while True:
+                if self._idle:
+                    connection, released = self._idle.pop()
+                    break
+                if len(self._created) + self._opening < self.max_size + self.max_overflow:
+                    self._opening += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    timeouts.incr()
+                    raise PoolTimeout(f'No database connection available in {self.timeout} s, '
+                                      f'{self._in_use} of {self.max_size + self.max_overflow} are in use')
+                self._cond.wait(remaining)
+            self._in_use += 1
+        wait_time.observe(time.monotonic() - started)
+
+        if connection is not None and not self.healthy(connection, released):
+            unhealthy.incr()
+            self.discard(connection)
+            with self._cond:
+                self._opening += 1
+            connection = None
+        if connection is None:
+            connection = self.open()
+        return connection
+
+    def open(self):
+        try:
+            connection = self.connect()
+        except BaseException:
+            with self._cond:
+                self._opening -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        opened.incr()
+        with self._cond:
+            self._opening -= 1
+            self._created[connection] = time.monotonic()
+        return connection
+
+    def healthy(self, connection, released):
+        if connection.closed:
+            return False
+        now = time.monotonic()
+        if self.recycle is not None and now - self._created[connection] > self.recycle:
+            return False
+        if now - released <= self.check_idle:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            reset(connection)
+        except psycopg2.Error as error:
+            logger.warning('Pooled connection is broken: %s', error)
+            return False
+        return True
+
+    def checkin(self, connection):
+        if os.getpid() != self.pid:
+            return
+        try:
+            reset(connection)
+            usable = not connection.closed
+        except psycopg2.Error:
+            usable = False
+        with self._cond:
+            self._in_use -= 1
+            keep = usable and len(self._idle) < self.max_size
+            if keep:
+                self._idle.append((connection, time.monotonic()))
+            else:
+                self._created.pop(connection, None)
+            self._cond.notify()
+        if not keep:
+            close(connection)
+
+    def retire(self):
+        """
+        Пул больше не выдаёт соединений: простаивающие закрываются сейчас, выданные - когда вернутся
+        """
+        with self._cond:
+            self.max_size = 0
+            idle, self._idle = self._idle, deque()
+            for connection, _ in idle:
+                self._created.pop(connection, None)
+        for connection, _ in idle:
+            close(connection)
+
+    def discard(self, connection):
+        with self._cond:
+            self._created.pop(connection, None)
+        close(connection)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': len(self._created),
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'max_size': self.max_size,
+                'max_overflow': self.max_overflow,
+            }
+
+
+def reset(connection):
+    # незавершённая транзакция не должна достаться следующему запросу
+    if connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+        connection.rollback()
+
+
+def close(connection):
+    try:
+        connection.close()
+    except psycopg2.Error:
+        pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+# пулы, унаследованные от родителя при fork: их соединения нельзя ни использовать, ни закрывать
+# (закрытие завершит сессию родителя), поэтому ссылки просто держим до конца процесса
+_inherited = []
+
+
+def get_pool(alias, options, conn_params, connect):
+    """
+    Пул соединений псевдонима alias, connect(conn_params) открывает новое соединение. Если параметры подключения
+    поменялись (например, тесты переключили NAME на test_*), старый пул выводится из работы и создаётся новый
+    """
+    params = repr(sorted(conn_params.items()))
+    pool = _pools.get(alias)
+    if pool is not None and pool.pid == os.getpid() and pool.params == params:
+        return pool
+    with _pools_lock:
+        pool = _pools.get(alias)
+        if pool is None or pool.pid != os.getpid() or pool.params != params:
+            if pool is not None and pool.pid != os.getpid():
+                _inherited.append(pool)
+            elif pool is not None:
+                pool.retire()
+            pool = _pools[alias] = ConnectionPool(
+                lambda: connect(conn_params),
+                max_size=options.get('MAX_SIZE', 10),
+                max_overflow=options.get('MAX_OVERFLOW', 10),
+                timeout=options.get('TIMEOUT', 5),
+                recycle=options.get('RECYCLE'),
+                check_idle=options.get('CHECK_IDLE', 30),
+            )
+            pool.params = params
+    return pool
+
+
+def pool_stats():
+    """
+    Состояние пулов этого процесса: в каждом воркере свои соединения, поэтому это не общий счётчик
+    """
+    return {f'db.pool.{alias}.{name}': value
+            for alias, pool in sorted(_pools.items()) if pool.pid == os.getpid()
+            for name, value in pool.stats().items()}
+
+
+def gevent_wait_callback(connection, timeout=None):
+    """
+    Ожидание ответа базы через цикл gevent вместо блокировки всего процесса
+    """
+    from gevent.socket import wait_read, wait_write
+
+    while True:
+        state = connection.poll()
+        if state == extensions.POLL_OK:
+            break
+        if state == extensions.POLL_READ:
+            wait_read(connection.fileno(), timeout=timeout)
+        elif state == extensions.POLL_WRITE:
+            wait_write(connection.fileno(), timeout=timeout)
+        else:
+            raise psycopg2.OperationalError(f'Bad result from poll: {state!r}')
@@ -0,0 +1,114 @@
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+from orders import metrics
+
+logger = logging.getLogger(__name__)
+
+replica_reads = metrics.counter('db.replica.read', 'Запрос читает с реплики')
+lag_fallbacks = metrics.counter('db.replica.fallback', 'Все реплики отстают или недоступны, чтение с основной базы')
+
+# псевдоним базы для чтения в текущем запросе, None - основная
+_read_alias = ContextVar('read_alias', default=None)
+
+# Отставание реплики в секундах. Без новых записей на основной базе pg_last_xact_replay_timestamp() стареет,
+# поэтому, если реплика проиграла всё полученное, отставание считается нулевым
+LAG_SQL = """
+    SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END
+"""
+
+_lags = {}
+_lags_lock = threading.Lock()
+
+
+def replica_lag(alias):
+    """
+    Отставание реплики alias в секундах, замер живёт REPLICA_LAG_CHECK_INTERVAL секунд. Недоступная реплика - inf
+    """
+    now = time.monotonic()
+    checked = _lags.get(alias)
+    if checked is not None and now - checked[0] < settings.REPLICA_LAG_CHECK_INTERVAL:
+        return checked[1]
+
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        lag = 0.0
+    else:
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(LAG_SQL)
+                lag = float(cursor.fetchone()[0])
+        except DatabaseError as error:
+            logger.warning('Replica %s is unavailable: %s', alias, error)
+            lag = float('inf')
+    with _lags_lock:
+        _lags[alias] = (now, lag)
+    return lag
+
+
+def choose_replica():
+    """
+    Случайная реплика с отставанием не больше REPLICA_MAX_LAG секунд или None
+    """
+    replicas = list(settings.DATABASE_REPLICAS)
+    random.shuffle(replicas)
+    for alias in replicas:
+        if replica_lag(alias) <= settings.REPLICA_MAX_LAG:
+            return alias
+    if replicas:
+        lag_fallbacks.incr()
+    return None
+
+
+@contextmanager
+def read_from_replica():
+    """
+    Чтения моделей внутри блока идут на реплику, записи - всегда на основную базу
+    """
+    alias = choose_replica()
+    if alias is not None:
+        replica_reads.incr()
+    token = _read_alias.set(alias)
+    try:
+        yield alias
+    finally:
+        _read_alias.reset(token)
+
+
+@contextmanager
+def read_from_primary():
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Sends reads to a replica inside read_from_replica() and everything else to the primary.
+
+    Replicas are copies of the primary, so nothing is migrated on them and relations between the aliases are allowed.
+    """
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
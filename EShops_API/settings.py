@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/4.0/ref/settings/
 from pathlib import Path
 import os
 
+from kombu import Queue
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -37,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'rest_framework',
     'django_rest_passwordreset',
@@ -56,6 +59,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'orders.throttling.RateLimitHeadersMiddleware',
+    'orders.replicas.ReplicaStickinessMiddleware',
 ]
 
 ROOT_URLCONF = 'EShops_API.urls'
@@ -84,16 +89,44 @@ WSGI_APPLICATION = 'EShops_API.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        # postgresql с пулом соединений на процесс, см. EShops_API/db
+        'ENGINE': 'EShops_API.db',
         'NAME': os.environ.get('db_name'),
         'HOST': '127.0.0.1',
         'PORT': '5432',
         'USER': os.environ.get('db_user'),
-        'PASSWORD': os.environ.get('db_pass')
+        'PASSWORD': os.environ.get('db_pass'),
+        # соединение возвращается в пул после каждого запроса и задачи
+        'CONN_MAX_AGE': 0,
+        'POOL': {
+            # сколько соединений держать открытыми и сколько ещё можно открыть под нагрузкой
+            'MAX_SIZE': int(os.environ.get('db_pool_size', 10)),
+            'MAX_OVERFLOW': int(os.environ.get('db_pool_overflow', 10)),
+            # сколько секунд ждать свободное соединение
+            'TIMEOUT': float(os.environ.get('db_pool_timeout', 5)),
+            # соединение, простоявшее дольше CHECK_IDLE секунд, проверяется SELECT 1, старше RECYCLE - переоткрывается
+            'CHECK_IDLE': 30,
+            'RECYCLE': 3600,
+        },
     }
 }
 
 
+# READ REPLICAS
+# реплики для каталога и отчётов продавцов, через запятую: db_replica_hosts=10.0.0.2,10.0.0.3
+DATABASE_REPLICAS = []
+for number, host in enumerate(filter(None, os.environ.get('db_replica_hosts', '').split(',')), 1):
+    DATABASES[f'replica_{number}'] = {**DATABASES['default'], 'HOST': host.strip(), 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica_{number}')
+
+DATABASE_ROUTERS = ['EShops_API.db.router.ReplicaRouter']
+# реплика, отставшая больше чем на REPLICA_MAX_LAG секунд, не используется; отставание замеряется раз в интервал
+REPLICA_MAX_LAG = 5
+REPLICA_LAG_CHECK_INTERVAL = 5
+# сколько секунд пользователь после изменений читает с основной базы
+REPLICA_STICKY_TIMEOUT = 10
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -130,6 +163,9 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Uploaded files (seller price lists)
+MEDIA_ROOT = BASE_DIR / 'media'
+
 AUTH_USER_MODEL = 'orders.User'
 
 # Default primary key field type
@@ -146,6 +182,20 @@ EMAIL_USE_SSL = True
 SERVER_EMAIL = EMAIL_HOST_USER
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
+# MAIL OUTBOX STUFF
+# письма копятся в OutboxMessage и уходят пачками задачей send_outbox через одно соединение с SMTP
+# сколько секунд собирать пачку после первого письма и сколько писем отправлять за раз
+MAIL_BATCH_DELAY = int(os.environ.get('MAIL_BATCH_DELAY', 1))
+MAIL_BATCH_SIZE = int(os.environ.get('MAIL_BATCH_SIZE', 100))
+# сколько отправителей одновременно пишут на один домен получателей
+MAIL_DOMAIN_CONCURRENCY = int(os.environ.get('MAIL_DOMAIN_CONCURRENCY', 2))
+# попытки отправки: первая пауза в секундах, дальше удваивается до MAIL_RETRY_BACKOFF_MAX
+MAIL_MAX_ATTEMPTS = int(os.environ.get('MAIL_MAX_ATTEMPTS', 8))
+MAIL_RETRY_BACKOFF = 30
+MAIL_RETRY_BACKOFF_MAX = 3600
+# сколько секунд захваченная пачка принадлежит отправителю, потом её заберёт другой
+MAIL_LEASE = 300
+
 # CELERY STUFF
 BROKER_URL = 'redis://localhost:6379'
 CELERY_RESULT_BACKEND = 'redis://localhost:6379'
@@ -153,6 +203,71 @@ CELERY_ACCEPT_CONTENT = ['application/json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'Europe/Moscow'
+# отдельные очереди, чтобы письма при входе не стояли за импортом прайс-листов (см. orders/routing.py).
+# Импорт разбит на IMPORT_QUEUE_SHARDS очередей по продавцам, воркер импорта слушает все и берёт из них по кругу
+IMPORT_QUEUE_SHARDS = int(os.environ.get('IMPORT_QUEUE_SHARDS', 4))
+CELERY_DEFAULT_QUEUE = 'default'
+CELERY_QUEUES = [Queue(name, routing_key=name) for name in ['default', 'email', 'notifications'] +
+                 [f'imports.{shard}' for shard in range(IMPORT_QUEUE_SHARDS)]]
+CELERY_ROUTES = ('orders.routing.route_task',)
+
+# OUTBOX STUFF
+# задачи из запросов пишутся в OutboxEvent и уходят в брокер процессом relay_outbox (python manage.py relay_outbox)
+# сколько событий отправлять за раз и сколько секунд ждать новых, когда очередь пуста
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', 500))
+OUTBOX_POLL_INTERVAL = float(os.environ.get('OUTBOX_POLL_INTERVAL', 0.2))
+# сколько секунд хранятся отправленные события для проверки ключей повторов
+OUTBOX_KEEP = 86400
+
+# IMPORT STUFF
+# размер пачки товаров для bulk_create/bulk_update при импорте прайс-листа
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 1000))
+# размер части прайс-листа, которую импортирует один воркер
+IMPORT_SHARD_SIZE = int(os.environ.get('IMPORT_SHARD_SIZE', 10000))
+# сколько частей одного импорта одновременно в очереди и в работе, следующую ставит закончившаяся часть
+IMPORT_JOB_INFLIGHT = int(os.environ.get('IMPORT_JOB_INFLIGHT', 2))
+# сколько имён параметров, категорий и продуктов воркер держит в памяти между импортами
+IMPORT_IDENTITY_CACHE_SIZE = int(os.environ.get('IMPORT_IDENTITY_CACHE_SIZE', 50000))
+
+# CACHE STUFF
+# общий кэш воркеров: версии и ответы каталога, фасеты, счётчики, история троттлинга
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('CACHE_URL', 'redis://localhost:6379/1'),
+    }
+}
+# сколько секунд ответ каталога считается свежим, импорт и смена статуса магазина сбрасывают его раньше
+CATALOG_CACHE_TIMEOUT = int(os.environ.get('CATALOG_CACHE_TIMEOUT', 3600))
+# сколько секунд после этого отдаётся устаревший ответ, пока один запрос собирает новый
+CATALOG_CACHE_STALE = int(os.environ.get('CATALOG_CACHE_STALE', 300))
+CATALOG_CACHE_LOCK_TIMEOUT = 30
+# раз во сколько секунд общий список товаров (без фильтра по магазину и категории) обновляет остатки после заказов
+CATALOG_STOCK_INTERVAL = int(os.environ.get('CATALOG_STOCK_INTERVAL', 60))
+# сколько секунд токен с полями пользователя живёт в общем кэше и в памяти процесса, и сколько токенов там помещается
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.environ.get('AUTH_TOKEN_CACHE_TIMEOUT', 300))
+AUTH_TOKEN_LOCAL_TTL = int(os.environ.get('AUTH_TOKEN_LOCAL_TTL', 10))
+AUTH_TOKEN_LOCAL_SIZE = int(os.environ.get('AUTH_TOKEN_LOCAL_SIZE', 10000))
+# вход возвращает токен сразу в ответе, а не письмом
+AUTH_INLINE_TOKEN = os.environ.get('AUTH_INLINE_TOKEN', 'False') == 'True'
+# потоков хеширования паролей у async-входа и регистрации (orders/async_views.py) на процесс
+AUTH_HASH_WORKERS = int(os.environ.get('AUTH_HASH_WORKERS', os.cpu_count() or 4))
+# как часто счётчики процесса сбрасываются в общий кэш, секунд
+METRICS_FLUSH_INTERVAL = 1
+
+# THROTTLING STUFF
+# Redis для вёдер троттлинга, пустое значение - вёдра в кэше Django (только для разработки)
+THROTTLE_REDIS_URL = os.environ.get('THROTTLE_REDIS_URL', os.environ.get('CACHE_URL', 'redis://localhost:6379/1'))
+# таймаут запроса к Redis в секундах, при ошибке запрос пропускается без проверки
+THROTTLE_REDIS_TIMEOUT = float(os.environ.get('THROTTLE_REDIS_TIMEOUT', 0.1))
+
+# SEARCH STUFF
+# путь к классу поискового бэкенда каталога, по умолчанию выбирается по типу базы (см. orders/search.py)
+CATALOG_SEARCH_BACKEND = os.environ.get('CATALOG_SEARCH_BACKEND')
+# сколько секунд живут посчитанные фасеты каталога, импорт прайс-листа сбрасывает их раньше
+CATALOG_FACETS_TIMEOUT = int(os.environ.get('CATALOG_FACETS_TIMEOUT', 600))
+# список товаров собирается из строк .values() без экземпляров моделей (ProductInfoFastSerializer)
+CATALOG_FAST_SERIALIZER = os.environ.get('CATALOG_FAST_SERIALIZER', 'True') == 'True'
 
 # SPECTACULAR STUFF
 SPECTACULAR_SETTINGS = {
@@ -168,18 +283,32 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 40,
 
+    'DEFAULT_RENDERER_CLASSES': (
+        'orders.renderers.UJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+
+    'DEFAULT_PARSER_CLASSES': (
+        'orders.parsers.UJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'orders.authentication.CachedTokenAuthentication',
     ),
 
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.UserRateThrottle',
-        'rest_framework.throttling.AnonRateThrottle'
+        'orders.throttling.TokenBucketThrottle',
     ],
 
     'DEFAULT_THROTTLE_RATES': {
         'user': '20/min',
-        'anon': '10/min'
+        'anon': '10/min',
+        # области отдельных эндпоинтов, см. throttle_scope(s) во views
+        'catalog': '120/min',
+        'auth': '5/min',
+        'upload': '10/hour',
     },
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
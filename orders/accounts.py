@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.password_validation import validate_password
+from django.db import transaction
+from rest_framework.authtoken.models import Token
+
+from .outbox import emit
+from .serializers import UserSerializer
+from .tasks import token_postman
+
+REGISTRATION_FIELDS = {'first_name', 'last_name', 'email', 'password', 'company', 'position', 'type'}
+
+
+def register(data):
+    """
+    Регистрация пользователя, возвращает тело ответа. Общая для AuthViewSet и async-представлений
+    """
+    # проверяем обязательные аргументы
+    if not REGISTRATION_FIELDS.issubset(data):
+        return {'Status': False, 'Errors': 'Не указаны все необходимые аргументы'}
+
+    # проверяем пароль на сложность
+    try:
+        validate_password(data.get('password'))
+    except Exception as password_error:
+        error_array = []
+        # noinspection PyTypeChecker
+        for item in password_error:
+            error_array.append(item)
+        return {'Status': False, 'Errors': {'password': error_array}}
+
+    # проверяем данные для уникальности имени пользователя
+    user_serializer = UserSerializer(data=data)
+    if not user_serializer.is_valid():
+        return {'Status': False, 'Errors': user_serializer.errors}
+
+    # сохраняем пользователя, письмо уйдёт только после коммита
+    with transaction.atomic():
+        user = user_serializer.save()
+        user.set_password(data.get('password'))
+        user.save()
+        emit(token_postman.send_confirm_token, user.id, key=f'confirm:{user.id}')
+    return {'Status': True, 'Info': 'To your email send confirm token'}
+
+
+def login(data, request=None):
+    """
+    Вход по email и паролю, возвращает тело ответа. С AUTH_INLINE_TOKEN токен сразу в ответе,
+    иначе он уходит письмом
+    """
+    if not {'email', 'password'}.issubset(data):
+        return {'Status': False, 'Errors': 'Не указаны все необходимые аргументы'}
+
+    user = authenticate(request, username=data.get('email'), password=data.get('password'))
+    if user is None or not user.is_active:
+        return {'Status': False, 'Errors': 'Не удалось авторизовать'}
+
+    if settings.AUTH_INLINE_TOKEN:
+        token, _ = Token.objects.get_or_create(user=user)
+        return {'Status': True, 'Token': token.key}
+    emit(token_postman.send_auth_token, user.id)
+    return {'Status': True, 'Token': 'send to email'}
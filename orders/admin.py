@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 
 from .models import User, Shop, Category, Product, ProductInfo, Parameter, ProductParameter, Order, OrderItem, \
-    Contact, ConfirmEmailToken
+    Contact, ConfirmEmailToken, ImportJob, ImportShard, OutboxMessage
 
 
 @admin.register(User)
@@ -70,4 +70,20 @@ class ContactAdmin(admin.ModelAdmin):
 
 @admin.register(ConfirmEmailToken)
 class ConfirmEmailTokenAdmin(admin.ModelAdmin):
-    list_display = ('user', 'key', 'created_at',)
\ No newline at end of file
+    list_display = ('user', 'key', 'created_at',)
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'shop', 'state', 'processed', 'total', 'created_at',)
+
+
+@admin.register(ImportShard)
+class ImportShardAdmin(admin.ModelAdmin):
+    list_display = ('job', 'index', 'size', 'state', 'finished_at',)
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ('to', 'subject', 'state', 'attempts', 'next_attempt_at', 'sent_at',)
+    list_filter = ('state',)
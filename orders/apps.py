@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class OrdersConfig(AppConfig):
@@ -8,4 +9,8 @@ class OrdersConfig(AppConfig):
     def ready(self):
         '''
         start app
-        '''
\ No newline at end of file
+        '''
+        from . import signals  # noqa
+        from . import routing  # noqa
+        from .search import install_search_backend
+        post_migrate.connect(install_search_backend, sender=self)
\ No newline at end of file
@@ -0,0 +1,80 @@
+import asyncio
+import json
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpResponse
+
+from . import accounts, metrics
+from .renderers import UJSONRenderer
+from .throttling import TokenBucketThrottle
+
+# PBKDF2 занимает десятки миллисекунд процессора: в цикле событий ASGI он остановил бы все запросы процесса,
+# а sync_to_async выполняет код по одному в общем потоке. Хеширование идёт в своём ограниченном пуле
+hashers = ThreadPoolExecutor(max_workers=settings.AUTH_HASH_WORKERS, thread_name_prefix='auth-hash')
+
+queued = metrics.Timer('auth.hash_queue', 'Ожидание свободного потока хеширования')
+
+
+def render(data, status=200, headers=None):
+    """
+    Ответ с теми же байтами, что у Response DRF
+    """
+    return HttpResponse(UJSONRenderer().render(data), status=status, headers=headers,
+                        content_type='application/json')
+
+
+def parse(request):
+    if request.content_type == 'application/json':
+        try:
+            return json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+    return request.POST
+
+
+def throttled(request, scope):
+    """
+    Проверка TokenBucketThrottle для области scope, ответ 429 как у DRF или None
+    """
+    throttle = TokenBucketThrottle()
+    if throttle.allow_request(request, SimpleNamespace(throttle_scope=scope)):
+        return None
+    wait = throttle.wait()
+    return render({'detail': f'Request was throttled. Expected available in {math.ceil(wait)} seconds.'},
+                  status=429, headers={'Retry-After': str(math.ceil(wait))})
+
+
+def in_pool(view):
+    """
+    Тело представления выполняется в пуле hashers, после него соединение с базой потока возвращается
+    """
+    async def wrapper(request):
+        if request.method != 'POST':
+            return render({'detail': f'Method "{request.method}" not allowed.'}, status=405, headers={'Allow': 'POST'})
+        data = parse(request)
+        if data is None:
+            return render({'detail': 'JSON parse error'}, status=400)
+
+        started = time.perf_counter()
+
+        def call():
+            queued.observe(time.perf_counter() - started)
+            try:
+                return throttled(request, 'auth') or render(view(data, request))
+            finally:
+                close_old_connections()
+
+        return await asyncio.get_running_loop().run_in_executor(hashers, call)
+
+    # токен и пароль приходят в теле, CSRF не нужен, как и у представлений DRF
+    wrapper.csrf_exempt = True
+    return wrapper
+
+
+login = in_pool(lambda data, request: accounts.login(data, request))
+registration = in_pool(lambda data, request: accounts.register(data))
@@ -0,0 +1,103 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from . import metrics
+from .lru import LRUCache
+from .models import User
+
+# пароль в кэш не попадает, у собранного из кэша пользователя это поле отложено и не перезаписывается при save()
+USER_FIELDS = [field.attname for field in User._meta.concrete_fields if field.name != 'password']
+
+local_tokens = LRUCache(settings.AUTH_TOKEN_LOCAL_SIZE, ttl=settings.AUTH_TOKEN_LOCAL_TTL)
+
+local_hits = metrics.counter('auth.local_hit', 'Токен найден в памяти процесса')
+cache_hits = metrics.counter('auth.cache_hit', 'Токен найден в общем кэше')
+misses = metrics.counter('auth.miss', 'Токен прочитан из базы')
+latency = metrics.Timer('auth.latency', 'Время аутентификации по токену')
+
+
+def token_key(key):
+    return f'auth:token:{key}'
+
+
+def token_version_key(key):
+    return f'auth:token:{key}:version'
+
+
+def forget_token(key):
+    """
+    Запись токена в общем кэше хранится вместе с версией токена: после удаления или изменения версия растёт,
+    и строка, прочитанная из базы до этого и записанная после, уже не действует
+    """
+    local_tokens.delete(key)
+    cache.delete(token_key(key))
+    name = token_version_key(key)
+    # версия живёт дольше записи, иначе после её истечения устаревшая запись с версией 0 снова подошла бы
+    timeout = settings.AUTH_TOKEN_CACHE_TIMEOUT * 2
+    if not cache.add(name, int(time.time() * 1000), timeout=timeout):
+        try:
+            cache.incr(name)
+        except ValueError:
+            cache.add(name, int(time.time() * 1000), timeout=timeout)
+
+
+def cached_row(found, key):
+    """
+    Строка пользователя из записи общего кэша, если версия записи совпадает с текущей версией токена
+    """
+    entry = found.get(token_key(key))
+    if entry is not None and entry[0] == found.get(token_version_key(key), 0):
+        return entry[1]
+    return None
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that resolves token -> user through two caches instead of a Token + User query.
+
+    The first tier is a small LRU in the memory of the process with a short AUTH_TOKEN_LOCAL_TTL, the second one is
+    the shared cache, where rows are stored with a version of the token. Entries are dropped and the version is
+    bumped when the token is deleted or the user is saved (see orders/signals.py), so a row read before that is not
+    used again. Other processes notice it after AUTH_TOKEN_LOCAL_TTL seconds at most: the memory tier is not checked
+    against the shared cache, that round trip is what it saves.
+    """
+
+    def authenticate_credentials(self, key):
+        started = time.perf_counter()
+        row = local_tokens.get(key)
+        if row is not None:
+            local_hits.incr()
+        else:
+            found = cache.get_many([token_key(key), token_version_key(key)])
+            row = cached_row(found, key)
+            if row is not None:
+                cache_hits.incr()
+                local_tokens.set(key, row)
+            else:
+                misses.incr()
+                version = found.get(token_version_key(key), 0)
+                row = self.fetch(key)
+                cache.set(token_key(key), (version, row), settings.AUTH_TOKEN_CACHE_TIMEOUT)
+                # токен удалили, пока читали базу: в память процесса такая строка не попадает
+                if cache.get(token_version_key(key), 0) == version:
+                    local_tokens.set(key, row)
+
+        user = User.from_db('default', USER_FIELDS, row)
+        if not user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        latency.observe(time.perf_counter() - started)
+        return user, Token(key=key, user=user)
+
+    @staticmethod
+    def fetch(key):
+        row = User.objects.filter(auth_token__key=key).values_list(*USER_FIELDS).first()
+        if row is None:
+            raise AuthenticationFailed(_('Invalid token.'))
+        return row
+
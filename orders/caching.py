@@ -0,0 +1,175 @@
+import hashlib
+import time
+from datetime import datetime
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from EShops_API.db.router import read_from_primary
+
+from . import metrics
+
+hits = metrics.counter('response_cache.hit', 'Ответ отдан из кэша')
+stale_hits = metrics.counter('response_cache.stale', 'Отдан устаревший ответ, пока другой запрос его пересобирает')
+misses = metrics.counter('response_cache.miss', 'Ответ собран заново')
+
+
+def version_key(scope, key):
+    return f'version:{scope}:{key}'
+
+
+def modified_key(scope, key):
+    return f'modified:{scope}:{key}'
+
+
+def get_versions(*keys):
+    """
+    Текущие версии для пар (scope, key), например ('category', 15). Неизвестная версия равна 0
+    """
+    return get_stamps(*keys)[0]
+
+
+def get_stamps(*keys):
+    """
+    Версии для пар (scope, key) и время последнего изменения любой из них (unix time или None)
+    """
+    versions = [version_key(scope, key) for scope, key in keys]
+    modified = [modified_key(scope, key) for scope, key in keys]
+    found = cache.get_many(versions + modified)
+    times = [found[name] for name in modified if name in found]
+    return tuple(found.get(name, 0) for name in versions), max(times, default=None)
+
+
+def stock_stamp():
+    """
+    Номер текущего окна CATALOG_STOCK_INTERVAL: общий список товаров обновляет остатки раз в окно, а не после
+    каждого заказа
+    """
+    return int(time.time() // settings.CATALOG_STOCK_INTERVAL)
+
+
+def bump_versions(*keys):
+    """
+    Увеличиваем версии для пар (scope, key), все ключи кэша со старой версией становятся недействительными.
+
+    Первая версия берётся от текущего времени, чтобы после очистки кэша версии не повторялись.
+    """
+    now = int(time.time())
+    for scope, key in keys:
+        name = version_key(scope, key)
+        if not cache.add(name, now * 1000, timeout=None):
+            try:
+                cache.incr(name)
+            except ValueError:
+                # ключ успел истечь между add и incr
+                cache.add(name, now * 1000, timeout=None)
+    cache.set_many({modified_key(scope, key): now for scope, key in keys}, timeout=None)
+
+
+def request_signature(request):
+    query = sorted((key, sorted(values)) for key, values in request.query_params.lists())
+    return f'{request.get_host()}{request.path}?{urlencode(query, doseq=True)}'
+
+
+def response_key(request):
+    return 'response:' + hashlib.md5(request_signature(request).encode()).hexdigest()
+
+
+def make_etag(request, *stamps):
+    """
+    Strong ETag of the response to request, derived from version stamps of its data instead of the payload
+    """
+    return '"%s"' % hashlib.md5(f'{request_signature(request)}|{stamps}'.encode()).hexdigest()
+
+
+def conditional_response(request, etag, last_modified, build):
+    """
+    304 Not Modified, если клиент прислал актуальные If-None-Match/If-Modified-Since, иначе build().
+    Ответ в обоих случаях получает заголовки ETag и Last-Modified
+    """
+    if isinstance(last_modified, datetime):
+        last_modified = int(last_modified.timestamp())
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = build()
+        if response.status_code != 200 or response.has_header('ETag'):
+            return response
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def cached_response(request, versions, build):
+    """
+    Versioned response cache with stale-while-revalidate.
+
+    The entry remembers the versions of its scopes and is fresh while they are unchanged and CATALOG_CACHE_TIMEOUT
+    has not passed. Once it goes stale, one request takes a lock and rebuilds it while the others keep getting the old
+    data for up to CATALOG_CACHE_STALE seconds, so a popular listing never stampedes the database after an import.
+    """
+    key = response_key(request)
+    lock = f'{key}:lock'
+    entry = cache.get(key)
+    locked = False
+    if entry is not None:
+        entry_versions, fresh_until, data = entry
+        if entry_versions == versions and fresh_until > time.time():
+            hits.incr()
+            return Response(data, headers={'X-Cache': 'HIT'})
+        locked = cache.add(lock, 1, timeout=settings.CATALOG_CACHE_LOCK_TIMEOUT)
+        if not locked:
+            stale_hits.incr()
+            # валидатор устаревшего ответа - его собственная версия, иначе клиент закэширует его как актуальный
+            return Response(data, headers={'X-Cache': 'STALE', 'ETag': make_etag(request, entry_versions)})
+
+    misses.incr()
+    try:
+        response = build()
+        if response.status_code == 200:
+            entry = (versions, time.time() + settings.CATALOG_CACHE_TIMEOUT, response.data)
+            cache.set(key, entry, settings.CATALOG_CACHE_TIMEOUT + settings.CATALOG_CACHE_STALE)
+            response['X-Cache'] = 'MISS'
+    finally:
+        if locked:
+            cache.delete(lock)
+    return response
+
+
+class VersionedCacheMixin:
+    """
+    Кэш ответов list/retrieve для вьюсетов только на чтение, сбрасывается по версиям из cache_scopes.
+    Из тех же версий строятся ETag и Last-Modified, на условный запрос 304 отдаётся до обращения к базе
+    """
+
+    def cache_scopes(self, request):
+        return [('catalog', 'all')]
+
+    def cache_stamps(self, request):
+        """
+        Версии и время изменения, от которых считаются ключ кэша ответа, ETag и Last-Modified
+        """
+        return get_stamps(*self.cache_scopes(request))
+
+    def list(self, request, *args, **kwargs):
+        return self.versioned_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.versioned_response(request, super().retrieve, *args, **kwargs)
+
+    def versioned_response(self, request, handler, *args, **kwargs):
+        versions, modified = self.cache_stamps(request)
+
+        def build():
+            # только что изменённые данные могли ещё не дойти до реплики, под новой версией кэшируем ответ основной базы
+            if modified is not None and time.time() - modified < settings.REPLICA_MAX_LAG:
+                with read_from_primary():
+                    return handler(request, *args, **kwargs)
+            return handler(request, *args, **kwargs)
+
+        return conditional_response(request, make_etag(request, versions), modified, lambda: cached_response(
+            request, versions, build))
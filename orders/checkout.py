@@ -0,0 +1,75 @@
+from django.db import transaction
+from django.db.models import Case, F, Sum, Value, When
+from django.utils import timezone
+
+from . import metrics
+from .caching import bump_versions
+from .models import Order, OrderItem, ProductInfo, StatusOrders, TypeAvailability
+from .reports import record_checkout
+
+checkouts = metrics.counter('checkout.done', 'Корзина оформлена в заказ')
+shortages = metrics.counter('checkout.shortage', 'Оформление отклонено: товара не хватает')
+
+
+class CheckoutError(Exception):
+    """
+    Корзину нельзя оформить, в shortages - {id позиции: (запрошено, доступно)}
+    """
+
+    def __init__(self, message, shortages=None):
+        super().__init__(message)
+        self.shortages = shortages or {}
+
+
+def checkout(order_id, user_id, contact_id):
+    """
+    Оформляем корзину в заказ, списываем остатки и фиксируем цены позиций в одной транзакции.
+
+    Строки ProductInfo корзины блокируются по возрастанию id, поэтому корзины с общими товарами ждут друг друга,
+    а не попадают во взаимную блокировку. Остатки проверяются под блокировкой и списываются одним UPDATE,
+    покупатель, которому товара не хватило, получает CheckoutError, и ничего не меняется.
+    """
+    with transaction.atomic():
+        order = Order.objects.select_for_update().filter(
+            pk=order_id, user_id=user_id, state=StatusOrders.BASKET).first()
+        if order is None:
+            raise CheckoutError('Can not to change status, because order is not basket')
+
+        demand = dict(OrderItem.objects.filter(order_id=order_id).order_by().values('product_info_id').annotate(
+            total=Sum('quantity')).values_list('product_info_id', 'total'))
+        if not demand:
+            raise CheckoutError('Shopping cart is empty')
+
+        stock, prices, lines = {}, {}, []
+        scopes = set()
+        locked = ProductInfo.objects.select_for_update(of=('self',)).filter(id__in=demand).order_by('id')
+        retired = {}
+        for pk, quantity, price, shop_id, category_id, name, availability in locked.values_list(
+                'id', 'quantity', 'price', 'shop_id', 'product__category_id', 'name', 'availability'):
+            if availability == TypeAvailability.EOS:
+                # товар ушёл из прайс-листа магазина, остаток у него только на бумаге
+                retired[pk] = (demand[pk], 0)
+            stock[pk], prices[pk] = quantity, price
+            lines.append((pk, shop_id, name, demand[pk], price))
+            scopes |= {('shop', shop_id), ('category', category_id)}
+
+        if retired:
+            shortages.incr()
+            raise CheckoutError('Goods are no longer sold', retired)
+        missing = {pk: (wanted, stock.get(pk, 0)) for pk, wanted in demand.items() if stock.get(pk, 0) < wanted}
+        if missing:
+            shortages.incr()
+            raise CheckoutError('Not enough goods in stock', missing)
+
+        ProductInfo.objects.filter(id__in=demand).update(
+            quantity=Case(*[When(id=pk, then=F('quantity') - wanted) for pk, wanted in demand.items()]))
+        # цены фиксируются в позициях: повторный импорт прайс-листа не меняет сумму оформленного заказа
+        OrderItem.objects.filter(order_id=order_id).update(
+            price=Case(*[When(product_info_id=pk, then=Value(price)) for pk, price in prices.items()]))
+        Order.objects.filter(pk=order_id).update(state=StatusOrders.NEW, contact_id=contact_id,
+                                                 total_sum=sum(demand[pk] * prices[pk] for pk in demand),
+                                                 updated_at=timezone.now())
+        record_checkout(order_id, user_id, lines)
+        # остатки видны в списках по магазину и категории, общий список обновляет их раз в CATALOG_STOCK_INTERVAL
+        transaction.on_commit(lambda: bump_versions(*scopes))
+    checkouts.incr()
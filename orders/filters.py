@@ -0,0 +1,114 @@
+import hashlib
+import math
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from rest_framework.exceptions import ParseError
+from rest_framework.filters import BaseFilterBackend
+
+from .caching import get_versions
+from .models import ProductParameter
+
+# параметры запроса, которые не влияют на фасеты
+NOT_FILTERS = {'page', 'page_size', 'facets', 'cursor'}
+
+
+def parse_number(value):
+    """
+    Числовое значение параметра товара или None: '6.5', '6,5' и 512 - числа, '2688x1242', 'nan' и 'inf' - нет
+    """
+    if isinstance(value, bool):
+        return None
+    try:
+        number = float(value) if isinstance(value, (int, float)) else float(str(value).strip().replace(',', '.'))
+    except (ValueError, OverflowError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+class ParameterFilter(BaseFilterBackend):
+    """
+    Filters the catalog by category, shop and numeric ranges of product parameters.
+
+    ?param=<parameter id>:<min>:<max> keeps goods whose parameter value lies in the range, either bound may be
+    omitted. The parameter can be repeated, all conditions have to match.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+        for field in ('category', 'shop'):
+            if params.get(field):
+                lookup = 'product__category_id' if field == 'category' else 'shop_id'
+                queryset = queryset.filter(**{lookup: self._integer(params[field], field)})
+
+        for condition in params.getlist('param'):
+            parameter_id, bounds = self._condition(condition)
+            values = ProductParameter.objects.filter(parameter_id=parameter_id, **bounds)
+            queryset = queryset.filter(id__in=values.values('product_info_id'))
+        return queryset
+
+    def _condition(self, condition):
+        parameter_id, _, bounds = condition.partition(':')
+        low, _, high = bounds.partition(':')
+        lookups = {}
+        for lookup, bound in (('numeric_value__gte', low), ('numeric_value__lte', high)):
+            if bound:
+                number = parse_number(bound)
+                if number is None:
+                    raise ParseError(f'Bound {bound} of param {condition} is not a number')
+                lookups[lookup] = number
+        if not lookups:
+            lookups['numeric_value__isnull'] = False
+        return self._integer(parameter_id, 'param'), lookups
+
+    @staticmethod
+    def _integer(value, name):
+        try:
+            return int(value)
+        except ValueError:
+            raise ParseError(f'{name} must be an id, got {value}')
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {'name': 'category', 'required': False, 'in': 'query', 'description': 'Category id',
+             'schema': {'type': 'integer'}},
+            {'name': 'shop', 'required': False, 'in': 'query', 'description': 'Shop id',
+             'schema': {'type': 'integer'}},
+            {'name': 'param', 'required': False, 'in': 'query', 'explode': True,
+             'description': 'Numeric range of a parameter: <parameter id>:<min>:<max>, e.g. 3:256: or 1:6:6.5',
+             'schema': {'type': 'array', 'items': {'type': 'string'}}},
+            {'name': 'facets', 'required': False, 'in': 'query',
+             'description': 'Add counts of goods per parameter value to the response',
+             'schema': {'type': 'boolean'}},
+        ]
+
+
+def catalog_facets(queryset, request):
+    """
+    Количество товаров на каждое значение каждого параметра среди отфильтрованных товаров.
+
+    Считается одним агрегирующим запросом и кэшируется по категории, версия категории растёт при импорте
+    прайс-листа магазина с товарами этой категории.
+    """
+    category = request.query_params.get('category') or 'all'
+    filters = sorted((key, sorted(values)) for key, values in request.query_params.lists() if key not in NOT_FILTERS)
+    signature = hashlib.md5(urlencode(filters, doseq=True).encode()).hexdigest()
+    version, = get_versions(('category', category))
+    key = f'facets:{category}:{version}:{signature}'
+
+    facets = cache.get(key)
+    if facets is None:
+        rows = ProductParameter.objects.filter(product_info_id__in=queryset.order_by().values('pk')). \
+            values('parameter_id', 'parameter__name', 'value').annotate(count=Count('id')). \
+            order_by('parameter__name', 'value')
+        facets = {}
+        for row in rows:
+            facet = facets.setdefault(row['parameter_id'], {'id': row['parameter_id'],
+                                                            'parameter': row['parameter__name'],
+                                                            'values': []})
+            facet['values'].append({'value': row['value'], 'count': row['count']})
+        facets = list(facets.values())
+        cache.set(key, facets, settings.CATALOG_FACETS_TIMEOUT)
+    return facets
@@ -0,0 +1,118 @@
+import json
+from collections import Counter
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .importer import CatalogImporter, ImportMode, chunked, with_hit_rate
+from .models import ImportJob, ImportShard, StatusImport
+from .price_list import PriceListStream
+
+
+def shard_filename(job, index):
+    return f'uploads/imports/{job.id}/{index}.json'
+
+
+def read_shard(shard):
+    with default_storage.open(shard.filename, 'rb') as file:
+        return json.load(file)
+
+
+def split_price_list(job, shard_size=None):
+    """
+    Режем загруженный прайс-лист на части, каждая часть сохраняется в хранилище отдельным файлом.
+
+    Магазин, категории, продукты и имена параметров создаются здесь же, чтобы параллельные части
+    не создавали дубли.
+    """
+    shard_size = shard_size or settings.IMPORT_SHARD_SIZE
+    importer = CatalogImporter(job.user_id, mode=job.mode)
+    shards = []
+    with transaction.atomic(), default_storage.open(job.filename, 'rb') as file:
+        price_list = PriceListStream(file)
+        importer.import_header(price_list.shop, price_list.categories)
+        for index, goods in enumerate(chunked(price_list.goods(), shard_size)):
+            for chunk in chunked(goods, importer.batch_size):
+                importer.resolve_products({(item['name'], item['category']) for item in chunk})
+                importer.resolve_parameters({name for item in chunk for name in item.get('parameters', {})})
+
+            filename = shard_filename(job, index)
+            if default_storage.exists(filename):
+                default_storage.delete(filename)
+            default_storage.save(filename, ContentFile(json.dumps(goods, ensure_ascii=False).encode()))
+            shards.append(ImportShard(job=job, index=index, filename=filename, size=len(goods)))
+
+        ImportShard.objects.bulk_create(shards)
+        importer.shop.filename = job.filename
+        importer.shop.save(update_fields=['filename'])
+        job.shop = importer.shop
+        job.total = sum(shard.size for shard in shards)
+        job.summary = importer.stats
+        job.save(update_fields=['shop', 'total', 'summary'])
+    return shards
+
+
+def next_shards(job_id):
+    """
+    Части, которые пора отдать воркерам: у импорта в очереди и в работе не больше IMPORT_JOB_INFLIGHT частей,
+    следующую ставит в очередь закончившаяся. Так части больших прайс-листов встают в очередь вперемешку с другими
+    магазинами, а не тысячами сразу. Возвращает (номера частей, все части готовы)
+    """
+    with transaction.atomic():
+        job = ImportJob.objects.select_for_update().filter(pk=job_id, state=StatusImport.RUNNING).first()
+        if job is None:
+            return [], False
+        states = Counter(job.shards.values_list('state', flat=True))
+        free = max(settings.IMPORT_JOB_INFLIGHT - states[StatusImport.RUNNING], 0)
+        indexes = list(job.shards.filter(state=StatusImport.PENDING).order_by('index').
+                       values_list('index', flat=True)[:free])
+        ImportShard.objects.filter(job_id=job_id, index__in=indexes).update(state=StatusImport.RUNNING)
+    return indexes, states[StatusImport.DONE] == sum(states.values())
+
+
+def import_shard_goods(shard):
+    """
+    Импорт одной части. Отметка о готовности части пишется в той же транзакции, что и товары,
+    поэтому повторный запуск после падения воркера не импортирует часть дважды.
+    """
+    job = shard.job
+    importer = CatalogImporter(job.user_id, mode=job.mode, shop=job.shop)
+    with transaction.atomic():
+        if not ImportShard.objects.select_for_update().filter(pk=shard.pk).exclude(state=StatusImport.DONE).exists():
+            return shard.summary
+        for chunk in chunked(read_shard(shard), importer.batch_size):
+            importer.import_goods(chunk)
+        ImportShard.objects.filter(pk=shard.pk).update(state=StatusImport.DONE, summary=importer.stats,
+                                                       finished_at=timezone.now())
+        ImportJob.objects.filter(pk=job.pk).update(processed=F('processed') + shard.size)
+    return importer.stats
+
+
+def reconcile(job):
+    """
+    Завершение импорта: снимаем с продажи товары, которых нет ни в одной части, и собираем сводку
+    """
+    shards = list(job.shards.all())
+    importer = CatalogImporter(job.user_id, mode=job.mode, shop=job.shop)
+    if job.mode == ImportMode.INCREMENTAL:
+        for shard in shards:
+            importer.seen.update(item['id'] for item in read_shard(shard))
+
+    summary = Counter(job.summary)
+    for shard in shards:
+        summary.update(shard.summary)
+    with transaction.atomic():
+        importer.finish()
+        summary['retired'] += importer.stats['retired']
+        job.summary = with_hit_rate(summary)
+        job.state = StatusImport.DONE
+        job.finished_at = timezone.now()
+        job.save(update_fields=['summary', 'state', 'finished_at'])
+
+    for shard in shards:
+        default_storage.delete(shard.filename)
+    return job.summary
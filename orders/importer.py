@@ -0,0 +1,385 @@
+import threading
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from .caching import bump_versions
+from .filters import parse_number
+from .lru import LRUCache
+from .models import Shop, Category, Product, ProductInfo, Parameter, ProductParameter, TypeAvailability
+from .search import get_search_backend
+
+
+class ImportMode:
+    INCREMENTAL = 'incremental'
+    REPLACE = 'replace'
+
+
+def chunked(iterable, size):
+    """
+    Режем последовательность на списки фиксированного размера
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class IdentityCache:
+    """
+    Per-process maps of parameter name -> id, category id -> id and (product name, category) -> id.
+
+    The maps are shared by all imports of a worker and warmed from the database with one query per model.
+    Only committed rows get into the maps, changed and deleted rows are dropped from them by signals.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.parameters = LRUCache(maxsize)
+        self.categories = LRUCache(maxsize)
+        self.products = LRUCache(maxsize)
+        self._warm = False
+        self._lock = threading.Lock()
+
+    def warm(self):
+        with self._lock:
+            if self._warm:
+                return
+            parameters = list(Parameter.objects.values_list('name', 'id')[:self.maxsize])
+            categories = [(pk, pk) for pk in Category.objects.values_list('id', flat=True)[:self.maxsize]]
+            products = [
+                ((name, category), pk) for name, category, pk in
+                Product.objects.values_list('name', 'category_id', 'id')[:self.maxsize]
+            ]
+            self._warm = True
+
+        def fill():
+            self.parameters.set_many(parameters)
+            self.categories.set_many(categories)
+            self.products.set_many(products)
+
+        # внутри импорта видны и его незакоммиченные строки: в карты они попадут только после коммита,
+        # при откате карты останутся пустыми и ключи будут искаться в базе
+        transaction.on_commit(fill)
+
+    def clear(self):
+        with self._lock:
+            self.parameters.clear()
+            self.categories.clear()
+            self.products.clear()
+            self._warm = False
+
+
+identity_cache = IdentityCache(getattr(settings, 'IMPORT_IDENTITY_CACHE_SIZE', 50000))
+
+
+@receiver([post_save, post_delete], sender=Parameter)
+def forget_parameter(instance, **kwargs):
+    identity_cache.parameters.delete(instance.name)
+
+
+@receiver(pre_save, sender=Parameter)
+def forget_renamed_parameter(instance, **kwargs):
+    # после переименования старое имя не должно указывать на эту строку
+    if instance.pk is not None:
+        for name in Parameter.objects.filter(pk=instance.pk).values_list('name', flat=True):
+            identity_cache.parameters.delete(name)
+
+
+@receiver([post_save, post_delete], sender=Category)
+def forget_category(instance, **kwargs):
+    identity_cache.categories.delete(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Product)
+def forget_product(instance, **kwargs):
+    identity_cache.products.delete((instance.name, instance.category_id))
+
+
+@receiver(pre_save, sender=Product)
+def forget_renamed_product(instance, **kwargs):
+    if instance.pk is not None:
+        for key in Product.objects.filter(pk=instance.pk).values_list('name', 'category_id'):
+            identity_cache.products.delete(key)
+
+
+def with_hit_rate(stats):
+    """
+    Сводка импорта с долей попаданий в кэш воркера
+    """
+    lookups = stats.get('cache_hits', 0) + stats.get('cache_misses', 0)
+    return dict(stats, cache_hit_rate=round(stats.get('cache_hits', 0) / lookups, 3) if lookups else 0.0)
+
+
+class CatalogImporter:
+    """
+    Set-based import of a seller price list.
+
+    Categories, products and parameter names of every chunk of goods are resolved with a few batched queries and
+    rows are written with bulk operations. The whole import runs in one transaction.
+
+    In the incremental mode incoming goods are matched with the shop catalog on (shop, external_id): only new and
+    changed rows are written, goods missing from the price list are marked as End of sales. The replace mode drops
+    the shop catalog and creates it again.
+    """
+
+    info_fields = ('product_id', 'model', 'name', 'price', 'price_rrc', 'quantity', 'availability')
+
+    def __init__(self, user_id, mode=ImportMode.INCREMENTAL, batch_size=None, shop=None):
+        if mode not in (ImportMode.INCREMENTAL, ImportMode.REPLACE):
+            raise ValueError(f'Unknown import mode {mode}')
+        self.user_id = user_id
+        self.mode = mode
+        self.batch_size = batch_size or getattr(settings, 'IMPORT_BATCH_SIZE', 1000)
+        self.shop = shop
+        self.seen = set()
+        self.categories = set()
+        self.stats = {'categories': 0, 'products': 0, 'parameters': 0,
+                      'added': 0, 'changed': 0, 'unchanged': 0, 'retired': 0,
+                      'cache_hits': 0, 'cache_misses': 0, 'saved_queries': 0}
+
+    def run(self, data):
+        return self.import_price_list(data['shop'], data['categories'], data['goods'])
+
+    def run_stream(self, price_list):
+        """
+        Импорт из PriceListStream: товары читаются из файла пачками по batch_size
+        """
+        return self.import_price_list(price_list.shop, price_list.categories, price_list.goods())
+
+    def import_price_list(self, shop_name, categories, goods):
+        with transaction.atomic():
+            self.import_header(shop_name, categories)
+            for chunk in chunked(goods, self.batch_size):
+                self.import_goods(chunk)
+            self.finish()
+        return with_hit_rate(self.stats)
+
+    def import_header(self, shop_name, categories):
+        self.shop, _ = Shop.objects.get_or_create(name=shop_name, user_id=self.user_id)
+
+        names = {category['id']: category['name'] for category in categories}
+        self.categories.update(names)
+        existing = self.cached(identity_cache.categories, names.keys(), lambda ids: {
+            pk: pk for pk in Category.objects.filter(id__in=ids).values_list('id', flat=True)
+        })
+        created = [Category(id=pk, name=name) for pk, name in names.items() if pk not in existing]
+        if created:
+            Category.objects.bulk_create(created)
+            self.remember(identity_cache.categories, {category.pk: category.pk for category in created})
+            self.stats['categories'] += len(created)
+
+        through = Category.shop.through
+        through.objects.bulk_create(
+            [through(category_id=pk, shop_id=self.shop.id) for pk in names],
+            ignore_conflicts=True,
+        )
+
+        if self.mode == ImportMode.REPLACE:
+            ProductInfo.objects.filter(shop_id=self.shop.id).delete()
+
+    def import_goods(self, goods):
+        products = self.resolve_products({(item['name'], item['category']) for item in goods})
+        parameters = self.resolve_parameters({name for item in goods for name in item.get('parameters', {})})
+        self.seen.update(item['id'] for item in goods)
+
+        existing = {}
+        if self.mode == ImportMode.INCREMENTAL:
+            existing = {
+                row.external_id: row for row in
+                ProductInfo.objects.filter(shop_id=self.shop.id, external_id__in=[item['id'] for item in goods])
+                .only('id', 'external_id', *self.info_fields)
+            }
+
+        new_goods, changed_infos, old_goods = [], [], []
+        for item in goods:
+            incoming = self._product_info(item, products[item['name'], item['category']])
+            current = existing.get(item['id'])
+            if current is None:
+                new_goods.append((item, incoming))
+                continue
+            if current.availability != TypeAvailability.EOS:
+                # доступность, выставленную продавцом, импорт не трогает
+                incoming.availability = current.availability
+            incoming.pk = current.pk
+            if any(getattr(incoming, field) != getattr(current, field) for field in self.info_fields):
+                changed_infos.append(incoming)
+            old_goods.append((item, incoming))
+
+        created = self._create_goods(new_goods, parameters)
+        if changed_infos:
+            ProductInfo.objects.bulk_update(changed_infos, self.info_fields, batch_size=self.batch_size)
+        changed_parameters = self._sync_parameters(old_goods, parameters)
+        if created or changed_infos:
+            get_search_backend().update(
+                ProductInfo.objects.filter(id__in=created + [info.pk for info in changed_infos]))
+
+        changed = {info.pk for info in changed_infos} | changed_parameters
+        self.stats['added'] += len(new_goods)
+        self.stats['changed'] += len(changed)
+        self.stats['unchanged'] += len(old_goods) - len(changed)
+
+    def finish(self):
+        """
+        Снимаем с продажи товары магазина, которых нет в прайс-листе, и сбрасываем кэш каталога магазина
+        """
+        categories = self.categories or set(self.shop.categories.values_list('id', flat=True))
+        scopes = [('category', 'all'), ('shop', 'all'), ('shop', self.shop.id)]
+        scopes += [('category', pk) for pk in categories]
+        transaction.on_commit(lambda: bump_versions(*scopes))
+        if self.mode != ImportMode.INCREMENTAL:
+            return
+        missing = [
+            pk for pk, external_id in
+            ProductInfo.objects.filter(shop_id=self.shop.id).exclude(availability=TypeAvailability.EOS)
+            .values_list('id', 'external_id').iterator()
+            if external_id not in self.seen
+        ]
+        for chunk in chunked(missing, self.batch_size):
+            ProductInfo.objects.filter(id__in=chunk).update(availability=TypeAvailability.EOS)
+        self.stats['retired'] += len(missing)
+
+    def resolve_products(self, keys):
+        """
+        Карта (название, категория) -> id продукта, недостающие продукты создаются одним запросом
+        """
+        found = self.cached(identity_cache.products, keys, self._fetch_products)
+        missing = keys - found.keys()
+        if missing:
+            Product.objects.bulk_create([Product(name=name, category_id=category) for name, category in missing])
+            created = self._fetch_products(missing)
+            self.remember(identity_cache.products, created)
+            found.update(created)
+            self.stats['products'] += len(missing)
+        return found
+
+    def resolve_parameters(self, names):
+        """
+        Карта имя параметра -> id, недостающие параметры создаются одним запросом
+        """
+        found = self.cached(identity_cache.parameters, names, self._fetch_parameters)
+        missing = names - found.keys()
+        if missing:
+            Parameter.objects.bulk_create([Parameter(name=name) for name in missing])
+            created = self._fetch_parameters(missing)
+            self.remember(identity_cache.parameters, created)
+            found.update(created)
+            self.stats['parameters'] += len(missing)
+        return found
+
+    def cached(self, cache, keys, fetch):
+        """
+        Ищем ключи в кэше воркера, промахи достаём из базы одним запросом fetch(keys) -> {key: id}
+        """
+        identity_cache.warm()
+        keys = set(keys)
+        found = cache.get_many(keys)
+        self.stats['cache_hits'] += len(found)
+        self.stats['cache_misses'] += len(keys) - len(found)
+        if len(found) == len(keys):
+            self.stats['saved_queries'] += 1
+            return found
+        fetched = fetch(keys - found.keys())
+        # прочитано внутри транзакции импорта, среди строк могут быть созданные ею же
+        self.remember(cache, fetched)
+        found.update(fetched)
+        return found
+
+    @staticmethod
+    def remember(cache, items):
+        # строки попадают в кэш только после коммита импорта
+        transaction.on_commit(lambda: cache.set_many(items))
+
+    @staticmethod
+    def _fetch_products(keys):
+        rows = Product.objects.filter(name__in={name for name, _ in keys},
+                                      category_id__in={category for _, category in keys})
+        return {
+            (name, category): pk for name, category, pk in rows.values_list('name', 'category_id', 'id')
+            if (name, category) in keys
+        }
+
+    @staticmethod
+    def _fetch_parameters(names):
+        return dict(Parameter.objects.filter(name__in=names).values_list('name', 'id'))
+
+    def _create_goods(self, goods, parameters):
+        if not goods:
+            return []
+        infos = ProductInfo.objects.bulk_create([info for _, info in goods], batch_size=self.batch_size)
+        info_ids = self._product_info_ids(infos)
+        ProductParameter.objects.bulk_create(
+            [
+                ProductParameter(product_info_id=info_ids[info.product_id, info.external_id],
+                                 parameter_id=parameters[name],
+                                 value=str(value), numeric_value=parse_number(value))
+                for (item, _), info in zip(goods, infos)
+                for name, value in item.get('parameters', {}).items()
+            ],
+            batch_size=self.batch_size,
+        )
+        return list(info_ids.values())
+
+    def _sync_parameters(self, goods, parameters):
+        """
+        Приводим параметры уже известных товаров к прайс-листу, возвращаем id изменившихся товаров
+        """
+        if not goods:
+            return set()
+        current = {
+            (info_id, parameter_id): (pk, value) for pk, info_id, parameter_id, value in
+            ProductParameter.objects.filter(product_info_id__in=[info.pk for _, info in goods])
+            .values_list('id', 'product_info_id', 'parameter_id', 'value')
+        }
+        wanted = {
+            (info.pk, parameters[name]): str(value)
+            for item, info in goods
+            for name, value in item.get('parameters', {}).items()
+        }
+
+        created = [key for key in wanted if key not in current]
+        updated = [key for key in wanted if key in current and current[key][1] != wanted[key]]
+        removed = [key for key in current if key not in wanted]
+
+        ProductParameter.objects.bulk_create(
+            [ProductParameter(product_info_id=info_id, parameter_id=parameter_id, value=wanted[info_id, parameter_id],
+                              numeric_value=parse_number(wanted[info_id, parameter_id]))
+             for info_id, parameter_id in created],
+            batch_size=self.batch_size,
+        )
+        ProductParameter.objects.bulk_update(
+            [ProductParameter(id=current[key][0], value=wanted[key], numeric_value=parse_number(wanted[key]))
+             for key in updated],
+            ['value', 'numeric_value'],
+            batch_size=self.batch_size,
+        )
+        for chunk in chunked([current[key][0] for key in removed], self.batch_size):
+            ProductParameter.objects.filter(id__in=chunk).delete()
+
+        return {info_id for info_id, _ in created + updated + removed}
+
+    def _product_info(self, item, product_id):
+        return ProductInfo(product_id=product_id,
+                           external_id=item['id'],
+                           model=item['model'],
+                           name=item['name'],
+                           price=item['price'],
+                           price_rrc=item['price_rrc'],
+                           quantity=item['quantity'],
+                           availability=TypeAvailability.STOCK,
+                           shop_id=self.shop.id)
+
+    def _product_info_ids(self, infos):
+        # не все бэкенды возвращают первичные ключи из bulk_create
+        if all(info.pk is not None for info in infos):
+            return {(info.product_id, info.external_id): info.pk for info in infos}
+        return {
+            (product_id, external_id): pk for product_id, external_id, pk in
+            ProductInfo.objects.filter(shop_id=self.shop.id, external_id__in={info.external_id for info in infos})
+            .values_list('product_id', 'external_id', 'id')
+        }
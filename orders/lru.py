@@ -0,0 +1,81 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Thread-safe in-process cache of a bounded size, the least recently used keys are evicted first.
+    With ttl keys also expire that many seconds after they were set
+    """
+
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._expires = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data and not self._expired(key)
+
+    def _expired(self, key):
+        if self.ttl is None or self._expires[key] > time.monotonic():
+            return False
+        del self._data[key]
+        del self._expires[key]
+        return True
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data or self._expired(key):
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key]
+
+    def get_many(self, keys):
+        """
+        Словарь найденных ключей, отсутствующие ключи в него не попадают
+        """
+        with self._lock:
+            found = {}
+            for key in keys:
+                if key in self._data and not self._expired(key):
+                    self._data.move_to_end(key)
+                    found[key] = self._data[key]
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+            return found
+
+    def set(self, key, value):
+        self.set_many({key: value})
+
+    def set_many(self, items):
+        with self._lock:
+            expires = time.monotonic() + (self.ttl or 0)
+            for key, value in dict(items).items():
+                self._data[key] = value
+                self._data.move_to_end(key)
+                self._expires[key] = expires
+            while len(self._data) > self.maxsize:
+                key, _ = self._data.popitem(last=False)
+                del self._expires[key]
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._expires.clear()
+            self.hits = self.misses = 0
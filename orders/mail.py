@@ -0,0 +1,180 @@
+import math
+import random
+import smtplib
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from . import metrics
+from .models import OutboxMessage, StatusMail
+
+sent = metrics.counter('mail.sent', 'Письмо отправлено')
+retried = metrics.counter('mail.retry', 'Письмо не ушло, отправим позже')
+failed = metrics.counter('mail.failed', 'Письмо не ушло за MAIL_MAX_ATTEMPTS попыток')
+connections = metrics.counter('mail.connection', 'Открыто соединений с SMTP')
+
+
+def enqueue(to, subject, body, from_email=None):
+    """
+    Кладём письмо в очередь, после коммита будим отправителя.
+    Письма одной пачки (MAIL_BATCH_DELAY секунд) уходят одной задачей через одно соединение
+    """
+    message = OutboxMessage.objects.create(to=to, domain=to.rpartition('@')[2].lower(), subject=subject, body=body,
+                                           from_email=from_email or settings.DEFAULT_FROM_EMAIL or '')
+    transaction.on_commit(schedule)
+    return message
+
+
+def schedule(countdown=0):
+    """
+    Одна задача отправки на окно MAIL_BATCH_DELAY, в которое попадает now + countdown: событие outbox с ключом окна
+    и запуском в его конце. Запрос пишет только строку в базу, в Redis и брокер её отправляет relay_outbox.
+    Будим после коммита письма, так что задача окна увидит все письма, закоммиченные до его конца
+    """
+    from .outbox import emit
+    from .tasks import send_outbox
+
+    now = timezone.now()
+    window = max(settings.MAIL_BATCH_DELAY, 1)
+    end = math.ceil((now.timestamp() + countdown) / window)
+    emit(send_outbox, key=f'mail:wake:{end}', eta=datetime.fromtimestamp(end * window, now.tzinfo))
+
+
+def due():
+    """
+    Письма, которые пора отправлять: ждущие своей попытки и захваченные отправителем, который не уложился в MAIL_LEASE
+    """
+    return OutboxMessage.objects.filter(state__in=[StatusMail.PENDING, StatusMail.SENDING],
+                                        next_attempt_at__lte=timezone.now())
+
+
+def acquire_domain(domain):
+    """
+    Не больше MAIL_DOMAIN_CONCURRENCY отправителей пишут на один домен одновременно: почтовые сервисы получателей
+    режут тех, кто открывает к ним много параллельных сессий. Возвращает ключ занятого слота или None
+    """
+    for slot in range(settings.MAIL_DOMAIN_CONCURRENCY):
+        key = f'mail:domain:{domain}:{slot}'
+        if cache.add(key, 1, timeout=settings.MAIL_LEASE):
+            return key
+    return None
+
+
+def claim(domain, batch_size):
+    """
+    Забираем пачку писем домена: SENDING и срок аренды в next_attempt_at, чтобы их не взял другой отправитель
+    """
+    with transaction.atomic():
+        ids = list(due().filter(domain=domain).select_for_update(skip_locked=True).order_by('id').
+                   values_list('id', flat=True)[:batch_size])
+        OutboxMessage.objects.filter(id__in=ids).update(
+            state=StatusMail.SENDING, next_attempt_at=timezone.now() + timedelta(seconds=settings.MAIL_LEASE))
+    return list(OutboxMessage.objects.filter(id__in=ids).order_by('id'))
+
+
+def backoff(attempts):
+    """
+    Пауза перед следующей попыткой: удваивается с каждой неудачей, с разбросом, чтобы повторы не шли одной волной
+    """
+    delay = min(settings.MAIL_RETRY_BACKOFF * 2 ** (attempts - 1), settings.MAIL_RETRY_BACKOFF_MAX)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def send_batch(connection, batch):
+    """
+    Пачка через одно соединение. send_messages на каждое письмо, чтобы ошибка одного адреса не срывала
+    остальные; не открылось или оборвалось соединение - оставшиеся письма пачки повторим позже
+    """
+    delivered, errors = [], {}
+    try:
+        # открытое заранее соединение send_messages не закрывает после каждого письма
+        if connection.open():
+            connections.incr()
+    except Exception as error:
+        return retry(batch, [], {message.id: error for message in batch})
+
+    for position, message in enumerate(batch):
+        email = EmailMessage(message.subject, message.body, message.from_email, [message.to], connection=connection)
+        try:
+            connection.send_messages([email])
+            delivered.append(message.id)
+        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException) as error:
+            # сервер отказал этому письму, соединение живо
+            errors[message.id] = error
+        except Exception as error:
+            # соединение оборвалось, следующая пачка откроет новое
+            connection.close()
+            errors.update((rest.id, error) for rest in batch[position:])
+            break
+    return retry(batch, delivered, errors)
+
+
+def retry(batch, delivered, errors):
+    """
+    Отправленные - SENT, остальные ждут следующей попытки, после MAIL_MAX_ATTEMPTS - FAILED
+    """
+    now = timezone.now()
+    OutboxMessage.objects.filter(id__in=delivered).update(state=StatusMail.SENT, sent_at=now, error='')
+    sent.incr(len(delivered))
+    for message in batch:
+        if message.id not in errors:
+            continue
+        attempts = message.attempts + 1
+        if attempts >= settings.MAIL_MAX_ATTEMPTS:
+            state, next_attempt_at = StatusMail.FAILED, now
+            failed.incr()
+        else:
+            state, next_attempt_at = StatusMail.PENDING, now + backoff(attempts)
+            retried.incr()
+        OutboxMessage.objects.filter(id=message.id).update(state=state, attempts=attempts,
+                                                           next_attempt_at=next_attempt_at,
+                                                           error=str(errors[message.id])[:1000])
+    return len(delivered), len(errors)
+
+
+def drain(batch_size=None, connection=None):
+    """
+    Отправляем всё, что пора, по пачкам из MAIL_BATCH_SIZE писем одного домена через одно соединение с SMTP.
+    Возвращает (отправлено, не отправлено)
+    """
+    batch_size = batch_size or settings.MAIL_BATCH_SIZE
+    connection = connection or get_connection()
+    delivered = undelivered = 0
+    try:
+        while True:
+            progressed = False
+            domains = list(due().order_by().values_list('domain', flat=True).distinct()[:100])
+            for domain in domains:
+                slot = acquire_domain(domain)
+                if slot is None:
+                    continue
+                try:
+                    batch = claim(domain, batch_size)
+                    if not batch:
+                        continue
+                    progressed = True
+                    ok, errors = send_batch(connection, batch)
+                    delivered += ok
+                    undelivered += errors
+                finally:
+                    cache.delete(slot)
+            if not progressed:
+                break
+    finally:
+        connection.close()
+    return delivered, undelivered
+
+
+def next_attempt_in():
+    """
+    Через сколько секунд подойдёт ближайшая отложенная попытка, None - ждать нечего
+    """
+    nearest = OutboxMessage.objects.filter(state__in=[StatusMail.PENDING, StatusMail.SENDING]). \
+        order_by('next_attempt_at').values_list('next_attempt_at', flat=True).first()
+    if nearest is None:
+        return None
+    return max((nearest - timezone.now()).total_seconds(), 0)
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from orders.filters import parse_number
+from orders.importer import chunked
+from orders.models import ProductParameter
+
+
+class Command(BaseCommand):
+    help = 'Fill ProductParameter.numeric_value for parameters imported before it existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        rows = ProductParameter.objects.filter(numeric_value__isnull=True).order_by('id'). \
+            values_list('id', 'value').iterator()
+        total = 0
+        for chunk in chunked(rows, options['batch_size']):
+            numbers = [ProductParameter(id=pk, numeric_value=parse_number(value)) for pk, value in chunk]
+            numbers = [parameter for parameter in numbers if parameter.numeric_value is not None]
+            ProductParameter.objects.bulk_update(numbers, ['numeric_value'])
+            total += len(numbers)
+        self.stdout.write(f'{total} numeric values filled')
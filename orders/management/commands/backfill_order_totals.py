@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import OuterRef, Subquery
+
+from orders.importer import chunked
+from orders.models import Order, OrderItem, ProductInfo
+from orders.signals import order_total
+
+
+class Command(BaseCommand):
+    help = 'Fill OrderItem.price and Order.total_sum for orders created before they existed. Prices of old items ' \
+           'are taken from the current price list, the price at the time of the order is not known'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        price = Subquery(ProductInfo.objects.filter(pk=OuterRef('product_info_id')).values('price'))
+        items = OrderItem.objects.filter(price__isnull=True).order_by('id').values_list('id', flat=True).iterator()
+        filled = 0
+        for chunk in chunked(items, options['batch_size']):
+            filled += OrderItem.objects.filter(id__in=chunk).update(price=price)
+
+        orders = Order.objects.order_by('id').values_list('id', flat=True).iterator()
+        totals = 0
+        for chunk in chunked(orders, options['batch_size']):
+            # updated_at не трогаем: списки заказов и раньше показывали суммы по текущим ценам
+            totals += Order.objects.filter(id__in=chunk).update(total_sum=order_total())
+        self.stdout.write(f'{filled} item prices filled, {totals} order totals recalculated')
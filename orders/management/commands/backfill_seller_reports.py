@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from orders.reports import rebuild_order_lines, rebuild_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the seller order line projection and the per-shop report counters from placed orders. ' \
+           'Run backfill_order_totals first, so that old items have prices'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        # оформление заказов во время перестройки дописало бы строки, которые тут же удалятся
+        with transaction.atomic():
+            lines = rebuild_order_lines(options['batch_size'])
+            rebuild_stats(options['batch_size'])
+        self.stdout.write(f'{lines} order lines projected')
@@ -0,0 +1,101 @@
+import random
+import statistics
+import threading
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+
+from orders.checkout import CheckoutError, checkout
+from orders.models import Category, Contact, Order, OrderItem, Product, ProductInfo, Shop, User
+
+
+class Command(BaseCommand):
+    help = 'Fires --buyers simultaneous checkouts of one SKU with --stock items from --threads threads, checks that ' \
+           'nothing is oversold and reports throughput. Meant for PostgreSQL: SQLite serializes writers, there ' \
+           'checkouts that hit "database is locked" are retried and counted.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buyers', type=int, default=300)
+        parser.add_argument('--stock', type=int, default=100)
+        parser.add_argument('--threads', type=int, default=50)
+        parser.add_argument('--keep', action='store_true', help='keep generated users, orders and goods')
+
+    def handle(self, *args, **options):
+        run = uuid.uuid4().hex[:8]
+        seller = User.objects.create_user(email=f'bench-checkout-{run}@example.com', password=None, type='SHOP')
+        shop = Shop.objects.create(name='Checkout benchmark', user=seller)
+        category = Category.objects.create(name='Checkout benchmark')
+        product = Product.objects.create(name='Benchmark SKU', category=category)
+        info = ProductInfo.objects.create(product=product, shop=shop, external_id=1, name='Benchmark SKU',
+                                          quantity=options['stock'], price=1, price_rrc=1)
+
+        buyers = User.objects.bulk_create(
+            User(email=f'bench-checkout-{run}-{i}@example.com', username=f'{run}-{i}', is_active=True, type='CLIENT')
+            for i in range(options['buyers']))
+        contacts = Contact.objects.bulk_create(Contact(user=user, city='Moscow', phone='1') for user in buyers)
+        orders = Order.objects.bulk_create(Order(user=user, state='BASKET') for user in buyers)
+        OrderItem.objects.bulk_create(OrderItem(order=order, product_info=info, quantity=1) for order in orders)
+
+        jobs = [(order.id, order.user_id, contact.id) for order, contact in zip(orders, contacts)]
+        threads = min(options['threads'], len(jobs))
+        barrier = threading.Barrier(threads)
+        lock = threading.Lock()
+        result = {'sold': 0, 'sold_out': 0, 'retries': 0, 'errors': 0, 'timings': []}
+
+        def buyer(chunk):
+            barrier.wait()
+            try:
+                for job in chunk:
+                    started = time.perf_counter()
+                    outcome, retries = attempt(job)
+                    with lock:
+                        result[outcome] += 1
+                        result['retries'] += retries
+                        result['timings'].append(time.perf_counter() - started)
+            finally:
+                connection.close()
+
+        def attempt(job):
+            for retries in range(100):
+                try:
+                    checkout(*job)
+                    return 'sold', retries
+                except CheckoutError:
+                    return 'sold_out', retries
+                except OperationalError:
+                    time.sleep(random.uniform(0.001, 0.02))
+            return 'errors', retries
+
+        workers = [threading.Thread(target=buyer, args=(jobs[i::threads],)) for i in range(threads)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+        left = ProductInfo.objects.get(id=info.id).quantity
+        placed = Order.objects.filter(id__in=[order.id for order in orders], state='NEW').count()
+        timings = sorted(result['timings'])
+        self.stdout.write(f'{len(jobs)} checkouts from {threads} threads in {elapsed:.2f} s: '
+                          f'{len(jobs) / elapsed:.0f} checkouts/s, p50 {statistics.median(timings) * 1000:.1f} ms, '
+                          f'p99 {timings[int(len(timings) * 0.99) - 1] * 1000:.1f} ms')
+        self.stdout.write(f'sold {result["sold"]}, sold out {result["sold_out"]}, retries {result["retries"]}, '
+                          f'errors {result["errors"]}, stock left {left} of {options["stock"]}')
+
+        if not options['keep']:
+            User.objects.filter(email__startswith=f'bench-checkout-{run}').delete()
+            category.delete()
+
+        expected = min(options['stock'], len(jobs))
+        if result['sold'] != expected or placed != expected or left != options['stock'] - expected:
+            raise CommandError(f'Oversold or lost checkouts: expected {expected} sales, '
+                               f'got {result["sold"]} sales, {placed} new orders and {left} left in stock')
+        if connection.vendor != 'postgresql':
+            # SELECT ... FOR UPDATE здесь ничего не блокирует, продажи разводит очередь писателей базы
+            self.stdout.write(f'no oversell on {connection.vendor}: row locks were not exercised, run on PostgreSQL '
+                              f'to check them')
+            return
+        self.stdout.write('no oversell')
@@ -0,0 +1,97 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from orders.importer import CatalogImporter
+from orders.models import Shop, Category, Product, ProductInfo, Parameter, ProductParameter, User
+
+PARAMETERS = ('Диагональ (дюйм)', 'Разрешение (пикс)', 'Встроенная память (Гб)', 'Цвет')
+
+
+def make_item(i, categories=20):
+    return {
+        'id': 1000000 + i,
+        'category': 900000 + i % categories,
+        'model': f'bench/model-{i % 500}',
+        'name': f'Товар {i}',
+        'price': 1000 + i % 997,
+        'price_rrc': 1200 + i % 997,
+        'quantity': i % 50,
+        'parameters': {name: f'{name} {i % 7}' for name in PARAMETERS},
+    }
+
+
+def make_price_list(items, categories=20):
+    """
+    Синтетический прайс-лист в формате data/shop1.yaml
+    """
+    return {
+        'shop': 'Benchmark shop',
+        'categories': [{'id': 900000 + i, 'name': f'Категория {i}'} for i in range(categories)],
+        'goods': [make_item(i, categories) for i in range(items)],
+    }
+
+
+def legacy_import_yaml(user_id, data):
+    """
+    Построчный импорт, как он был устроен до CatalogImporter
+    """
+    shop, _ = Shop.objects.get_or_create(name=data['shop'], user_id=user_id)
+    for category in data['categories']:
+        category_object, _ = Category.objects.get_or_create(id=category['id'], name=category['name'])
+        category_object.shop.add(shop.id)
+        category_object.save()
+        ProductInfo.objects.filter(shop_id=shop.id).delete()
+    for item in data['goods']:
+        product, _ = Product.objects.get_or_create(name=item['name'], category_id=item['category'])
+        product_info = ProductInfo.objects.create(product_id=product.id,
+                                                  external_id=item['id'],
+                                                  model=item['model'],
+                                                  name=item['name'],
+                                                  price=item['price'],
+                                                  price_rrc=item['price_rrc'],
+                                                  quantity=item['quantity'],
+                                                  shop_id=shop.id)
+        for name, value in item['parameters'].items():
+            parameter_object, _ = Parameter.objects.get_or_create(name=name)
+            ProductParameter.objects.create(product_info_id=product_info.id,
+                                            parameter_id=parameter_object.id,
+                                            value=value)
+
+
+class Command(BaseCommand):
+    help = 'Compare query count and wall time of the legacy and the bulk price list import. ' \
+           'Every run is rolled back, but use a scratch database anyway.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, nargs='+', default=[10000, 100000])
+        parser.add_argument('--skip-legacy', action='store_true', help='do not run the row-by-row import')
+
+    def handle(self, *args, **options):
+        for items in options['items']:
+            data = make_price_list(items)
+            runners = [('bulk', lambda user_id: CatalogImporter(user_id).run(data))]
+            if not options['skip_legacy']:
+                runners.insert(0, ('legacy', lambda user_id: legacy_import_yaml(user_id, data)))
+
+            for label, runner in runners:
+                queries, seconds = self.measure(runner)
+                self.stdout.write(f'{items:>8} goods  {label:<7} {queries:>9} queries  {seconds:9.2f} s')
+
+    @staticmethod
+    def measure(runner):
+        queries = []
+
+        def count_queries(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with transaction.atomic():
+            user = User.objects.create_user(email='bench-import@example.com', password=None, type='SHOP')
+            with connection.execute_wrapper(count_queries):
+                started = time.perf_counter()
+                runner(user.id)
+                seconds = time.perf_counter() - started
+            transaction.set_rollback(True)
+        return len(queries), seconds
@@ -0,0 +1,120 @@
+import asyncio
+import json
+import time
+import uuid
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from orders.models import User
+from orders.throttling import TokenBucketThrottle
+
+
+async def asgi_request(application, method, path, body=b'', headers=(), client=('127.0.0.1', 50000)):
+    """
+    Один запрос прямо в ASGI-приложение (EShops_API.asgi.application) без сервера, возвращает (статус, тело)
+    """
+    path, _, query = path.partition('?')
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method, 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': query.encode(), 'root_path': '',
+        'headers': [(b'host', b'localhost'), (b'content-length', str(len(body)).encode()), *headers],
+        'client': client, 'server': ('localhost', 80),
+    }
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    response = {'body': b''}
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+        else:
+            response['body'] += message.get('body', b'')
+
+    await application(scope, receive, send)
+    return response['status'], response['body']
+
+
+async def load(call, requests, concurrency):
+    """
+    requests вызовов call(n) не больше чем concurrency одновременно, возвращает (длительности, секунд всего)
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    timings = []
+
+    async def one(n):
+        async with semaphore:
+            started = time.perf_counter()
+            await call(n)
+            timings.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(n) for n in range(requests)))
+    return sorted(timings), time.perf_counter() - started
+
+
+def percentile(timings, point):
+    return timings[min(len(timings) - 1, int(len(timings) * point / 100))]
+
+
+class Command(BaseCommand):
+    help = 'Login throughput under --concurrency clients on the ASGI application: the sync DRF login ' \
+           '(/auth/login/) against the async one (/auth/async/login/) with hashing in its own pool. ' \
+           'Catalog requests are sent alongside to show how much logins hold up the rest of the process'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--users', type=int, default=50)
+
+    def handle(self, *args, **options):
+        from EShops_API.asgi import application
+
+        run = uuid.uuid4().hex[:8]
+        password = 'Bench1Password'
+        users = User.objects.bulk_create(
+            User(email=f'bench-login-{run}-{i}@example.com', username=f'{run}-{i}', is_active=True,
+                 password=make_password(password)) for i in range(options['users']))
+        rates = TokenBucketThrottle.THROTTLE_RATES
+        TokenBucketThrottle.THROTTLE_RATES = {**rates, 'auth': None, 'anon': None, 'catalog': None}
+        try:
+            with override_settings(AUTH_INLINE_TOKEN=True):
+                for label, path in (('sync login', '/api/v1/auth/login/'),
+                                    ('async login', '/api/v1/auth/async/login/')):
+                    asyncio.run(self.compare(application, label, path, users, password, options))
+        finally:
+            TokenBucketThrottle.THROTTLE_RATES = rates
+            User.objects.filter(email__startswith=f'bench-login-{run}').delete()
+
+    async def compare(self, application, label, path, users, password, options):
+        bodies = [json.dumps({'email': user.email, 'password': password}).encode() for user in users]
+        failed = []
+
+        async def login(n):
+            status, body = await asgi_request(application, 'POST', path, bodies[n % len(bodies)],
+                                              [(b'content-type', b'application/json')])
+            if status != 200 or not json.loads(body)['Status']:
+                failed.append(body)
+
+        async def catalog(n):
+            await asgi_request(application, 'GET', '/api/v1/categories/')
+
+        timings, elapsed = await load(login, options['requests'], options['concurrency'])
+        self.stdout.write(f'{label:<12} {len(timings) / elapsed:6.1f} logins/s, '
+                          f'p50 {percentile(timings, 50) * 1000:7.1f} ms, '
+                          f'p99 {percentile(timings, 99) * 1000:7.1f} ms, failed {len(failed)}')
+
+        # то же под нагрузкой входа, и один клиент каталога по очереди
+        logins = asyncio.ensure_future(load(login, options['requests'], options['concurrency']))
+        catalog_timings = []
+        while not logins.done():
+            catalog_timings += (await load(catalog, 1, 1))[0]
+        await logins
+        catalog_timings.sort()
+        self.stdout.write(f'{"":<12} catalog during logins p50 {percentile(catalog_timings, 50) * 1000:.1f} ms, '
+                          f'p99 {percentile(catalog_timings, 99) * 1000:.1f} ms')
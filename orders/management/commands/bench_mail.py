@@ -0,0 +1,86 @@
+import socketserver
+import threading
+import time
+
+from django.core.mail import get_connection, send_mail
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from orders.mail import drain, enqueue
+
+
+class SMTPSink(socketserver.StreamRequestHandler):
+    """
+    Минимальный SMTP-сервер, который принимает и выбрасывает письма. Новое соединение ждёт handshake секунд -
+    столько у настоящего сервера занимают TCP, TLS и AUTH
+    """
+
+    def handle(self):
+        time.sleep(self.server.handshake)
+        self.reply('220 sink ESMTP')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command in (b'EHLO', b'HELO'):
+                self.reply('250 sink')
+            elif command == b'DATA':
+                self.reply('354 end with .')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                with self.server.lock:
+                    self.server.received += 1
+                self.reply('250 queued')
+            elif command == b'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('250 ok')
+
+    def reply(self, text):
+        self.wfile.write(text.encode() + b'\r\n')
+
+
+class Command(BaseCommand):
+    help = 'Sends --messages mails to a local SMTP sink one connection per mail (send_mail, as before the outbox) ' \
+           'and through the outbox sender, reports mails per second. Queued mails are rolled back.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=500)
+        parser.add_argument('--domains', type=int, default=5)
+        parser.add_argument('--handshake-ms', type=float, default=30,
+                            help='delay of a new SMTP connection, TLS and AUTH of a real server')
+
+    def handle(self, *args, **options):
+        server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), SMTPSink)
+        server.daemon_threads = True
+        server.handshake = options['handshake_ms'] / 1000
+        server.lock = threading.Lock()
+        server.received = 0
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        host, port = server.server_address
+        sink = {'host': host, 'port': port, 'username': '', 'password': '', 'use_tls': False, 'use_ssl': False,
+                'backend': 'django.core.mail.backends.smtp.EmailBackend'}
+        recipients = [f'user{i}@domain{i % options["domains"]}.example.com' for i in range(options['messages'])]
+        try:
+            started = time.perf_counter()
+            for to in recipients:
+                send_mail('subject', 'body', 'shop@example.com', [to], connection=get_connection(**sink))
+            self.report('send_mail', time.perf_counter() - started, len(recipients))
+
+            with transaction.atomic():
+                for to in recipients:
+                    enqueue(to, 'subject', 'body', 'shop@example.com')
+                started = time.perf_counter()
+                delivered, undelivered = drain(connection=get_connection(**sink))
+                self.report('outbox', time.perf_counter() - started, delivered)
+                transaction.set_rollback(True)
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.stdout.write(f'sink received {server.received} mails, undelivered {undelivered}')
+
+    def report(self, label, elapsed, count):
+        self.stdout.write(f'{label:<10} {count} mails in {elapsed:.2f} s: {count / elapsed:.0f} mails/s')
@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from orders.importer import CatalogImporter
+from orders.management.commands.bench_import import make_price_list
+from orders.management.commands.bench_search import make_goods
+from orders.models import ProductInfo, User
+from orders.pagination import KeysetPagination
+
+
+class Command(BaseCommand):
+    help = 'Latency of the first and of a deep catalog page with page numbers and with cursors. ' \
+           'Generated goods are rolled back unless --keep is given.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=400000)
+        parser.add_argument('--page', type=int, default=10000)
+        parser.add_argument('--keep', action='store_true', help='keep generated goods in the database')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if not ProductInfo.objects.filter(shop__name='Benchmark shop').exists():
+                self.stdout.write(f'importing {options["rows"]} goods...')
+                user = User.objects.create_user(email='bench-pages@example.com', password=None, type='SHOP')
+                header = make_price_list(0)
+                CatalogImporter(user.id).import_price_list(header['shop'], header['categories'],
+                                                           make_goods(options['rows']))
+
+            queryset = ProductInfo.objects.order_by('id')
+            factory = APIRequestFactory()
+            page = min(options['page'], queryset.count() // PageNumberPagination.page_size or 1)
+
+            for number in (1, page):
+                started = time.perf_counter()
+                PageNumberPagination().paginate_queryset(queryset, Request(factory.get('/', {'page': number})))
+                self.stdout.write(f'page number {number:>8}: {(time.perf_counter() - started) * 1000:8.1f} ms')
+
+            # до глубокой страницы идём по курсорам, время меряем только у первой и последней
+            request = Request(factory.get('/', {'pagination': 'cursor'}))
+            for number in range(1, page + 1):
+                started = time.perf_counter()
+                paginator = KeysetPagination()
+                paginator.paginate_queryset(queryset, request)
+                elapsed = time.perf_counter() - started
+                if number in (1, page):
+                    self.stdout.write(f'cursor page {number:>8}: {elapsed * 1000:8.1f} ms')
+                request = Request(factory.get(paginator.get_next_link()))
+
+            if not options['keep']:
+                transaction.set_rollback(True)
@@ -0,0 +1,64 @@
+import tempfile
+import time
+import tracemalloc
+
+import yaml
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from orders.importer import chunked
+from orders.management.commands.bench_import import make_item, make_price_list
+from orders.price_list import Loader, PriceListStream
+
+Dumper = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+
+
+def write_price_list(file, items):
+    """
+    Пишем синтетический прайс-лист по частям, чтобы не держать его целиком в памяти
+    """
+    header = make_price_list(0)
+    yaml.dump({'shop': header['shop'], 'categories': header['categories']}, file, Dumper=Dumper, allow_unicode=True)
+    file.write('goods:\n')
+    for chunk in chunked(range(items), 10000):
+        yaml.dump([make_item(i) for i in chunk], file, Dumper=Dumper, allow_unicode=True)
+
+
+class Command(BaseCommand):
+    help = 'Peak memory and time of parsing a price list with yaml.load and with PriceListStream'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, nargs='+', default=[1000, 100000, 1000000])
+        parser.add_argument('--skip-load', action='store_true', help='do not parse the whole document at once')
+
+    def handle(self, *args, **options):
+        for items in options['items']:
+            with tempfile.NamedTemporaryFile('w+', suffix='.yaml', encoding='utf-8') as file:
+                write_price_list(file, items)
+                file.flush()
+                runners = [('stream', self.stream)]
+                if not options['skip_load']:
+                    runners.insert(0, ('load', self.load))
+                for label, runner in runners:
+                    peak, seconds = self.measure(runner, file.name)
+                    self.stdout.write(f'{items:>8} goods  {label:<7} peak {peak / 2 ** 20:9.1f} MiB  {seconds:9.2f} s')
+
+    @staticmethod
+    def load(filename):
+        with open(filename, 'rb') as file:
+            return len(yaml.load(file, Loader)['goods'])
+
+    @staticmethod
+    def stream(filename):
+        with open(filename, 'rb') as file:
+            return sum(len(chunk) for chunk in chunked(PriceListStream(file).goods(), settings.IMPORT_BATCH_SIZE))
+
+    @staticmethod
+    def measure(runner, filename):
+        tracemalloc.start()
+        started = time.perf_counter()
+        runner(filename)
+        seconds = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return peak, seconds
@@ -0,0 +1,61 @@
+import json
+import statistics
+import time
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from orders.importer import CatalogImporter
+from orders.management.commands.bench_import import make_price_list
+from orders.management.commands.bench_search import make_goods
+from orders.models import ProductInfo, User
+from orders.renderers import UJSONRenderer
+
+
+def json_response(data):
+    """
+    Кодирование, как в JsonResponse: stdlib json, ASCII-экранирование и пробелы после разделителей
+    """
+    return json.dumps(data, cls=DjangoJSONEncoder).encode()
+
+
+class Command(BaseCommand):
+    help = 'Render time and payload size of a /products page with JsonResponse encoding, the DRF JSON renderer ' \
+           'and UJSONRenderer. Generated goods are rolled back unless --keep is given.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=500)
+        parser.add_argument('--keep', action='store_true', help='keep generated goods in the database')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = User.objects.filter(email='bench-render@example.com').first()
+            if user is None:
+                user = User.objects.create_user(email='bench-render@example.com', password=None, type='SHOP')
+            if not ProductInfo.objects.filter(shop__name='Benchmark shop').exists():
+                self.stdout.write(f'importing {options["rows"]} goods...')
+                header = make_price_list(0)
+                CatalogImporter(user.id).import_price_list(header['shop'], header['categories'],
+                                                           make_goods(options['rows']))
+
+            client = APIClient()
+            client.force_authenticate(user)
+            data = client.get('/api/v1/products/').data
+
+            for label, render in (('JsonResponse', json_response),
+                                  ('JSONRenderer', JSONRenderer().render),
+                                  ('UJSONRenderer', UJSONRenderer().render)):
+                timings = []
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    body = render(data)
+                    timings.append(time.perf_counter() - started)
+                self.stdout.write(f'{label:<14} p50 {statistics.median(timings) * 1000:6.3f} ms  '
+                                  f'{len(body):>8} bytes')
+
+            if not options['keep']:
+                transaction.set_rollback(True)
@@ -0,0 +1,68 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from orders.importer import CatalogImporter
+from orders.management.commands.bench_import import make_item, make_price_list
+from orders.models import ProductInfo, User
+from orders.search import get_search_backend
+
+KINDS = ('Смартфон', 'Телевизор', 'Ноутбук', 'Флешка', 'Наушники', 'Чехол', 'Планшет', 'Монитор')
+BRANDS = ('Apple', 'Samsung', 'Xiaomi', 'Huawei', 'Sony', 'Lenovo', 'Asus', 'Kingston', 'Philips', 'LG')
+TERMS = ('смартфон', 'Samsung', 'ноутбук asus', 'флеш', 'наушники sony 12', 'телевизор LG 4217')
+
+
+def make_goods(rows):
+    for i in range(rows):
+        item = make_item(i)
+        item['name'] = f'{KINDS[i % len(KINDS)]} {BRANDS[i // len(KINDS) % len(BRANDS)]} {i}'
+        yield item
+
+
+def like_search(queryset, term):
+    """
+    Поиск, как его делал SearchFilter по name и product__name
+    """
+    for word in term.split():
+        queryset = queryset.filter(Q(name__icontains=word) | Q(product__name__icontains=word))
+    return queryset.distinct()
+
+
+class Command(BaseCommand):
+    help = 'Catalog search latency of LIKE filtering and of the configured search backend. ' \
+           'Generated goods are rolled back unless --keep is given.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--keep', action='store_true', help='keep generated goods in the database')
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        with transaction.atomic():
+            if not ProductInfo.objects.filter(shop__name='Benchmark shop').exists():
+                self.stdout.write(f'importing {options["rows"]} goods...')
+                user = User.objects.create_user(email='bench-search@example.com', password=None, type='SHOP')
+                header = make_price_list(0)
+                CatalogImporter(user.id).import_price_list(header['shop'], header['categories'],
+                                                           make_goods(options['rows']))
+
+            queryset = ProductInfo.objects.select_related('shop', 'product__category')
+            for label, search in (('like', like_search), (type(backend).__name__, backend.search)):
+                timings = []
+                for _ in range(options['repeat']):
+                    for term in TERMS:
+                        started = time.perf_counter()
+                        found = search(queryset, term)
+                        found.count()
+                        list(found[:40])
+                        timings.append(time.perf_counter() - started)
+                timings.sort()
+                self.stdout.write(f'{label:<24} p50 {statistics.median(timings) * 1000:8.1f} ms  '
+                                  f'p95 {timings[int(len(timings) * 0.95) - 1] * 1000:8.1f} ms')
+
+            if not options['keep']:
+                transaction.set_rollback(True)
@@ -0,0 +1,92 @@
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from orders.importer import chunked
+from orders.models import Category, Order, Product, ProductInfo, SellerOrderLine, Shop, User
+from orders.reports import rebuild_stats
+from orders.views import SellerReportsViewSet, SellerViewSet
+
+VIEWS = [
+    ('summary', SellerReportsViewSet, 'list', {}),
+    ('daily', SellerReportsViewSet, 'daily', {}),
+    ('top 10', SellerReportsViewSet, 'top', {}),
+    ('orders page', SellerViewSet, 'list', {'pagination': 'cursor'}),
+]
+
+
+class Command(BaseCommand):
+    help = 'Time of the seller dashboard endpoints for a shop with --lines order lines, compared with aggregating ' \
+           'the lines on every request. Generated data is rolled back unless --keep is given.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, default=200000)
+        parser.add_argument('--goods', type=int, default=500)
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--keep', action='store_true', help='keep generated orders in the database')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            seller = self.generate(options)
+            factory = APIRequestFactory()
+
+            for label, viewset, action, params in VIEWS:
+                view = viewset.as_view({'get': action}, throttle_classes=[])
+                timings = []
+                for _ in range(options['repeat']):
+                    request = factory.get('/', params)
+                    force_authenticate(request, seller)
+                    started = time.perf_counter()
+                    view(request)
+                    timings.append(time.perf_counter() - started)
+                self.report(label, timings)
+
+            lines = SellerOrderLine.objects.filter(shop__user_id=seller.id)
+            for label, query in (
+                    ('summary over lines', lambda: lines.aggregate(Count('order', distinct=True), Sum('quantity'),
+                                                                   Sum('amount'))),
+                    ('top 10 over lines', lambda: list(lines.values('product_info_id').annotate(
+                        revenue=Sum('amount')).order_by('-revenue')[:10]))):
+                timings = []
+                for _ in range(max(options['repeat'] // 10, 3)):
+                    started = time.perf_counter()
+                    query()
+                    timings.append(time.perf_counter() - started)
+                self.report(label, timings)
+
+            if not options['keep']:
+                transaction.set_rollback(True)
+
+    def generate(self, options):
+        self.stdout.write(f'generating {options["lines"]} order lines...')
+        seller = User.objects.create_user(email='bench-reports@example.com', password=None, type='SHOP')
+        buyer = User.objects.create_user(email='bench-reports-buyer@example.com', password=None)
+        shop = Shop.objects.create(name='Reports benchmark', user=seller)
+        product = Product.objects.create(name='Benchmark', category=Category.objects.create(name='Benchmark'))
+        goods = ProductInfo.objects.bulk_create(
+            ProductInfo(product=product, shop=shop, external_id=i, name=f'SKU {i}', quantity=0, price=100 + i,
+                        price_rrc=100 + i) for i in range(options['goods']))
+        today = timezone.localdate()
+        # три позиции в заказе
+        for chunk in chunked(range(options['lines'] // 3), 5000):
+            orders = Order.objects.bulk_create(Order(user=buyer, state='NEW') for _ in chunk)
+            SellerOrderLine.objects.bulk_create(
+                SellerOrderLine(shop=shop, order=order, user=buyer, product_info=info, name=info.name,
+                                quantity=1 + k, price=info.price, amount=(1 + k) * info.price,
+                                date=today - timedelta(days=n % options['days']))
+                for n, order in zip(chunk, orders)
+                for k, info in enumerate(goods[(n * 3 + j) % len(goods)] for j in range(3)))
+        rebuild_stats(5000)
+        return seller
+
+    def report(self, label, timings):
+        timings.sort()
+        self.stdout.write(f'{label:<20} p50 {statistics.median(timings) * 1000:8.2f} ms  '
+                          f'max {timings[-1] * 1000:8.2f} ms')
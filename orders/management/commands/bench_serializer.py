@@ -0,0 +1,62 @@
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from orders.importer import CatalogImporter
+from orders.management.commands.bench_import import make_price_list
+from orders.management.commands.bench_search import make_goods
+from orders.models import ProductInfo, User
+from orders.renderers import UJSONRenderer
+from orders.serializers import ProductInfoSerializer, ProductInfoFastSerializer
+
+
+def drf_page(queryset, offset, size):
+    page = queryset.select_related('product__category').prefetch_related('product_parameters__parameter')
+    return JSONRenderer().render(ProductInfoSerializer(page[offset:offset + size], many=True).data)
+
+
+def fast_page(queryset, offset, size):
+    rows = ProductInfoFastSerializer.rows(queryset)[offset:offset + size]
+    return UJSONRenderer().render(ProductInfoFastSerializer(rows, many=True).data)
+
+
+class Command(BaseCommand):
+    help = 'Time to fetch, serialize and render a catalog page with ProductInfoSerializer and with the fast path. ' \
+           'Generated goods are rolled back unless --keep is given.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--page-size', type=int, default=40)
+        parser.add_argument('--repeat', type=int, default=200)
+        parser.add_argument('--keep', action='store_true', help='keep generated goods in the database')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if not ProductInfo.objects.filter(shop__name='Benchmark shop').exists():
+                self.stdout.write(f'importing {options["rows"]} goods...')
+                user = User.objects.create_user(email='bench-serializer@example.com', password=None, type='SHOP')
+                header = make_price_list(0)
+                CatalogImporter(user.id).import_price_list(header['shop'], header['categories'],
+                                                           make_goods(options['rows']))
+
+            queryset = ProductInfo.objects.order_by('id')
+            size = options['page_size']
+            pages = max(queryset.count() // size, 1)
+            assert json.loads(drf_page(queryset, 0, size)) == json.loads(fast_page(queryset, 0, size))
+
+            for label, render in (('ProductInfoSerializer', drf_page), ('ProductInfoFastSerializer', fast_page)):
+                timings = []
+                for i in range(options['repeat']):
+                    started = time.perf_counter()
+                    render(queryset, i % pages * size, size)
+                    timings.append(time.perf_counter() - started)
+                timings.sort()
+                self.stdout.write(f'{label:<26} p50 {statistics.median(timings) * 1000:7.2f} ms  '
+                                  f'p95 {timings[int(len(timings) * 0.95) - 1] * 1000:7.2f} ms per page of {size}')
+
+            if not options['keep']:
+                transaction.set_rollback(True)
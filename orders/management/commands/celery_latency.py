@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from orders.routing import latency_report
+
+
+class Command(BaseCommand):
+    help = 'Percentiles of Celery task latency per queue collected by the workers: waiting in the queue ' \
+           '(enqueue to start), running (start to finish) and total. Values are bucket upper bounds'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"queue":<15}{"stage":<8}{"count":>10}{"p50":>10}{"p90":>10}{"p99":>10}')
+        for queue, stages in latency_report().items():
+            for stage, values in stages.items():
+                self.stdout.write(f'{queue:<15}{stage:<8}{values["count"]:>10}' + ''.join(
+                    f'{self.format(values[point]):>10}' for point in ('p50', 'p90', 'p99')))
+
+    @staticmethod
+    def format(seconds):
+        if seconds is None:
+            return '-'
+        if seconds == float('inf'):
+            return '>900 s'
+        return f'{seconds * 1000:g} ms' if seconds < 1 else f'{seconds:g} s'
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from orders.importer import chunked
+from orders.models import ProductInfo
+from orders.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Create search indexes and recompute ProductInfo.search_vector for the whole catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.IMPORT_BATCH_SIZE * 10)
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        backend.install(connection)
+        ids = ProductInfo.objects.order_by('id').values_list('id', flat=True).iterator()
+        total = 0
+        for chunk in chunked(ids, options['batch_size']):
+            backend.update(ProductInfo.objects.filter(id__in=chunk))
+            total += len(chunk)
+        self.stdout.write(f'{type(backend).__name__}: {total} goods indexed')
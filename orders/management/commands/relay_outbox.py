@@ -0,0 +1,41 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection
+from kombu.exceptions import OperationalError
+
+from EShops_API.celery import app
+from orders.outbox import purge, relay
+
+
+class Command(BaseCommand):
+    help = 'Publishes the Celery tasks written to the outbox by requests once their transactions commit. ' \
+           'Run one or more next to the workers; --once publishes what is pending and exits'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.OUTBOX_BATCH_SIZE)
+        parser.add_argument('--once', action='store_true')
+
+    def handle(self, *args, **options):
+        app.loader.import_default_modules()
+        purged_at = 0
+        while True:
+            try:
+                count = relay(options['batch_size'])
+                while options['once'] and count:
+                    count = relay(options['batch_size'])
+                if time.monotonic() - purged_at > 60:
+                    purge()
+                    purged_at = time.monotonic()
+            except (DatabaseError, OperationalError) as error:
+                # брокер или база недоступны: события остались в таблице, пробуем позже
+                self.stderr.write(f'outbox relay: {error}')
+                connection.close()
+                count = 0
+                if not options['once']:
+                    time.sleep(1)
+            if options['once']:
+                return
+            if count < options['batch_size']:
+                time.sleep(settings.OUTBOX_POLL_INTERVAL)
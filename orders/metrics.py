@@ -0,0 +1,124 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+_counters = {}
+
+
+class Counter:
+    """
+    Счётчик в общем кэше, одинаковый для всех воркеров и процессов.
+
+    Приращения копятся в процессе и уходят в кэш не чаще раза в METRICS_FLUSH_INTERVAL секунд, чтобы счётчик
+    на горячем пути не стоил запроса к Redis.
+    """
+
+    def __init__(self, name, description=''):
+        self.name = name
+        self.description = description
+        self.key = f'metrics:{name}'
+        self._pending = 0
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+        _counters[name] = self
+
+    def incr(self, delta=1):
+        with self._lock:
+            self._pending += delta
+            if time.monotonic() - self._flushed_at < getattr(settings, 'METRICS_FLUSH_INTERVAL', 1):
+                return
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            delta, self._pending = self._pending, 0
+            self._flushed_at = time.monotonic()
+        if not delta or cache.add(self.key, delta, timeout=None):
+            return
+        try:
+            cache.incr(self.key, delta)
+        except ValueError:
+            cache.add(self.key, delta, timeout=None)
+
+    @property
+    def value(self):
+        self.flush()
+        return cache.get(self.key, 0)
+
+
+class Timer:
+    """
+    Число замеров и их суммарная длительность в микросекундах, среднее = total_us / count
+    """
+
+    def __init__(self, name, description=''):
+        self.count = counter(f'{name}.count', description)
+        self.total = counter(f'{name}.total_us', description)
+
+    def observe(self, seconds):
+        self.count.incr()
+        self.total.incr(int(seconds * 1000000))
+
+
+class Histogram:
+    """
+    Распределение длительностей по корзинам BUCKETS (секунды): счётчик на корзину, перцентили с точностью до границы
+    """
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, float('inf'))
+
+    def __init__(self, name, description=''):
+        self.name = name
+        self.buckets = [counter(f'{name}.le_{bound:g}', description) for bound in self.BUCKETS]
+
+    def observe(self, seconds):
+        for bound, item in zip(self.BUCKETS, self.buckets):
+            if seconds <= bound:
+                item.incr()
+                return
+
+    def percentiles(self, *points):
+        """
+        Верхние границы корзин, в которые попадают перцентили points (0-100), None - замеров не было
+        """
+        for item in self.buckets:
+            item.flush()
+        values = cache.get_many([item.key for item in self.buckets])
+        counts = [values.get(item.key, 0) for item in self.buckets]
+        total = sum(counts)
+        if not total:
+            return [None] * len(points)
+        result = []
+        for point in points:
+            seen = 0
+            for bound, count in zip(self.BUCKETS, counts):
+                seen += count
+                if seen >= total * point / 100:
+                    result.append(bound)
+                    break
+        return result
+
+
+def counter(name, description=''):
+    """
+    Счётчик с именем name, повторный вызов возвращает тот же объект
+    """
+    return _counters.get(name) or Counter(name, description)
+
+
+def snapshot():
+    """
+    Значения всех объявленных счётчиков одним запросом к кэшу, накопленное в этом процессе сначала сбрасывается
+    """
+    for item in _counters.values():
+        item.flush()
+    values = cache.get_many([item.key for item in _counters.values()])
+    return {name: values.get(item.key, 0) for name, item in sorted(_counters.items())}
+
+
+def reset():
+    for item in _counters.values():
+        with item._lock:
+            item._pending = 0
+    cache.delete_many([item.key for item in _counters.values()])
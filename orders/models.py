@@ -1,5 +1,7 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.db.models import UniqueConstraint
+from django.utils import timezone
 from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.validators import UnicodeUsernameValidator
@@ -186,6 +188,8 @@ class ProductInfo(models.Model):
         choices=TypeAvailability.choices,
         default=TypeAvailability.STOCK
     )
+    # индексы создаёт поисковый бэкенд, см. orders/search.py
+    search_vector = SearchVectorField('Поисковый вектор', null=True, editable=False)
 
     class Meta:
         verbose_name = 'Информация о продукте'
@@ -193,6 +197,9 @@ class ProductInfo(models.Model):
         constraints = [
             UniqueConstraint(fields=['product', 'shop', 'external_id'], name='unique_product_info'),
         ]
+        indexes = [
+            models.Index(fields=['shop', 'external_id'], name='product_info_shop_external'),
+        ]
 
     def __str__(self):
         return f'{self.product} in {self.shop} qnt-{self.quantity} price-{self.price} {self.availability}'
@@ -226,6 +233,7 @@ class ProductParameter(models.Model):
         on_delete=models.CASCADE,
     )
     value = models.CharField('Значение', max_length=80)
+    numeric_value = models.FloatField('Числовое значение', null=True, blank=True)
 
     class Meta:
         verbose_name = 'Параметр'
@@ -233,6 +241,9 @@ class ProductParameter(models.Model):
         constraints = [
             UniqueConstraint(fields=['product_info', 'parameter'], name='unique_product_parameter')
         ]
+        indexes = [
+            models.Index(fields=['parameter', 'numeric_value'], name='product_parameter_numeric'),
+        ]
 
     def __str__(self):
         return f'{self.product_info.name} {self.parameter}'
@@ -271,6 +282,7 @@ class Order(models.Model):
         on_delete=models.CASCADE,
     )
     date = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField('Изменён', auto_now=True)
     state = models.TextField(
         'Cтатус',
         choices=StatusOrders.choices,
@@ -283,10 +295,16 @@ class Order(models.Model):
         null=True,
         on_delete=models.CASCADE,
     )
+    # сумма по ценам позиций, пересчитывается при каждом изменении позиций, см. orders/signals.py
+    total_sum = models.PositiveIntegerField('Сумма', default=0)
 
     class Meta:
         verbose_name = 'Заказ'
         verbose_name_plural = 'Cписок заказов'
+        indexes = [
+            # списки заказов пользователя листаются по курсору от новых к старым
+            models.Index(fields=['user', '-id'], name='order_user_id'),
+        ]
 
     def __str__(self):
         return f'{self.user.company} {self.user.last_name} {self.user.first_name} {self.state}'
@@ -308,6 +326,8 @@ class OrderItem(models.Model):
         on_delete=models.CASCADE,
     )
     quantity = models.PositiveIntegerField('Количество')
+    # цена за единицу на момент добавления в корзину, при оформлении заказа фиксируется текущая
+    price = models.PositiveIntegerField('Цена', null=True, blank=True)
 
     class Meta:
         verbose_name = 'Заказанная позиция'
@@ -319,6 +339,11 @@ class OrderItem(models.Model):
     def __str__(self):
         return f'{self.product_info.product} by {self.order}'
 
+    def save(self, *args, **kwargs):
+        if self.price is None:
+            self.price = ProductInfo.objects.values_list('price', flat=True).get(pk=self.product_info_id)
+        super().save(*args, **kwargs)
+
 
 class ConfirmEmailToken(models.Model):
     user = models.ForeignKey(
@@ -345,3 +370,259 @@ class ConfirmEmailToken(models.Model):
     @staticmethod
     def generate_key():
         return get_token_generator().generate_token()
+
+
+class StatusImport(models.TextChoices):
+    PENDING = 'PENDING', 'Ожидает'
+    RUNNING = 'RUNNING', 'Выполняется'
+    DONE = 'DONE', 'Завершён'
+    FAILED = 'FAILED', 'Ошибка'
+
+
+class ImportJob(models.Model):
+    user = models.ForeignKey(
+        User,
+        verbose_name='Пользователь',
+        related_name='import_jobs',
+        on_delete=models.CASCADE,
+    )
+    shop = models.ForeignKey(
+        Shop,
+        verbose_name='Магазин',
+        related_name='import_jobs',
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+    )
+    filename = models.CharField('Файл прайс-листа', max_length=200)
+    mode = models.CharField('Режим импорта', max_length=20, default='incremental')
+    state = models.TextField(
+        'Статус',
+        choices=StatusImport.choices,
+        default=StatusImport.PENDING,
+    )
+    total = models.PositiveIntegerField('Товаров в прайс-листе', default=0)
+    processed = models.PositiveIntegerField('Обработано товаров', default=0)
+    summary = models.JSONField('Сводка изменений', default=dict, blank=True)
+    error = models.TextField('Ошибка', blank=True)
+    created_at = models.DateTimeField('Дата создания', auto_now_add=True)
+    started_at = models.DateTimeField('Начало импорта', null=True, blank=True)
+    finished_at = models.DateTimeField('Окончание импорта', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Импорт прайс-листа'
+        verbose_name_plural = 'Список импортов прайс-листов'
+        ordering = ('-created_at',)
+
+    def __str__(self):
+        return f'{self.filename} {self.state} {self.processed}/{self.total}'
+
+
+class ImportShard(models.Model):
+    job = models.ForeignKey(
+        ImportJob,
+        verbose_name='Импорт',
+        related_name='shards',
+        on_delete=models.CASCADE,
+    )
+    index = models.PositiveIntegerField('Номер части')
+    filename = models.CharField('Файл части', max_length=200)
+    size = models.PositiveIntegerField('Товаров в части')
+    state = models.TextField(
+        'Статус',
+        choices=StatusImport.choices,
+        default=StatusImport.PENDING,
+    )
+    summary = models.JSONField('Сводка изменений', default=dict, blank=True)
+    finished_at = models.DateTimeField('Окончание импорта', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Часть импорта'
+        verbose_name_plural = 'Список частей импорта'
+        constraints = [
+            UniqueConstraint(fields=['job', 'index'], name='unique_import_shard'),
+        ]
+
+    def __str__(self):
+        return f'{self.job_id}/{self.index} {self.state}'
+
+
+class SellerOrderLine(models.Model):
+    """
+    Проекция оформленных позиций по магазинам для отчётов продавцов, заполняется при оформлении заказа
+    """
+    shop = models.ForeignKey(
+        Shop,
+        verbose_name='Магазин',
+        related_name='order_lines',
+        on_delete=models.CASCADE,
+    )
+    order = models.ForeignKey(
+        Order,
+        verbose_name='Заказ',
+        related_name='seller_lines',
+        on_delete=models.CASCADE,
+    )
+    user = models.ForeignKey(
+        User,
+        verbose_name='Покупатель',
+        related_name='seller_lines',
+        on_delete=models.CASCADE,
+    )
+    # товар может быть удалён из прайс-листа, а строка отчёта остаётся
+    product_info = models.ForeignKey(
+        ProductInfo,
+        verbose_name='Информация о продукте',
+        related_name='seller_lines',
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+    )
+    name = models.CharField('Название', max_length=50)
+    quantity = models.PositiveIntegerField('Количество')
+    price = models.PositiveIntegerField('Цена')
+    amount = models.PositiveBigIntegerField('Сумма')
+    date = models.DateField('Дата заказа')
+
+    class Meta:
+        verbose_name = 'Позиция в отчёте продавца'
+        verbose_name_plural = 'Позиции в отчётах продавцов'
+        constraints = [
+            UniqueConstraint(fields=['order', 'product_info'], name='unique_seller_order_line'),
+        ]
+        indexes = [
+            # заказы магазина листаются по курсору от новых к старым
+            models.Index(fields=['shop', '-order'], name='seller_line_shop_order'),
+        ]
+
+    def __str__(self):
+        return f'{self.shop_id} {self.order_id} {self.name} x{self.quantity}'
+
+
+class SellerDailyStat(models.Model):
+    """
+    Выручка магазина за день, увеличивается при оформлении заказа
+    """
+    shop = models.ForeignKey(
+        Shop,
+        verbose_name='Магазин',
+        related_name='daily_stats',
+        on_delete=models.CASCADE,
+    )
+    date = models.DateField('Дата')
+    orders = models.PositiveIntegerField('Заказов', default=0)
+    units = models.PositiveIntegerField('Продано единиц', default=0)
+    revenue = models.PositiveBigIntegerField('Выручка', default=0)
+
+    class Meta:
+        verbose_name = 'Выручка магазина за день'
+        verbose_name_plural = 'Выручка магазинов по дням'
+        constraints = [
+            UniqueConstraint(fields=['shop', 'date'], name='unique_seller_daily_stat'),
+        ]
+
+    def __str__(self):
+        return f'{self.shop_id} {self.date} {self.revenue}'
+
+
+class SellerProductStat(models.Model):
+    """
+    Продажи товара магазина за всё время, для топа товаров
+    """
+    shop = models.ForeignKey(
+        Shop,
+        verbose_name='Магазин',
+        related_name='product_stats',
+        on_delete=models.CASCADE,
+    )
+    product_info = models.ForeignKey(
+        ProductInfo,
+        verbose_name='Информация о продукте',
+        related_name='seller_stats',
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+    )
+    name = models.CharField('Название', max_length=50)
+    units = models.PositiveIntegerField('Продано единиц', default=0)
+    revenue = models.PositiveBigIntegerField('Выручка', default=0)
+
+    class Meta:
+        verbose_name = 'Продажи товара'
+        verbose_name_plural = 'Продажи товаров'
+        constraints = [
+            UniqueConstraint(fields=['shop', 'product_info'], name='unique_seller_product_stat'),
+        ]
+        indexes = [
+            models.Index(fields=['shop', '-revenue'], name='seller_product_revenue'),
+        ]
+
+    def __str__(self):
+        return f'{self.shop_id} {self.name} {self.revenue}'
+
+
+class StatusMail(models.TextChoices):
+    PENDING = 'PENDING', 'Ожидает отправки'
+    SENDING = 'SENDING', 'Отправляется'
+    SENT = 'SENT', 'Отправлено'
+    FAILED = 'FAILED', 'Не отправлено'
+
+
+class OutboxMessage(models.Model):
+    """
+    Письмо в очереди на отправку, см. orders/mail.py
+    """
+    to = models.EmailField('Получатель')
+    # домен получателя, по нему ограничивается число одновременных отправителей
+    domain = models.CharField('Домен получателя', max_length=255)
+    from_email = models.CharField('Отправитель', max_length=255, blank=True)
+    subject = models.CharField('Тема', max_length=255, blank=True)
+    body = models.TextField('Текст')
+    state = models.TextField(
+        'Статус',
+        choices=StatusMail.choices,
+        default=StatusMail.PENDING,
+    )
+    attempts = models.PositiveIntegerField('Попыток', default=0)
+    # для PENDING - когда можно отправлять, для SENDING - когда отправитель считается упавшим
+    next_attempt_at = models.DateTimeField('Следующая попытка', default=timezone.now)
+    error = models.TextField('Ошибка', blank=True)
+    created_at = models.DateTimeField('Дата создания', auto_now_add=True)
+    sent_at = models.DateTimeField('Дата отправки', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Письмо'
+        verbose_name_plural = 'Очередь писем'
+        indexes = [
+            models.Index(fields=['state', 'next_attempt_at'], name='outbox_message_due'),
+        ]
+
+    def __str__(self):
+        return f'{self.to} {self.subject} {self.state}'
+
+
+class OutboxEvent(models.Model):
+    """
+    Задача Celery, записанная в транзакции изменения, которое её вызвало; в брокер её отправляет relay_outbox
+    """
+    task = models.CharField('Задача', max_length=255)
+    args = models.JSONField('Аргументы', default=list)
+    kwargs = models.JSONField('Именованные аргументы', default=dict)
+    # повторное событие с тем же ключом не записывается
+    key = models.CharField('Ключ', max_length=255, null=True, blank=True, unique=True)
+    created_at = models.DateTimeField('Дата создания', auto_now_add=True)
+    # задача выполняется не раньше этого времени
+    eta = models.DateTimeField('Запуск не раньше', null=True, blank=True)
+    published_at = models.DateTimeField('Дата отправки', null=True, blank=True)
+    # событие, которое не удалось отправить (неизвестная задача): оно снято с отправки и не удаляется purge
+    error = models.TextField('Ошибка', blank=True)
+
+    class Meta:
+        verbose_name = 'Событие'
+        verbose_name_plural = 'Очередь событий'
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(published_at__isnull=True), name='outbox_event_pending'),
+        ]
+
+    def __str__(self):
+        return f'{self.task} {self.args} {self.kwargs}'
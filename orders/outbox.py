@@ -0,0 +1,71 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from EShops_API.celery import app
+
+from . import metrics
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+published = metrics.counter('outbox.published', 'Событие отправлено в брокер')
+skipped = metrics.counter('outbox.skipped', 'Событие снято с отправки: задача не найдена')
+lag = metrics.Timer('outbox.lag', 'От записи события до отправки в брокер')
+
+
+def emit(task, *args, key=None, eta=None, **kwargs):
+    """
+    Вместо task.delay(*args, **kwargs) в запросе: событие пишется в текущую транзакцию и уходит в брокер только после
+    её коммита, так что воркер не увидит незакоммиченных строк, а запрос не ждёт Redis.
+    Событие с уже записанным key не добавляется, например повторная отправка формы; eta - запуск не раньше
+    """
+    OutboxEvent.objects.bulk_create([OutboxEvent(task=task.name, args=list(args), kwargs=kwargs, key=key, eta=eta)],
+                                    ignore_conflicts=key is not None)
+
+
+def relay(batch_size=None):
+    """
+    Одна пачка событий в брокер через одно соединение, возвращает число обработанных.
+    Строки пачки заблокированы до коммита, параллельный relay берёт следующие. Если коммит не прошёл после отправки,
+    событие уйдёт ещё раз с тем же task_id (outbox-<id>), задачи должны это переносить
+    """
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    with transaction.atomic():
+        events = list(OutboxEvent.objects.filter(published_at__isnull=True).select_for_update(skip_locked=True).
+                      order_by('id')[:batch_size])
+        if not events:
+            return 0
+        now = timezone.now()
+        failed = []
+        with app.producer_or_acquire() as producer:
+            for event in events:
+                try:
+                    task = app.tasks[event.task]
+                except KeyError:
+                    # переименованная или удалённая задача не должна держать очередь: событие снимается с ошибкой
+                    logger.error('Outbox event %s: unknown task %s', event.id, event.task)
+                    failed.append(event)
+                    continue
+                task.apply_async(event.args, event.kwargs, task_id=f'outbox-{event.id}', eta=event.eta,
+                                 producer=producer)
+                lag.observe((now - event.created_at).total_seconds())
+        for event in failed:
+            OutboxEvent.objects.filter(id=event.id).update(published_at=now, error=f'Unknown task {event.task}')
+        OutboxEvent.objects.filter(id__in=[event.id for event in events if event not in failed]).update(
+            published_at=now)
+    skipped.incr(len(failed))
+    published.incr(len(events) - len(failed))
+    return len(events)
+
+
+def purge():
+    """
+    Отправленные события нужны только для проверки ключей повторов, храним их OUTBOX_KEEP секунд.
+    Снятые с ошибкой остаются для разбора
+    """
+    return OutboxEvent.objects.filter(
+        published_at__lt=timezone.now() - timedelta(seconds=settings.OUTBOX_KEEP), error='').delete()[0]
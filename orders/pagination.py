@@ -0,0 +1,69 @@
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+PAGINATION_PARAM = 'pagination'
+
+CURSOR_PARAMETERS = [
+    OpenApiParameter(PAGINATION_PARAM, OpenApiTypes.STR, enum=['cursor'],
+                     description='cursor - pages with next/previous cursors instead of page numbers'),
+    OpenApiParameter('cursor', OpenApiTypes.STR, description='Opaque cursor from the next/previous link'),
+    OpenApiParameter('page_size', OpenApiTypes.INT, description='Items per cursor page'),
+]
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Keyset pagination over a unique indexed key.
+
+    Every page is a single `WHERE id > <last id> ORDER BY id LIMIT n` query without COUNT(*) and OFFSET, so a deep
+    page costs the same as the first one. Clients opt in with ?pagination=cursor and follow the next/previous links.
+    """
+
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+    def __init__(self, ordering=None):
+        if ordering is not None:
+            self.ordering = ordering
+
+    @staticmethod
+    def requested(request):
+        if request is None:
+            return False
+        return request.query_params.get(PAGINATION_PARAM) == 'cursor' or 'cursor' in request.query_params
+
+
+class OptInCursorPaginationMixin:
+    """
+    Для GenericViewSet: страницы по курсору, если клиент их запросил, иначе обычная pagination_class
+    """
+
+    cursor_ordering = 'id'
+    # параметры со своим порядком выдачи, например ?search= по релевантности: с ними страницы обычные,
+    # курсор по cursor_ordering этот порядок потерял бы
+    cursor_ordered_by = ()
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            request = getattr(self, 'request', None)
+            if KeysetPagination.requested(request) and \
+                    not any(request.query_params.get(param) for param in self.cursor_ordered_by):
+                self._paginator = KeysetPagination(self.cursor_ordering)
+            else:
+                self._paginator = self.pagination_class() if self.pagination_class else None
+        return self._paginator
+
+
+def paginated_response(request, view, queryset, serializer_class, ordering='-id', **serializer_kwargs):
+    """
+    Для ViewSet без пагинации: весь список, как раньше, или страница по курсору, если клиент её запросил
+    """
+    if not KeysetPagination.requested(request):
+        return Response(serializer_class(queryset, many=True, **serializer_kwargs).data)
+    paginator = KeysetPagination(ordering)
+    page = paginator.paginate_queryset(queryset, request, view)
+    return paginator.get_paginated_response(serializer_class(page, many=True, **serializer_kwargs).data)
@@ -0,0 +1,25 @@
+import ujson
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+from .renderers import UJSONRenderer
+
+
+class UJSONParser(JSONParser):
+    """
+    JSON parser on ujson
+    """
+
+    renderer_class = UJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            data = stream.read() if stream is not None else b''
+            if encoding.lower().replace('-', '') != 'utf8':
+                data = data.decode(encoding)
+            return ujson.loads(data)
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
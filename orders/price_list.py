@@ -0,0 +1,118 @@
+import yaml
+from yaml.events import (AliasEvent, MappingEndEvent, MappingStartEvent, ScalarEvent, SequenceEndEvent,
+                         SequenceStartEvent)
+
+# libyaml, если PyYAML собран с ним, иначе чистый Python
+Loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+HEADER_KEYS = {'shop', 'categories'}
+
+
+class PriceListStream:
+    """
+    Incremental reader of a seller price list.
+
+    The document is consumed as a stream of parser events, so only the header (shop and categories) and the current
+    item of the goods sequence are kept in memory. Goods are expected after the header as in data/shop1.yaml,
+    otherwise they are buffered until the header is read.
+    """
+
+    def __init__(self, stream):
+        self._events = yaml.parse(stream, Loader=Loader)
+        self._resolver = yaml.resolver.Resolver()
+        self._constructor = yaml.constructor.SafeConstructor()
+        self._anchors = {}
+        self._buffered = []
+        self._finished = False
+        self.header = {}
+        self._read_header()
+
+    @property
+    def shop(self):
+        return self.header['shop']
+
+    @property
+    def categories(self):
+        return self.header['categories']
+
+    def goods(self):
+        """
+        Итератор по товарам прайс-листа, разбирается по мере чтения
+        """
+        buffered, self._buffered = self._buffered, []
+        yield from buffered
+        while not self._finished:
+            key = self._next_key()
+            if key == 'goods':
+                yield from self._sequence()
+            elif key is not None:
+                self.header[key] = self._build(next(self._events))
+
+    def _read_header(self):
+        for event in self._events:
+            if isinstance(event, MappingStartEvent):
+                break
+        else:
+            raise ValueError('Price list is not a mapping')
+
+        while not HEADER_KEYS <= self.header.keys() and not self._finished:
+            key = self._next_key()
+            if key == 'goods':
+                self._buffered.extend(self._sequence())
+            elif key is not None:
+                self.header[key] = self._build(next(self._events))
+
+        missing = HEADER_KEYS - self.header.keys()
+        if missing:
+            raise ValueError(f'Price list has no {", ".join(sorted(missing))}')
+
+    def _next_key(self):
+        event = next(self._events)
+        if isinstance(event, MappingEndEvent):
+            self._finished = True
+            return None
+        return self._build(event)
+
+    def _sequence(self):
+        event = next(self._events)
+        if isinstance(event, ScalarEvent):
+            # пустое значение "goods:"
+            return
+        if not isinstance(event, SequenceStartEvent):
+            raise ValueError('Goods must be a sequence')
+        for event in self._events:
+            if isinstance(event, SequenceEndEvent):
+                return
+            yield self._build(event)
+
+    def _build(self, event):
+        if isinstance(event, AliasEvent):
+            return self._anchors[event.anchor]
+        if isinstance(event, ScalarEvent):
+            value = self._scalar(event)
+        elif isinstance(event, SequenceStartEvent):
+            value = []
+            for item in self._events:
+                if isinstance(item, SequenceEndEvent):
+                    break
+                value.append(self._build(item))
+        elif isinstance(event, MappingStartEvent):
+            value = {}
+            for item in self._events:
+                if isinstance(item, MappingEndEvent):
+                    break
+                value[self._build(item)] = self._build(next(self._events))
+        else:
+            raise ValueError(f'Unexpected {event}')
+        if getattr(event, 'anchor', None):
+            self._anchors[event.anchor] = value
+        return value
+
+    def _scalar(self, event):
+        tag = event.tag
+        if tag is None or tag == '!':
+            tag = self._resolver.resolve(yaml.ScalarNode, event.value, event.implicit)
+        node = yaml.ScalarNode(tag, event.value, style=event.style)
+        # конструктор вызываем напрямую, construct_object кэширует каждый узел
+        construct = self._constructor.yaml_constructors.get(tag, yaml.constructor.SafeConstructor.construct_undefined)
+        return construct(self._constructor, node)
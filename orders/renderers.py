@@ -0,0 +1,18 @@
+import ujson
+from rest_framework.renderers import JSONRenderer
+
+
+class UJSONRenderer(JSONRenderer):
+    """
+    JSON renderer on ujson. Data that ujson can't encode (dates, lazy strings) goes through the DRF encoder
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            return ujson.dumps(data, ensure_ascii=self.ensure_ascii, escape_forward_slashes=False).encode()
+        except (TypeError, OverflowError):
+            return super().render(data, accepted_media_type, renderer_context)
@@ -0,0 +1,81 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+from EShops_API.db.router import read_from_replica
+
+
+def sticky_key(user_id):
+    return f'db:sticky:{user_id}'
+
+
+def stick(user_id):
+    """
+    Следующие REPLICA_STICKY_TIMEOUT секунд пользователь читает с основной базы и видит свои изменения
+    """
+    cache.set(sticky_key(user_id), 1, settings.REPLICA_STICKY_TIMEOUT)
+
+
+def is_sticky(user):
+    return bool(user and user.is_authenticated and cache.get(sticky_key(user.pk)))
+
+
+class ReplicaReadMixin:
+    """
+    Для ViewSet: GET и HEAD читают с реплики, если пользователь ничего не менял последние REPLICA_STICKY_TIMEOUT секунд.
+    Аутентификация и проверки прав идут раньше и читают с основной базы
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if settings.DATABASE_REPLICAS and request.method in SAFE_METHODS and not is_sticky(request.user):
+            self._replica = read_from_replica()
+            self._replica.__enter__()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        replica = getattr(self, '_replica', None)
+        if replica is not None:
+            self._replica = None
+            replica.__exit__(None, None, None)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class ReplicaStickinessMiddleware:
+    """
+    Успешный изменяющий запрос (корзина, заказ, магазин...) закрепляет пользователя за основной базой.
+    Под ASGI в поток уходят только такие запросы: пользователь сессии читается из базы
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        if self.changes(request, response):
+            self.stick_user(request)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if self.changes(request, response):
+            await sync_to_async(self.stick_user)(request)
+        return response
+
+    @staticmethod
+    def changes(request, response):
+        return settings.DATABASE_REPLICAS and request.method not in SAFE_METHODS and response.status_code < 400
+
+    @staticmethod
+    def stick_user(request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            stick(user.pk)
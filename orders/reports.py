@@ -0,0 +1,81 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Sum
+from django.utils import timezone
+
+from .importer import chunked
+from .models import OrderItem, SellerDailyStat, SellerOrderLine, SellerProductStat, StatusOrders
+
+
+def increment(model, keys, defaults=None, **deltas):
+    """
+    UPDATE ... SET поле = поле + delta для строки с ключом keys, нет строки - создаём её.
+    Если ту же строку параллельно создал другой заказ, INSERT упадёт на уникальности, и мы снова делаем UPDATE
+    """
+    values = {name: F(name) + delta for name, delta in deltas.items()}
+    if model.objects.filter(**keys).update(**values):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**keys, **(defaults or {}), **deltas)
+    except IntegrityError:
+        model.objects.filter(**keys).update(**values)
+
+
+def record_checkout(order_id, user_id, lines, date=None):
+    """
+    Добавляем оформленный заказ в отчёты продавцов, вызывается в транзакции оформления.
+    lines - (id позиции прайс-листа, id магазина, название, количество, цена)
+    """
+    date = date or timezone.localdate()
+    SellerOrderLine.objects.bulk_create(
+        SellerOrderLine(shop_id=shop_id, order_id=order_id, user_id=user_id, product_info_id=pk, name=name,
+                        quantity=quantity, price=price, amount=quantity * price, date=date)
+        for pk, shop_id, name, quantity, price in lines)
+
+    shops, products = {}, {}
+    for pk, shop_id, name, quantity, price in lines:
+        units, revenue = shops.get(shop_id, (0, 0))
+        shops[shop_id] = (units + quantity, revenue + quantity * price)
+        products[shop_id, pk] = (name, quantity, quantity * price)
+    # строки счётчиков блокируются в одном порядке во всех заказах, взаимных блокировок нет
+    for shop_id, (units, revenue) in sorted(shops.items()):
+        increment(SellerDailyStat, {'shop_id': shop_id, 'date': date}, orders=1, units=units, revenue=revenue)
+    for (shop_id, pk), (name, units, revenue) in sorted(products.items()):
+        increment(SellerProductStat, {'shop_id': shop_id, 'product_info_id': pk}, {'name': name},
+                  units=units, revenue=revenue)
+
+
+def rebuild_order_lines(batch_size):
+    """
+    Проекция заново из позиций оформленных заказов. Дата оформления старых заказов неизвестна, берём дату создания
+    """
+    SellerOrderLine.objects.all().delete()
+    items = OrderItem.objects.exclude(order__state=StatusOrders.BASKET).filter(price__isnull=False).order_by('id'). \
+        values_list('order_id', 'order__user_id', 'product_info_id', 'product_info__shop_id', 'product_info__name',
+                    'quantity', 'price', 'order__date')
+    total = 0
+    for chunk in chunked(items.iterator(), batch_size):
+        SellerOrderLine.objects.bulk_create(
+            SellerOrderLine(order_id=order_id, user_id=user_id, product_info_id=pk, shop_id=shop_id, name=name,
+                            quantity=quantity, price=price, amount=quantity * price, date=timezone.localdate(date))
+            for order_id, user_id, pk, shop_id, name, quantity, price, date in chunk)
+        total += len(chunk)
+    return total
+
+
+def rebuild_stats(batch_size):
+    """
+    Выручка по дням и продажи товаров заново из проекции
+    """
+    SellerDailyStat.objects.all().delete()
+    SellerProductStat.objects.all().delete()
+    daily = SellerOrderLine.objects.order_by().values('shop_id', 'date').annotate(
+        orders=Count('order_id', distinct=True), units=Sum('quantity'), revenue=Sum('amount'))
+    for chunk in chunked(daily.iterator(), batch_size):
+        SellerDailyStat.objects.bulk_create(SellerDailyStat(**row) for row in chunk)
+    products = SellerOrderLine.objects.order_by().values_list('shop_id', 'product_info_id').annotate(
+        Max('name'), Sum('quantity'), Sum('amount'))
+    for chunk in chunked(products.iterator(), batch_size):
+        SellerProductStat.objects.bulk_create(
+            SellerProductStat(shop_id=shop_id, product_info_id=pk, name=name, units=units, revenue=revenue)
+            for shop_id, pk, name, units, revenue in chunk)
@@ -0,0 +1,141 @@
+import time
+import zlib
+
+from celery.signals import before_task_publish, celeryd_init, task_postrun, task_prerun
+from django.conf import settings
+
+from . import metrics
+from .lru import LRUCache
+
+# очереди и настройки их воркеров: письма ждёт пользователь - много параллельных задач и короткая предвыборка,
+# импорт тяжёлый - по одной задаче на процесс без предвыборки, чтобы большой прайс-лист не держал чужие части
+QUEUES = {
+    'email': {'concurrency': 50, 'prefetch_multiplier': 4},
+    'notifications': {'concurrency': 20, 'prefetch_multiplier': 4},
+    'imports': {'concurrency': 4, 'prefetch_multiplier': 1},
+    'default': {'concurrency': 10, 'prefetch_multiplier': 4},
+}
+
+TASK_QUEUES = {
+    'orders.tasks.send_confirm_token': 'email',
+    'orders.tasks.send_auth_token': 'email',
+    'orders.tasks.send_outbox': 'email',
+    'orders.tasks.send_change_user_info': 'notifications',
+    'orders.tasks.new_order': 'notifications',
+    'orders.tasks.import_yaml': 'imports',
+    'orders.tasks.start_import': 'imports',
+    'orders.tasks.import_shard': 'imports',
+    'orders.tasks.finish_import': 'imports',
+}
+
+# продавец задания на импорт, чтобы не спрашивать базу на каждую часть прайс-листа
+_job_sellers = LRUCache(10000)
+
+
+def import_queue(seller_id):
+    """
+    Часть очереди импорта продавца (crc32 по модулю IMPORT_QUEUE_SHARDS), воркер импорта слушает все части и берёт
+    задачи из них по кругу. Внутри части очередь честная между импортами: у каждого в ней не больше
+    IMPORT_JOB_INFLIGHT задач, следующую ставит закончившаяся (см. import_jobs.next_shards)
+    """
+    return f'imports.{zlib.crc32(str(seller_id).encode()) % settings.IMPORT_QUEUE_SHARDS}'
+
+
+def job_seller(job_id):
+    from .models import ImportJob
+
+    seller_id = _job_sellers.get(job_id)
+    if seller_id is None:
+        seller_id = ImportJob.objects.filter(pk=job_id).values_list('user_id', flat=True).first()
+        _job_sellers.set(job_id, seller_id)
+    return seller_id
+
+
+def route_task(name, args, kwargs, options, task=None, **kw):
+    """
+    Маршрутизатор CELERY_ROUTES: очередь по имени задачи, задачи импорта - в часть очереди продавца
+    """
+    queue = TASK_QUEUES.get(name)
+    if queue != 'imports':
+        return {'queue': queue} if queue else None
+    if name == 'orders.tasks.import_yaml':
+        seller_id = args[0] if args else kwargs.get('user_id')
+    else:
+        seller_id = job_seller(args[0] if args else kwargs.get('job_id'))
+    return {'queue': import_queue(seller_id)}
+
+
+@celeryd_init.connect
+def configure_worker(conf=None, options=None, **kwargs):
+    """
+    Воркер одной очереди (celery worker -Q email) получает её concurrency и prefetch из QUEUES,
+    если они не заданы в командной строке
+    """
+    queues = options.get('queues') or []
+    if isinstance(queues, str):
+        queues = queues.split(',')
+    names = {queue.split('.')[0] for queue in queues}
+    if len(names) != 1 or not names <= QUEUES.keys():
+        return
+    profile = QUEUES[names.pop()]
+    if not options.get('concurrency'):
+        conf.worker_concurrency = profile['concurrency']
+    if not options.get('prefetch_multiplier'):
+        conf.worker_prefetch_multiplier = profile['prefetch_multiplier']
+
+
+# TASK LATENCY
+# ожидание в очереди (постановка - начало), выполнение (начало - конец) и всего, по очередям
+
+def latency(queue, stage):
+    return metrics.Histogram(f'celery.{queue}.{stage}', 'Задержка задач Celery')
+
+
+_latencies = {(queue, stage): latency(queue, stage) for queue in QUEUES for stage in ('wait', 'run', 'total')}
+_started = {}
+
+
+def task_queue(task):
+    queue = (task.request.delivery_info or {}).get('routing_key') or TASK_QUEUES.get(task.name) or 'default'
+    return queue.split('.')[0] if queue.split('.')[0] in QUEUES else 'default'
+
+
+@before_task_publish.connect
+def stamp_enqueued(headers=None, **kwargs):
+    if headers is not None:
+        headers.setdefault('enqueued_at', time.time())
+
+
+@task_prerun.connect
+def task_started(task_id=None, task=None, **kwargs):
+    now = time.time()
+    _started[task_id] = now
+    enqueued_at = getattr(task.request, 'enqueued_at', None)
+    if enqueued_at:
+        _latencies[task_queue(task), 'wait'].observe(max(now - enqueued_at, 0))
+
+
+@task_postrun.connect
+def task_finished(task_id=None, task=None, **kwargs):
+    started = _started.pop(task_id, None)
+    if started is None:
+        return
+    now = time.time()
+    queue = task_queue(task)
+    _latencies[queue, 'run'].observe(now - started)
+    enqueued_at = getattr(task.request, 'enqueued_at', None)
+    if enqueued_at:
+        _latencies[queue, 'total'].observe(max(now - enqueued_at, 0))
+
+
+def latency_report(points=(50, 90, 99)):
+    """
+    {очередь: {этап: {'count': замеров, 'p50': секунд, ...}}} по всем воркерам
+    """
+    report = {}
+    for (queue, stage), histogram in _latencies.items():
+        values = histogram.percentiles(*points)
+        count = sum(item.value for item in histogram.buckets)
+        report.setdefault(queue, {})[stage] = {'count': count, **{f'p{point}': value
+                                                                   for point, value in zip(points, values)}}
+    return report
@@ -0,0 +1,101 @@
+import re
+from functools import reduce
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+from django.db import connections
+from django.db.models import F, Q
+from django.utils.module_loading import import_string
+from rest_framework.filters import SearchFilter
+
+WORD = re.compile(r'\w+')
+
+
+class SimpleSearchBackend:
+    """
+    Поиск подстрокой по названию товара и продукта (LIKE), работает на любой базе
+    """
+
+    def search(self, queryset, term):
+        conditions = (Q(name__icontains=word) | Q(product__name__icontains=word) for word in term.split())
+        return queryset.filter(reduce(lambda left, right: left & right, conditions))
+
+    def update(self, queryset):
+        """
+        Пересчёт поискового индекса для товаров queryset
+        """
+
+    def install(self, connection):
+        """
+        Создание индексов, нужных бэкенду
+        """
+
+
+class PostgresSearchBackend(SimpleSearchBackend):
+    """
+    Full-text search over the precomputed ProductInfo.search_vector with a trigram fallback for substrings.
+
+    Results are ranked by ts_rank plus trigram similarity of the name. Every word of the query is matched as a
+    prefix, so a partially typed word still finds the product.
+    """
+
+    config = 'russian'
+
+    def search(self, queryset, term):
+        words = WORD.findall(term)
+        if not words:
+            return queryset.none()
+        query = SearchQuery(' & '.join(f"'{word}':*" for word in words), config=self.config, search_type='raw')
+        return queryset.annotate(
+            rank=SearchRank(F('search_vector'), query) + TrigramSimilarity('name', term),
+        ).filter(Q(search_vector=query) | Q(name__icontains=term)).order_by('-rank', 'id')
+
+    def update(self, queryset):
+        queryset.update(search_vector=SearchVector('name', weight='A', config=self.config) +
+                        SearchVector('model', weight='B', config=self.config))
+
+    def install(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            cursor.execute('CREATE INDEX IF NOT EXISTS product_info_search_vector '
+                           'ON orders_productinfo USING gin (search_vector)')
+            # icontains в Django сравнивает UPPER(name) LIKE UPPER(%s)
+            cursor.execute('CREATE INDEX IF NOT EXISTS product_info_name_trgm '
+                           'ON orders_productinfo USING gin (UPPER(name::text) gin_trgm_ops)')
+
+
+_backends = {}
+
+
+def get_search_backend(using='default'):
+    """
+    Бэкенд из настройки CATALOG_SEARCH_BACKEND, по умолчанию выбирается по типу базы
+    """
+    if using not in _backends:
+        path = getattr(settings, 'CATALOG_SEARCH_BACKEND', None)
+        if path is None:
+            vendor = connections[using].vendor
+            backend = PostgresSearchBackend if vendor == 'postgresql' else SimpleSearchBackend
+        else:
+            backend = import_string(path)
+        _backends[using] = backend()
+    return _backends[using]
+
+
+def install_search_backend(using='default', **kwargs):
+    """
+    Обработчик post_migrate: индексы поискового бэкенда создаются после миграций
+    """
+    get_search_backend(using).install(connections[using])
+
+
+class CatalogSearchFilter(SearchFilter):
+    """
+    Фильтр ?search= для каталога через подключаемый поисковый бэкенд
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        term = request.query_params.get(self.search_param, '').strip()
+        if not term:
+            return queryset
+        return get_search_backend(queryset.db).search(queryset, term)
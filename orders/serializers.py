@@ -1,6 +1,16 @@
+from collections import defaultdict
+
 from rest_framework import serializers
 
-from .models import User, Category, Shop, ProductInfo, Product, ProductParameter, OrderItem, Order, Contact
+from django.contrib.postgres.aggregates import JSONBAgg
+from django.db import connections
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import JSONObject
+from django.utils import timezone
+
+from .models import User, Category, Shop, ProductInfo, Product, ProductParameter, OrderItem, Order, Contact, \
+    ImportJob, SellerDailyStat, SellerProductStat
+from .sparse import SparseFieldsMixin, wanted
 
 
 class ContactSerializer(serializers.ModelSerializer):
@@ -52,9 +62,10 @@ class ProductParameterSerializer(serializers.ModelSerializer):
         fields = ('parameter', 'value',)
 
 
-class ProductInfoSerializer(serializers.ModelSerializer):
+class ProductInfoSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
     product_parameters = ProductParameterSerializer(read_only=True, many=True)
+    expandable_fields = {'shop': ShopSerializer}
 
     class Meta:
         model = ProductInfo
@@ -62,13 +73,82 @@ class ProductInfoSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 
+class ProductInfoFastListSerializer(serializers.ListSerializer):
+    """
+    Если параметры нужны, но не собраны базой, достаём их для всей страницы одним запросом
+    """
+
+    def to_representation(self, data):
+        rows = list(data)
+        missing = [row['id'] for row in rows if 'parameters' not in row]
+        if missing and 'product_parameters' in self.child.names:
+            parameters = defaultdict(list)
+            for info_id, name, value in ProductParameter.objects.filter(product_info_id__in=missing). \
+                    order_by('id').values_list('product_info_id', 'parameter__name', 'value'):
+                parameters[info_id].append({'parameter': name, 'value': value})
+            for row in rows:
+                row.setdefault('parameters', parameters[row['id']])
+        return [self.child.to_representation(row) for row in rows]
+
+
+class ProductInfoFastSerializer(serializers.BaseSerializer):
+    """
+    Read-only ProductInfoSerializer for lists, the same JSON is built from rows of ProductInfoFastSerializer.rows().
+
+    No model instances or nested serializers are created. On Postgres the parameters of every product are aggregated
+    by the database into a JSON array, elsewhere they are fetched with one query per page. Only the columns and
+    joins of the requested fields are selected.
+    """
+
+    def __init__(self, *args, fields=None, expand=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.names = [name for name in ProductInfoSerializer.Meta.fields if wanted(fields, name)]
+        self.expand = expand
+
+    @staticmethod
+    def rows(queryset, fields=None, expand=()):
+        columns = ['id'] + [name for name in ('name', 'shop', 'quantity', 'price', 'price_rrc') if wanted(fields, name)]
+        related = {}
+        if wanted(fields, 'product'):
+            related.update(product_name=F('product__name'), category=F('product__category__name'))
+        if 'shop' in expand:
+            related.update(shop_name=F('shop__name'), shop_state=F('shop__state'))
+        rows = queryset.prefetch_related(None).values(*columns, **related)
+        if wanted(fields, 'product_parameters') and queryset.db and \
+                connections[queryset.db].vendor == 'postgresql':
+            parameters = ProductParameter.objects.filter(product_info=OuterRef('pk')).order_by(). \
+                values('product_info').annotate(
+                    items=JSONBAgg(JSONObject(parameter='parameter__name', value='value'), ordering='id'),
+                ).values('items')
+            rows = rows.annotate(parameters=Subquery(parameters))
+        return rows
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        kwargs['child'] = cls(fields=kwargs.pop('fields', None), expand=kwargs.pop('expand', ()))
+        return ProductInfoFastListSerializer(*args, **kwargs)
+
+    def to_representation(self, row):
+        item = {}
+        for name in self.names:
+            if name == 'product':
+                item[name] = {'name': row['product_name'], 'category': row['category']}
+            elif name == 'shop' and 'shop' in self.expand:
+                item[name] = {'id': row['shop'], 'name': row['shop_name'], 'state': row['shop_state']}
+            elif name == 'product_parameters':
+                item[name] = row['parameters'] or []
+            else:
+                item[name] = row[name]
+        return item
+
+
 class ProductInfoOrderItemGet(ProductInfoSerializer):
     class Meta:
         model = ProductInfo
         fields = ('name',)
 
 
-class OrderItemSerializerGet(serializers.ModelSerializer):
+class OrderItemSerializerGet(SparseFieldsMixin, serializers.ModelSerializer):
     product_info = ProductInfoOrderItemGet()
     total_sum_position = serializers.IntegerField()
 
@@ -102,8 +182,9 @@ class UserOrderGetSerializer(serializers.ModelSerializer):
         fields = ('id', 'first_name', 'last_name')
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     total_sum = serializers.IntegerField()
+    expandable_fields = {'user': UserOrderGetSerializer}
 
     class Meta:
         model = Order
@@ -111,9 +192,65 @@ class OrderSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 
-class OrderSerializerAll(serializers.ModelSerializer):
+class SellerOrderSerializer(serializers.Serializer):
+    """
+    Доля продавца в заказе из строк SellerOrderLine, сгруппированных по заказу
+    """
+    id = serializers.IntegerField(source='order_id')
+    user = serializers.IntegerField(source='buyer')
+    total_sum = serializers.IntegerField()
+    units = serializers.IntegerField()
+    date = serializers.DateField(source='day')
+
+
+class SellerDailyStatSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SellerDailyStat
+        fields = ('date', 'orders', 'units', 'revenue')
+        read_only_fields = fields
+
+
+class SellerProductStatSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SellerProductStat
+        fields = ('product_info', 'name', 'units', 'revenue')
+        read_only_fields = fields
+
+
+class OrderSerializerAll(SparseFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {'user': UserOrderGetSerializer}
 
     class Meta:
         model = Order
         fields = ('id', 'user', 'state')
         read_only_fields = ('id',)
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    shards_total = serializers.IntegerField()
+    shards_done = serializers.IntegerField()
+    progress = serializers.SerializerMethodField()
+    throughput = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ImportJob
+        fields = ('id', 'filename', 'mode', 'state', 'total', 'processed', 'progress', 'throughput', 'shards_total',
+                  'shards_done', 'summary', 'error', 'created_at', 'started_at', 'finished_at')
+        read_only_fields = fields
+
+    def get_progress(self, job):
+        """
+        Процент обработанных товаров
+        """
+        if not job.total:
+            return 0.0
+        return round(100 * job.processed / job.total, 1)
+
+    def get_throughput(self, job):
+        """
+        Скорость импорта, товаров в секунду
+        """
+        if not job.started_at:
+            return 0.0
+        seconds = ((job.finished_at or timezone.now()) - job.started_at).total_seconds()
+        return round(job.processed / seconds, 1) if seconds > 0 else 0.0
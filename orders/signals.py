@@ -0,0 +1,45 @@
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from .authentication import forget_token
+from .models import Order, OrderItem, User
+
+
+@receiver(post_save, sender=OrderItem)
+def touch_order(instance, **kwargs):
+    """
+    Изменение позиции меняет и заказ: одним UPDATE пересчитываем total_sum по позициям этого заказа и updated_at,
+    от которого считаются ETag и Last-Modified списков заказов.
+    На post_delete не подписываемся, иначе каскадное удаление позиций при импорте перестанет быть одним запросом
+    """
+    Order.objects.filter(pk=instance.order_id).update(total_sum=order_total(), updated_at=timezone.now())
+
+
+def order_total():
+    """
+    Сумма позиций заказа для Order.objects.update(total_sum=...)
+    """
+    items = OrderItem.objects.filter(order_id=OuterRef('pk')).order_by().values('order_id').annotate(
+        total=Sum(F('quantity') * F('price'))).values('total')
+    return Coalesce(Subquery(items), 0)
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def forget_rotated_token(instance, **kwargs):
+    forget_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def forget_user_tokens(instance, created, **kwargs):
+    """
+    Кэш аутентификации хранит поля пользователя, после изменения пользователя его токены читаются заново
+    """
+    if created:
+        return
+    for key in Token.objects.filter(user_id=instance.pk).values_list('key', flat=True):
+        forget_token(key)
@@ -0,0 +1,61 @@
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter
+from rest_framework.exceptions import ParseError
+
+SPARSE_PARAMETERS = [
+    OpenApiParameter('fields', OpenApiTypes.STR,
+                     description='Comma separated fields to return, e.g. id,name,price. All fields by default'),
+    OpenApiParameter('expand', OpenApiTypes.STR,
+                     description='Comma separated relations to embed as objects instead of ids, e.g. shop'),
+]
+
+
+class SparseFieldsMixin:
+    """
+    Serializer that keeps only the fields passed in fields= and embeds relations passed in expand=.
+
+    expandable_fields maps a relation to the serializer class that replaces its primary key when expanded.
+    """
+
+    expandable_fields = {}
+
+    def __init__(self, *args, fields=None, expand=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        for name in expand:
+            self.fields[name] = self.expandable_fields[name](read_only=True)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+def split_param(request, name):
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def sparse_fields(request, serializer_class):
+    """
+    Поля и связи из ?fields= и ?expand= для serializer_class: (список полей или None, список связей).
+    Неизвестные имена - ParseError
+    """
+    declared = list(serializer_class.Meta.fields)
+    fields = split_param(request, 'fields')
+    expand = split_param(request, 'expand') or []
+    if fields is not None:
+        unknown = set(fields) - set(declared)
+        if unknown:
+            raise ParseError(f'Unknown fields {", ".join(sorted(unknown))}, choose from {", ".join(declared)}')
+    unknown = set(expand) - set(serializer_class.expandable_fields)
+    if unknown:
+        raise ParseError(f'Unknown relations {", ".join(sorted(unknown))} to expand, '
+                         f'choose from {", ".join(serializer_class.expandable_fields)}')
+    if fields is not None:
+        # раскрыть можно только запрошенную связь
+        expand = [name for name in expand if name in fields]
+    return fields, expand
+
+
+def wanted(fields, name):
+    return fields is None or name in fields
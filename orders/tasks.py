@@ -1,20 +1,24 @@
 from django.conf import settings
-from django.core.mail import send_mail
 from django_rest_passwordreset.signals import reset_password_token_created
 from rest_framework.authtoken.models import Token
-from .models import ConfirmEmailToken, User, Shop, Category, Product, ProductInfo, Parameter, ProductParameter
+from .models import ConfirmEmailToken, User, ImportJob, ImportShard, StatusImport
+from .importer import CatalogImporter, ImportMode
+from .mail import drain, enqueue, next_attempt_in, schedule
+from .import_jobs import split_price_list, import_shard_goods, next_shards, reconcile
 from celery import shared_task
+from django.db import transaction
 from django.dispatch import receiver
+from django.utils import timezone
 
 
 class SendTokens:
 
     @staticmethod
     def _send_token_mail(token, text):
-        return send_mail(f'{token.user.first_name}',
-                         f'ur tokken {token.key}. {text}',
-                         f'{settings.EMAIL_HOST_USER}',
-                         [token.user.email])
+        return enqueue(token.user.email,
+                       f'{token.user.first_name}',
+                       f'ur tokken {token.key}. {text}',
+                       f'{settings.EMAIL_HOST_USER}')
 
     @staticmethod
     @shared_task
@@ -51,10 +55,10 @@ class SendInfo:
 
     @staticmethod
     def _send_mail(user, text, data):
-        return send_mail(f'{user.first_name}',
-                         f'{text} {data}',
-                         f'{settings.EMAIL_HOST_USER}',
-                         [user.email])
+        return enqueue(user.email,
+                       f'{user.first_name}',
+                       f'{text} {data}',
+                       f'{settings.EMAIL_HOST_USER}')
 
     @staticmethod
     @shared_task
@@ -80,27 +84,92 @@ class SendInfo:
 info_postman = SendInfo()
 
 
+@shared_task(bind=True, acks_late=True, reject_on_worker_lost=True)
+def send_outbox(self):
+    """
+    Отправляем очередь писем. Пока в очереди что-то есть, ставим себя на время ближайшей попытки.
+    Задача упавшего воркера вернётся в очередь, его письма отправятся, когда истечёт MAIL_LEASE
+    """
+    delivered, undelivered = drain()
+    delay = next_attempt_in()
+    if delay is None:
+        return delivered, undelivered
+    if not (delivered or undelivered):
+        # все слоты доменов заняты или письма под арендой другого отправителя: ждём не меньше окна пачки.
+        # В eager-режиме countdown не действует, и задача крутилась бы без паузы
+        if self.request.is_eager:
+            return delivered, undelivered
+        delay = max(delay, settings.MAIL_BATCH_DELAY)
+    schedule(delay + 1)
+    return delivered, undelivered
+
+
 @shared_task
-def import_yaml(user_id, data):
-    shop, _ = Shop.objects.get_or_create(name=data['shop'], user_id=user_id)
-    for category in data['categories']:
-        category_object, _ = Category.objects.get_or_create(id=category['id'], name=category['name'])
-        category_object.shop.add(shop.id)
-        category_object.save()
-        ProductInfo.objects.filter(shop_id=shop.id).delete()
-    for item in data['goods']:
-        product, _ = Product.objects.get_or_create(name=item['name'], category_id=item['category'])
-
-        product_info = ProductInfo.objects.create(product_id=product.id,
-                                                  external_id=item['id'],
-                                                  model=item['model'],
-                                                  name=item['name'],
-                                                  price=item['price'],
-                                                  price_rrc=item['price_rrc'],
-                                                  quantity=item['quantity'],
-                                                  shop_id=shop.id)
-        for name, value in item['parameters'].items():
-            parameter_object, _ = Parameter.objects.get_or_create(name=name)
-            ProductParameter.objects.create(product_info_id=product_info.id,
-                                            parameter_id=parameter_object.id,
-                                            value=value)
+def import_yaml(user_id, data, mode=ImportMode.INCREMENTAL):
+    """
+    Импорт прайс-листа продавца, возвращает сводку изменений (added/changed/unchanged/retired)
+    """
+    return CatalogImporter(user_id, mode=mode).run(data)
+
+
+def dispatch_shards(job_id):
+    """
+    Следующие части импорта в очередь, после последней - сверка
+    """
+    indexes, done = next_shards(job_id)
+    for index in indexes:
+        import_shard.delay(job_id, index)
+    if done:
+        finish_import.delay(job_id)
+
+
+@shared_task(acks_late=True)
+def start_import(job_id):
+    """
+    Делим прайс-лист на части и отдаём воркерам первые IMPORT_JOB_INFLIGHT из них, остальные ставят в очередь
+    закончившиеся части. Повторный запуск продолжает прерванный импорт с незавершённых частей.
+    """
+    job = ImportJob.objects.get(pk=job_id)
+    if job.state == StatusImport.DONE:
+        return job.summary
+
+    ImportJob.objects.filter(pk=job_id).update(state=StatusImport.RUNNING, error='',
+                                               started_at=job.started_at or timezone.now())
+    try:
+        if not job.shards.exists():
+            split_price_list(job)
+    except Exception as error:
+        ImportJob.objects.filter(pk=job_id).update(state=StatusImport.FAILED, error=str(error))
+        raise
+
+    # части, отданные упавшему импорту, раздаются заново, уже готовые воркер пропустит
+    job.shards.filter(state=StatusImport.RUNNING).update(state=StatusImport.PENDING)
+    dispatch_shards(job_id)
+
+
+@shared_task(acks_late=True)
+def import_shard(job_id, index):
+    """
+    Импорт одной части прайс-листа
+    """
+    shard = ImportShard.objects.select_related('job__shop').get(job_id=job_id, index=index)
+    try:
+        summary = import_shard_goods(shard)
+    except Exception as error:
+        ImportJob.objects.filter(pk=job_id).update(state=StatusImport.FAILED, error=str(error))
+        raise
+    dispatch_shards(job_id)
+    return summary
+
+
+@shared_task(acks_late=True)
+def finish_import(job_id):
+    """
+    Сверка после импорта всех частей: снимаем с продажи отсутствующие товары
+    """
+    # последние части могут закончиться одновременно и поставить сверку дважды
+    with transaction.atomic():
+        job = ImportJob.objects.select_for_update().select_related('shop').get(pk=job_id)
+        if job.state == StatusImport.DONE:
+            return job.summary
+        return reconcile(job)
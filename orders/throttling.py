@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import math
+import threading
+import time
+
+import redis
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import SimpleRateThrottle
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+denied = metrics.counter('throttle.denied', 'Запрос отклонён троттлингом')
+fail_open = metrics.counter('throttle.fail_open', 'Redis недоступен, запрос пропущен без проверки')
+
+# KEYS[1] - ведро, ARGV - ёмкость и скорость пополнения в токенах в секунду.
+# Время берётся у Redis, чтобы часы воркеров не влияли на пополнение
+TOKEN_BUCKET = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) / 1000 * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return {allowed, tostring(tokens)}
+"""
+
+_client = None
+_script = None
+_local_lock = threading.Lock()
+
+
+def get_redis():
+    """
+    Клиент Redis для троттлинга из THROTTLE_REDIS_URL, None - вёдра хранятся в кэше Django
+    """
+    global _client, _script
+    url = getattr(settings, 'THROTTLE_REDIS_URL', None)
+    if not url:
+        return None
+    if _client is None:
+        _client = redis.Redis.from_url(url, socket_timeout=settings.THROTTLE_REDIS_TIMEOUT,
+                                       socket_connect_timeout=settings.THROTTLE_REDIS_TIMEOUT)
+        _script = _client.register_script(TOKEN_BUCKET)
+    return _client
+
+
+def take_token(key, capacity, rate):
+    """
+    Берём токен из ведра key, возвращаем (пропущен ли запрос, сколько токенов осталось)
+    """
+    if get_redis() is not None:
+        allowed, tokens = _script(keys=[key], args=[capacity, rate])
+        return bool(allowed), float(tokens)
+
+    # без Redis: то же ведро в кэше Django, атомарно только внутри процесса
+    with _local_lock:
+        now = time.time()
+        tokens, ts = cache.get(key, (capacity, now))
+        tokens = min(capacity, tokens + max(0.0, now - ts) * rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        cache.set(key, (tokens, now), math.ceil(capacity / rate))
+    return allowed, tokens
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """
+    Token bucket throttling with one atomic Lua call to Redis per request.
+
+    The scope comes from throttle_scopes[action] or throttle_scope of the view, otherwise it is 'user' for
+    authenticated requests and 'anon' for the rest. Rates are taken from DEFAULT_THROTTLE_RATES: '20/min' is a bucket
+    of 20 requests refilled at 20 per minute. When Redis is unavailable requests are let through.
+    """
+
+    def __init__(self):
+        # scope и rate известны только в allow_request
+        pass
+
+    def get_scope(self, request, view):
+        scope = getattr(view, 'throttle_scopes', {}).get(getattr(view, 'action', None))
+        scope = scope or getattr(view, 'throttle_scope', None)
+        if scope:
+            return scope
+        return 'user' if request.user and request.user.is_authenticated else 'anon'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return f'throttle:{self.scope}:{ident}'
+
+    def allow_request(self, request, view):
+        self.scope = self.get_scope(request, view)
+        self.rate = self.THROTTLE_RATES.get(self.scope)
+        if self.rate is None:
+            return True
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        self.refill = self.num_requests / self.duration
+
+        try:
+            allowed, self.tokens = take_token(self.get_cache_key(request, view), self.num_requests, self.refill)
+        except redis.RedisError as error:
+            logger.warning('Throttling is skipped: %s', error)
+            fail_open.incr()
+            return True
+
+        # заголовки X-RateLimit-* добавляет RateLimitHeadersMiddleware
+        getattr(request, '_request', request).rate_limit = (self.num_requests, int(self.tokens),
+                                       math.ceil((self.num_requests - self.tokens) / self.refill))
+        if not allowed:
+            denied.incr()
+        return allowed
+
+    def wait(self):
+        return max(0.0, (1 - self.tokens) / self.refill)
+
+
+class RateLimitHeadersMiddleware:
+    """
+    X-RateLimit-Limit, X-RateLimit-Remaining и X-RateLimit-Reset (секунд до полного ведра) для ответов API.
+    Работает и под ASGI без перехода в поток
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # так Django узнаёт, что вызов middleware нужно ждать через await
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        return self.add_headers(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.add_headers(request, await self.get_response(request))
+
+    @staticmethod
+    def add_headers(request, response):
+        rate_limit = getattr(request, 'rate_limit', None)
+        if rate_limit is not None:
+            response['X-RateLimit-Limit'], response['X-RateLimit-Remaining'], response['X-RateLimit-Reset'] = \
+                rate_limit
+        return response
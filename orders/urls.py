@@ -3,7 +3,9 @@ from rest_framework.routers import DefaultRouter
 from django_rest_passwordreset.views import reset_password_request_token, reset_password_confirm
 
 from .views import CategoryView, ShopView, ProductInfoView, OrderViewSet, UserViewSet, SellerViewSet, \
-    ShoppingCartViewSet, ContactsViewSet, SellersShopsViewSet, AuthViewSet
+    ShoppingCartViewSet, ContactsViewSet, SellersShopsViewSet, AuthViewSet, SellerImportsViewSet, \
+    MetricsViewSet, SellerReportsViewSet
+from . import async_views
 
 router = DefaultRouter()
 router.register('users', UserViewSet, basename='user')
@@ -11,14 +13,20 @@ router.register('auth', AuthViewSet, basename='auth')
 router.register('users/contacts', ContactsViewSet, basename='contacts')
 router.register('sellers', SellerViewSet, basename='partners')
 router.register('sellers/shop', SellersShopsViewSet, basename='partner')
+router.register('sellers/imports', SellerImportsViewSet, basename='partner_import')
+router.register('sellers/reports', SellerReportsViewSet, basename='partner_report')
 router.register('carts', ShoppingCartViewSet, basename='shopping_cart')
 router.register('orders', OrderViewSet, basename='order')
 router.register('categories', CategoryView, basename='category')
 router.register('shops', ShopView, basename='shops')
 router.register('products', ProductInfoView, basename='product_info')
+router.register('metrics', MetricsViewSet, basename='metrics')
 
 app_name = 'orders'
 urlpatterns = [
     path('users/reset_password', reset_password_request_token, name='reset-password'),
-    path('users/reset_password_confirm', reset_password_confirm, name='reset-password-confirm')
+    path('users/reset_password_confirm', reset_password_confirm, name='reset-password-confirm'),
+    # вход и регистрация под ASGI: хеширование пароля в отдельном пуле потоков, не в цикле событий
+    path('auth/async/login/', async_views.login, name='auth-async-login'),
+    path('auth/async/registration/', async_views.registration, name='auth-async-registration'),
 ] + router.urls
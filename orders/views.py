@@ -1,29 +1,43 @@
+from datetime import date
+
+from django.conf import settings
 from django.shortcuts import get_object_or_404
-from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
-from django.db import IntegrityError
-from django.db.models import Sum, F
-from django.http import JsonResponse, HttpResponseRedirect
+from django.db import IntegrityError, transaction
+from django.db.models import Sum, F, Count, Q, Max
+from django.http import HttpResponseRedirect
 from django.urls import reverse
 from django.core.exceptions import ObjectDoesNotExist
-from drf_spectacular.utils import extend_schema, OpenApiExample
-from rest_framework.filters import SearchFilter
+from django.core.files.storage import default_storage
+from django.db.models.functions import Coalesce
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema, OpenApiExample, OpenApiParameter
 from rest_framework.decorators import action
 from rest_framework.exceptions import ParseError
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.viewsets import ViewSet, ReadOnlyModelViewSet
+from EShops_API.db.pool import pool_stats
 
-import yaml
-from yaml.loader import SafeLoader
-
-from .models import Shop, Category, ProductInfo, Order, OrderItem, Contact, ConfirmEmailToken
+from .models import User, Shop, Category, ProductInfo, Order, OrderItem, Contact, ConfirmEmailToken, ImportJob, \
+    StatusImport, SellerOrderLine, SellerDailyStat, SellerProductStat, TypeAvailability
 from .serializers import UserSerializer, CategorySerializer, ShopSerializer, ProductInfoSerializer, \
     OrderItemSerializerPatch, OrderSerializer, OrderSerializerAll, ContactSerializer, OrderItemSerializerGet, \
-    OrderItemSerializerPost
+    OrderItemSerializerPost, ImportJobSerializer, ProductInfoFastSerializer, SellerOrderSerializer, \
+    SellerDailyStatSerializer, SellerProductStatSerializer
+from .pagination import KeysetPagination, OptInCursorPaginationMixin, paginated_response, CURSOR_PARAMETERS
 from .permission import IsAuthenticatedAndShop
-from .tasks import token_postman, info_postman, import_yaml
+from .replicas import ReplicaReadMixin
+from . import accounts, metrics
+from .checkout import CheckoutError, checkout
+from .outbox import emit
+from .caching import VersionedCacheMixin, bump_versions, conditional_response, make_etag, stock_stamp
+from .filters import ParameterFilter, catalog_facets
+from .search import CatalogSearchFilter
+from .signals import touch_order
+from .sparse import sparse_fields, wanted, SPARSE_PARAMETERS
+from .tasks import info_postman, start_import
 
 
 def doc_view(request):
@@ -35,6 +49,8 @@ class AuthViewSet(ViewSet):
     ViewSet for User authentication
     """
 
+    throttle_scope = 'auth'
+
     @extend_schema(
         description='Registrate a new user',
         request={
@@ -69,35 +85,7 @@ class AuthViewSet(ViewSet):
     )
     @action(detail=False, methods=['POST'], name='New registration')
     def registration(self, request, *args, **kwargs):
-
-        # проверяем обязательные аргументы
-        if {'first_name', 'last_name', 'email', 'password', 'company', 'position', 'type'}.issubset(request.data):
-
-            # проверяем пароль на сложность
-
-            try:
-                validate_password(request.data.get('password'))
-            except Exception as password_error:
-                error_array = []
-                # noinspection PyTypeChecker
-                for item in password_error:
-                    error_array.append(item)
-                return JsonResponse({'Status': False, 'Errors': {'password': error_array}})
-            else:
-                # проверяем данные для уникальности имени пользователя
-                user_serializer = UserSerializer(data=request.data)
-                if user_serializer.is_valid():
-                    # сохраняем пользователя
-                    user = user_serializer.save()
-                    user.set_password(request.data.get('password'))
-                    user.save()
-                    token_postman.send_confirm_token.delay(user.id)
-
-                    return JsonResponse({'Status': True, 'Info': 'To your email send confirm token'})
-                else:
-                    return JsonResponse({'Status': False, 'Errors': user_serializer.errors})
-
-        return JsonResponse({'Status': False, 'Errors': 'Не указаны все необходимые аргументы'})
+        return Response(accounts.register(request.data))
 
     @extend_schema(
         description='Сonfirm registration a new user',
@@ -136,12 +124,12 @@ class AuthViewSet(ViewSet):
             if confirm:
                 confirm.user.is_active = True
                 confirm.user.save()
-                return JsonResponse({'Status': True, 'Description': 'Аккаунт активирован'})
+                return Response({'Status': True, 'Description': 'Аккаунт активирован'})
             else:
-                return JsonResponse({'Status': False,
+                return Response({'Status': False,
                                      'Errors': 'Неправильно указан токен или email, аккаунт не активирован'})
 
-        return JsonResponse({'Status': False, 'Errors': 'Не указаны все необходимые аргументы'})
+        return Response({'Status': False, 'Errors': 'Не указаны все необходимые аргументы'})
 
     @extend_schema(
         description='login account',
@@ -171,18 +159,7 @@ class AuthViewSet(ViewSet):
     )
     @action(detail=False, methods=['POST'], name='Login')
     def login(self, request, *args, **kwargs):
-
-        if {'email', 'password'}.issubset(request.data):
-            user = authenticate(request, username=request.data.get('email'), password=request.data.get('password'))
-
-            if user is not None and user.is_active:
-                user = user
-                token_postman.send_auth_token.delay(user.id)
-                return JsonResponse({'Status': True, 'Token': 'send to email'})
-
-            return JsonResponse({'Status': False, 'Errors': 'Не удалось авторизовать'})
-
-        return JsonResponse({'Status': False, 'Errors': 'Не указаны все необходимые аргументы'})
+        return Response(accounts.login(request.data, request))
 
 
 class UserViewSet(ViewSet):
@@ -233,21 +210,24 @@ class UserViewSet(ViewSet):
     @action(detail=False, methods=['PATCH'])
     def change_info(self, request, *args, **kwargs):
 
+        # request.user собран из кэша аутентификации и может отставать от базы: save() записал бы его is_active и type
+        user = User.objects.get(pk=request.user.pk)
         password = request.data.get('password', False)
         if password:
             try:
                 validate_password(password)
-                request.user.set_password(password)
+                user.set_password(password)
                 request.data['password'] = 'closed info, remember ur new password please'
             except ValidationError as er:
                 return Response(str(er), status=400)
 
         # проверяем остальные данные
-        user_serializer = UserSerializer(request.user, data=request.data, partial=True)
+        user_serializer = UserSerializer(user, data=request.data, partial=True)
         if user_serializer.is_valid(raise_exception=True):
-            user_serializer.save()
-            info_postman.send_change_user_info.delay(request.user.id, request.data)
-            return JsonResponse({'Status': True, 'Update info': f'{request.data} is update'})
+            with transaction.atomic():
+                user_serializer.save()
+                emit(info_postman.send_change_user_info, request.user.id, request.data)
+            return Response({'Status': True, 'Update info': f'{request.data} is update'})
 
 
 
@@ -302,15 +282,15 @@ class ContactsViewSet(ViewSet):
         serializer = ContactSerializer(data=request.data)
         if serializer.is_valid():
             serializer.save()
-            return JsonResponse({'Status': True})
+            return Response({'Status': True})
         else:
-            return JsonResponse({'Status': False, 'Errors': str(serializer.errors)})
+            return Response({'Status': False, 'Errors': str(serializer.errors)})
 
     @extend_schema(description='Delete your contact by id. Auth only')
     def destroy(self, request, pk):
         contact = self.get_object(pk)
         contact.delete()
-        return JsonResponse({'Status': True, 'Ваш контакт': f'с id{pk} удален'})
+        return Response({'Status': True, 'Ваш контакт': f'с id{pk} удален'})
 
     @extend_schema(
         description='Change contact. Auth only, by id',
@@ -342,32 +322,35 @@ class ContactsViewSet(ViewSet):
         serializer = ContactSerializer(contact, data=request.data)
         if serializer.is_valid(raise_exception=True):
             serializer.save()
-            return JsonResponse({"Status": True, "New data": str(serializer.data)})
+            return Response({"Status": True, "New data": str(serializer.data)})
 
-        return JsonResponse({"Status": False, "Errors": str(serializer.errors)})
+        return Response({"Status": False, "Errors": str(serializer.errors)})
 
 
-class SellerViewSet(ViewSet):
+class SellerViewSet(ReplicaReadMixin, ViewSet):
     """
     Viewset for working with sellers orders and prices
     """
 
     permission_classes = [IsAuthenticatedAndShop]
+    throttle_scopes = {'create': 'upload'}
 
     @extend_schema(
-        description='See orders in shop',
-        responses=OrderSerializer,
+        description='See orders in shop, newest first',
+        responses=SellerOrderSerializer(many=True),
+        parameters=CURSOR_PARAMETERS[1:],
     )
     def list(self, request, *args, **kwargs):
 
-        order = Order.objects.filter(
-            orders__product_info__shop__user_id=request.user.id).exclude(state='BASKET').prefetch_related(
-            'orders__product_info__product__category',
-            'orders__product_info__product_parameters__parameter').select_related('contact').annotate(
-            total_sum=Sum(F('orders__quantity') * F('orders__product_info__price'))).distinct()
+        # в заказе могут быть товары нескольких магазинов, продавцу показываем его позиции из проекции SellerOrderLine
+        # группировка только по заказу: строки идут по индексу (shop, -order), и страница не сортирует все заказы.
+        # Списка целиком нет: у продавца с большой историей это GROUP BY по всем его заказам
+        lines = SellerOrderLine.objects.filter(shop__user_id=request.user.id).values('order_id').annotate(
+            buyer=Max('user'), total_sum=Sum('amount'), units=Sum('quantity'), day=Max('date')).order_by('-order_id')
 
-        serializer = OrderSerializer(order, many=True)
-        return Response(serializer.data)
+        paginator = KeysetPagination('-order_id')
+        page = paginator.paginate_queryset(lines, request, self)
+        return paginator.get_paginated_response(SellerOrderSerializer(page, many=True).data)
 
     @extend_schema(
         description='Upload/update positions in your price-list',
@@ -387,13 +370,121 @@ class SellerViewSet(ViewSet):
     def create(self, request, *args, **kwargs):
         try:
             file = request.data['file']
-            user_id = request.user.id
-            data = yaml.load(file, SafeLoader)
-            import_yaml.delay(user_id, data)
-            return JsonResponse({"Status": True, "Price is update": data['shop']})
         except KeyError:
             raise ParseError('Request has no resource file attached')
 
+        # разбор файла идёт в воркере, через брокер передаём только id задания на импорт
+        filename = default_storage.save(Shop._meta.get_field('filename').generate_filename(None, file.name), file)
+        with transaction.atomic():
+            job = ImportJob.objects.create(user_id=request.user.id, filename=filename)
+            emit(start_import, job.id)
+        return Response({"Status": True, "Price is uploaded": filename, "Import": job.id})
+
+
+def date_range(request, queryset):
+    try:
+        for name, lookup in (('date_from', 'date__gte'), ('date_to', 'date__lte')):
+            if request.query_params.get(name):
+                queryset = queryset.filter(**{lookup: date.fromisoformat(request.query_params[name])})
+    except ValueError as error:
+        raise ParseError(str(error))
+    return queryset
+
+
+DATE_RANGE_PARAMETERS = [
+    OpenApiParameter('date_from', OpenApiTypes.DATE, description='First day, inclusive'),
+    OpenApiParameter('date_to', OpenApiTypes.DATE, description='Last day, inclusive'),
+]
+
+
+class SellerReportsViewSet(ReplicaReadMixin, ViewSet):
+    """
+    Viewset for sellers sales reports.
+
+    Served from per-shop counters updated at checkout, so a report does not depend on the number of order lines
+    """
+
+    permission_classes = [IsAuthenticatedAndShop]
+
+    @extend_schema(
+        description='Orders, units sold and revenue of your shop',
+        parameters=DATE_RANGE_PARAMETERS,
+        responses={200: {'type': 'object', 'properties': {
+            'orders': {'type': 'integer'}, 'units': {'type': 'integer'}, 'revenue': {'type': 'integer'}}}},
+    )
+    def list(self, request, *args, **kwargs):
+        stats = date_range(request, SellerDailyStat.objects.filter(shop__user_id=request.user.id))
+        return Response(stats.aggregate(orders=Coalesce(Sum('orders'), 0), units=Coalesce(Sum('units'), 0),
+                                        revenue=Coalesce(Sum('revenue'), 0)))
+
+    @extend_schema(
+        description='Orders, units sold and revenue of your shop per day, newest first',
+        parameters=DATE_RANGE_PARAMETERS + CURSOR_PARAMETERS[1:],
+        responses=SellerDailyStatSerializer(many=True),
+    )
+    @action(detail=False, methods=['GET'])
+    def daily(self, request, *args, **kwargs):
+        stats = date_range(request, SellerDailyStat.objects.filter(shop__user_id=request.user.id))
+        paginator = KeysetPagination('-date')
+        page = paginator.paginate_queryset(stats, request, self)
+        return paginator.get_paginated_response(SellerDailyStatSerializer(page, many=True).data)
+
+    @extend_schema(
+        description='Best selling goods of your shop by revenue',
+        parameters=[OpenApiParameter('limit', OpenApiTypes.INT, description='How many goods, 10 by default')],
+        responses=SellerProductStatSerializer(many=True),
+    )
+    @action(detail=False, methods=['GET'])
+    def top(self, request, *args, **kwargs):
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 10)), KeysetPagination.max_page_size))
+        except ValueError as error:
+            raise ParseError(str(error))
+        stats = SellerProductStat.objects.filter(shop__user_id=request.user.id).order_by('-revenue')[:limit]
+        return Response(SellerProductStatSerializer(stats, many=True).data)
+
+
+class SellerImportsViewSet(ViewSet):
+    """
+    Viewset for watching sellers price list imports
+    """
+
+    permission_classes = [IsAuthenticatedAndShop]
+
+    def get_queryset(self, request):
+        return ImportJob.objects.filter(user_id=request.user.id).annotate(
+            shards_total=Count('shards'),
+            shards_done=Count('shards', filter=Q(shards__state=StatusImport.DONE)))
+
+    @extend_schema(
+        description='Get your price list imports',
+        responses=ImportJobSerializer,
+    )
+    def list(self, request, *args, **kwargs):
+        serializer = ImportJobSerializer(self.get_queryset(request), many=True)
+        return Response(serializer.data)
+
+    @extend_schema(
+        description='Get status, progress and throughput of the import by id',
+        responses=ImportJobSerializer,
+    )
+    def retrieve(self, request, pk, *args, **kwargs):
+        job = get_object_or_404(self.get_queryset(request), pk=pk)
+        serializer = ImportJobSerializer(job)
+        return Response(serializer.data)
+
+    @extend_schema(description='Resume failed import from the unfinished parts')
+    @action(detail=True, methods=['POST'])
+    def resume(self, request, pk, *args, **kwargs):
+        job = get_object_or_404(self.get_queryset(request), pk=pk)
+        # продолжить можно только упавший импорт: условный UPDATE не даст двум запросам запустить его дважды
+        with transaction.atomic():
+            if not ImportJob.objects.filter(pk=job.pk, state=StatusImport.FAILED).update(state=StatusImport.PENDING):
+                return Response({"Status": False, "Description": f'Import with id{pk} is {job.state.lower()}, '
+                                                                 f'only failed imports are resumed'})
+            emit(start_import, job.id)
+        return Response({"Status": True, "Description": f'Import with id{pk} is resumed'})
+
 
 class SellersShopsViewSet(ViewSet):
     """
@@ -411,10 +502,10 @@ class SellersShopsViewSet(ViewSet):
         try:
             shop = request.user.shop
             serializer = ShopSerializer(shop)
-            return JsonResponse({"Status": True, "Shop": serializer.data})
+            return Response({"Status": True, "Shop": serializer.data})
 
         except ObjectDoesNotExist:
-            return JsonResponse({"Status": False, "Description": "That's user dont have a shop"})
+            return Response({"Status": False, "Description": "That's user dont have a shop"})
 
     @extend_schema(
         description='Change shop status',
@@ -451,7 +542,11 @@ class SellersShopsViewSet(ViewSet):
             if shop.state != new_state:
                 shop.state = new_state
                 shop.save()
-                return JsonResponse({'Status': 'Changed', 'State': new_state}, status=200)
+                # состояние магазина есть и в списках товаров по категориям (?expand=shop)
+                scopes = [('shop', shop.id), ('shop', 'all'), ('category', 'all')]
+                scopes += [('category', pk) for pk in shop.categories.values_list('id', flat=True)]
+                transaction.on_commit(lambda: bump_versions(*scopes))
+                return Response({'Status': 'Changed', 'State': new_state}, status=200)
             else:
                 return Response(f'Shop is already {new_state}', status=400)
 
@@ -459,34 +554,112 @@ class SellersShopsViewSet(ViewSet):
             return Response('ValidationError. Need to be Open/Closed', status=400)
 
 
-class CategoryView(ReadOnlyModelViewSet):
+class CategoryView(ReplicaReadMixin, VersionedCacheMixin, ReadOnlyModelViewSet):
     """
     Класс для просмотра категорий
     """
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticated]
+    throttle_scope = 'catalog'
+
+    def cache_scopes(self, request):
+        return [('category', 'all')]
 
 
-class ShopView(ReadOnlyModelViewSet):
+class ShopView(ReplicaReadMixin, VersionedCacheMixin, ReadOnlyModelViewSet):
     """
     Класс для просмотра списка магазинов
     """
     queryset = Shop.objects.filter(state='Open').order_by('name')
     serializer_class = ShopSerializer
     permission_classes = [IsAuthenticated]
+    throttle_scope = 'catalog'
+
+    def cache_scopes(self, request):
+        return [('shop', 'all')]
 
 
-class ProductInfoView(ReadOnlyModelViewSet):
+class ProductInfoView(ReplicaReadMixin, VersionedCacheMixin, OptInCursorPaginationMixin, ReadOnlyModelViewSet):
     """
-    Класс для поиска товаров с возможностью поиска по имени
+    Класс для поиска товаров с возможностью поиска по имени и фильтрации по значениям параметров
     """
-    queryset = ProductInfo.objects.all().select_related('shop', 'product__category'). \
-        prefetch_related('product_parameters__parameter').distinct()
+    # снятые с продажи товары остаются в базе ради старых заказов, но в каталоге их нет
+    queryset = ProductInfo.objects.exclude(availability=TypeAvailability.EOS). \
+        select_related('shop', 'product__category').prefetch_related('product_parameters__parameter')
     serializer_class = ProductInfoSerializer
     permission_classes = [IsAuthenticated]
-    filter_backends = [SearchFilter]
-    search_fields = ["name", "product__name", ]
+    filter_backends = [CatalogSearchFilter, ParameterFilter]
+    cursor_ordered_by = (CatalogSearchFilter.search_param,)
+    throttle_scope = 'catalog'
+
+    @property
+    def fast(self):
+        return self.action == 'list' and settings.CATALOG_FAST_SERIALIZER
+
+    @property
+    def sparse(self):
+        if not hasattr(self, '_sparse'):
+            self._sparse = sparse_fields(self.request, ProductInfoSerializer)
+        return self._sparse
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields, expand = self.sparse
+        if fields is None and not expand:
+            return queryset
+        related = ['product__category'] if wanted(fields, 'product') else []
+        related += ['shop'] if 'shop' in expand else []
+        queryset = queryset.select_related(None).select_related(*related)
+        if not wanted(fields, 'product_parameters'):
+            queryset = queryset.prefetch_related(None)
+        if fields is not None:
+            columns = ['id'] + [name for name in fields if name in ('name', 'shop', 'quantity', 'price', 'price_rrc')]
+            columns += ['product__name', 'product__category__name'] if 'product' in fields else []
+            columns += ['shop__name', 'shop__state'] if 'shop' in expand else []
+            queryset = queryset.only(*columns)
+        return queryset
+
+    def get_serializer_class(self):
+        return ProductInfoFastSerializer if self.fast else super().get_serializer_class()
+
+    def get_serializer(self, *args, **kwargs):
+        fields, expand = self.sparse
+        return super().get_serializer(*args, fields=fields, expand=expand, **kwargs)
+
+    def paginate_queryset(self, queryset):
+        if self.fast:
+            queryset = ProductInfoFastSerializer.rows(queryset, *self.sparse)
+        return super().paginate_queryset(queryset)
+
+    def cache_scopes(self, request):
+        # товары магазина меняют импорт его прайс-листа и оформление заказов, оба поднимают версии категорий
+        if request.query_params.get('shop'):
+            return [('shop', request.query_params['shop'])]
+        return [('category', request.query_params.get('category') or 'all')]
+
+    def cache_stamps(self, request):
+        versions, modified = super().cache_stamps(request)
+        if self.cache_scopes(request) != [('category', 'all')]:
+            return versions, modified
+        # заказ поднимает версии только своих магазинов и категорий, общий список и карточка товара
+        # показывают новые остатки со следующего окна
+        window = stock_stamp()
+        return versions + (window,), max(modified or 0, window * settings.CATALOG_STOCK_INTERVAL)
+
+    @extend_schema(parameters=CURSOR_PARAMETERS + SPARSE_PARAMETERS, responses=ProductInfoSerializer(many=True))
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @extend_schema(parameters=SPARSE_PARAMETERS)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.request.query_params.get('facets'):
+            response.data['facets'] = catalog_facets(self.filter_queryset(self.get_queryset()), self.request)
+        return response
 
 
 class ShoppingCartViewSet(ViewSet):
@@ -500,19 +673,24 @@ class ShoppingCartViewSet(ViewSet):
     def get_object(self, request, pk):
 
         items = OrderItem.objects.filter(order__user=request.user.id, order__state='BASKET').annotate(
-            total_sum_position=Sum(F('quantity') * F('product_info__price')))
+            total_sum_position=F('quantity') * F('price')).select_related('product_info')
         items = get_object_or_404(items, pk=pk)
         return items
 
     @extend_schema(
         description='Get your shopping cart',
-        responses=OrderItemSerializerGet
+        responses=OrderItemSerializerGet,
+        parameters=SPARSE_PARAMETERS,
     )
     def list(self, request, *args, **kwargs):
 
-        queryset = OrderItem.objects.filter(order__user=request.user.id, order__state='BASKET').annotate(
-            total_sum_position=Sum(F('quantity') * F('product_info__price')))
-        serializer = OrderItemSerializerGet(queryset, many=True)
+        fields, expand = sparse_fields(request, OrderItemSerializerGet)
+        queryset = OrderItem.objects.filter(order__user=request.user.id, order__state='BASKET')
+        if wanted(fields, 'total_sum_position'):
+            queryset = queryset.annotate(total_sum_position=F('quantity') * F('price'))
+        if wanted(fields, 'product_info'):
+            queryset = queryset.select_related('product_info')
+        serializer = OrderItemSerializerGet(queryset, many=True, fields=fields, expand=expand)
         return Response(serializer.data)
 
     @extend_schema(
@@ -558,10 +736,10 @@ class ShoppingCartViewSet(ViewSet):
             serializer = OrderItemSerializerPost(data=data)
             if serializer.is_valid(raise_exception=True):
                 serializer.save()
-                return JsonResponse({"Status": True, "Description": serializer.data})
+                return Response({"Status": True, "Description": serializer.data})
 
         except IntegrityError as errors:
-            return JsonResponse({"Status": False, "Errors": str(errors)})
+            return Response({"Status": False, "Errors": str(errors)})
 
     @extend_schema(
         description='Get info about product by id',
@@ -569,12 +747,10 @@ class ShoppingCartViewSet(ViewSet):
     )
     def retrieve(self, request, pk, *args, **kwargs):
 
-        product = self.get_object(request, pk).distinct()
-        if product:
-            serializer = OrderItemSerializerGet(product, many=True)
-            return JsonResponse({"Status": True, "Description": serializer.data})
-        else:
-            return JsonResponse({"Status": False, "Description": f"Позиции с id{pk} в корзине нет"})
+        # get_object отвечает 404, если позиции в корзине нет
+        product = self.get_object(request, pk)
+        serializer = OrderItemSerializerGet([product], many=True)
+        return Response({"Status": True, "Description": serializer.data})
 
     @extend_schema(
         description='Change quantity for item in SC',
@@ -603,12 +779,13 @@ class ShoppingCartViewSet(ViewSet):
     )
     def partial_update(self, request, pk, *args, **kwargs):
 
-        item = self.get_object(request, pk).first()
+        item = self.get_object(request, pk)
 
+        # остаток здесь только подсказка, списывается он под блокировкой при оформлении, см. orders/checkout.py
         try:
-            available_qnt = ProductInfo.objects.get(product__name=item.product_info.product.name).quantity
+            available_qnt = item.product_info.quantity
         except AttributeError as er:
-            return JsonResponse({"Status": False, "Errors": str(er)})
+            return Response({"Status": False, "Errors": str(er)})
 
         try:
             if int(request.data.get('quantity')) <= available_qnt:
@@ -616,14 +793,15 @@ class ShoppingCartViewSet(ViewSet):
                     serializer = OrderItemSerializerPatch(item, data=request.data)
                     if serializer.is_valid():
                         serializer.save()
-                        return JsonResponse({"Status": True, "Description": serializer.data})
+                        return Response({"Status": True, "Description": serializer.data})
+                    return Response({"Status": False, "Errors": serializer.errors})
                 except IntegrityError as er:
-                    return JsonResponse({"Status": False, "Errors": str(er)})
+                    return Response({"Status": False, "Errors": str(er)})
             else:
-                return JsonResponse({"Status": False, "Error": f'Available qnty {available_qnt} '
+                return Response({"Status": False, "Error": f'Available qnty {available_qnt} '
                                                                f'less then request {request.data["quantity"]}'})
         except ValueError as ve:
-            return JsonResponse({"Status": False, "Errors": str(ve)})
+            return Response({"Status": False, "Errors": str(ve)})
 
     @extend_schema(description='Delete position by id')
     def destroy(self, request, pk, *args, **kwargs):
@@ -631,9 +809,10 @@ class ShoppingCartViewSet(ViewSet):
         try:
             info = self.get_object(request, pk)
             info.delete()
-            return JsonResponse({'Status': True, 'Позиция': f'с id{pk} удалена'})
+            touch_order(info)
+            return Response({'Status': True, 'Позиция': f'с id{pk} удалена'})
         except ValueError as er:
-            return JsonResponse({"Status": False, "Errors": str(er)})
+            return Response({"Status": False, "Errors": str(er)})
 
     @extend_schema(description='Create a new order with status BASKET')
     @action(detail=False, methods=['POST'], name='Create new shop-cart', permission_classes=[IsAuthenticated])
@@ -641,17 +820,22 @@ class ShoppingCartViewSet(ViewSet):
 
         try:
             new_order = Order.objects.create(user_id=request.user.id)
-            return JsonResponse({"Status": True, "Description": f'New Order create with id{new_order.id}'})
+            return Response({"Status": True, "Description": f'New Order create with id{new_order.id}'})
         except:
-            return JsonResponse({"Status": False, "Description": "Something went wrong, try again"})
+            return Response({"Status": False, "Description": "Something went wrong, try again"})
 
-    @extend_schema(description='Show all carts')
+    @extend_schema(description='Show all carts', parameters=CURSOR_PARAMETERS + SPARSE_PARAMETERS)
     @action(detail=False, methods=['GET'], name='Show all carts')
     def all(self, request, *args, **kwargs):
 
+        fields, expand = sparse_fields(request, OrderSerializerAll)
         order = Order.objects.filter(user_id=request.user.id)
-        serializer = OrderSerializerAll(order, many=True)
-        return Response(serializer.data)
+        stamp = order.aggregate(count=Count('id'), updated=Max('updated_at'))
+        if expand:
+            order = order.select_related(*expand)
+        return conditional_response(request, make_etag(request, request.user.id, stamp), stamp['updated'],
+                                    lambda: paginated_response(request, self, order, OrderSerializerAll,
+                                                               fields=fields, expand=expand))
 
 
 class OrderViewSet(ViewSet):
@@ -663,16 +847,22 @@ class OrderViewSet(ViewSet):
 
     @extend_schema(
         description='Get my orders (with any status except Basket)',
-        responses=OrderSerializer
+        responses=OrderSerializer,
+        parameters=CURSOR_PARAMETERS + SPARSE_PARAMETERS,
     )
     def list(self, request, *args, **kwargs):
 
-        order = Order.objects.filter(user_id=request.user.id).exclude(state='BASKET').annotate(
-            total_sum=Sum(F('orders__quantity') * F('orders__product_info__price')))
+        fields, expand = sparse_fields(request, OrderSerializer)
+        order = Order.objects.filter(user_id=request.user.id).exclude(state='BASKET')
+        # штамп из одного агрегата по индексу заказов пользователя: изменение позиций поднимает updated_at заказа
+        stamp = order.aggregate(count=Count('id'), updated=Max('updated_at'))
+        if expand:
+            order = order.select_related(*expand)
 
         try:
-            serializer = OrderSerializer(order, many=True)
-            return Response(serializer.data)
+            return conditional_response(request, make_etag(request, request.user.id, stamp), stamp['updated'],
+                                        lambda: paginated_response(request, self, order, OrderSerializer,
+                                                                   fields=fields, expand=expand))
         except IntegrityError as er:
             return Response(str(er))
 
@@ -706,12 +896,25 @@ class OrderViewSet(ViewSet):
             contact = get_object_or_404(Contact, pk=request.data['contact_id'])
         except ValueError as ve:
             return Response(str(ve))
-        order = get_object_or_404(Order, pk=pk)
-        if order.state == 'BASKET':
-            update_order = Order.objects.filter(user_id=request.user.id, pk=pk). \
-                update(contact_id=request.data['contact_id'], state='NEW')
-            info_postman.new_order.delay(request.user.id, request.data)
-            return JsonResponse({'Status': True, 'Description': f'Order with id{pk} change status to NEW'})
-        else:
-            return JsonResponse(
-                {'Status': False, 'Description': 'Can not to change status, because order is not basket'})
+        get_object_or_404(Order, pk=pk)
+        try:
+            with transaction.atomic():
+                checkout(pk, request.user.id, contact.id)
+                emit(info_postman.new_order, request.user.id, request.data, key=f'new_order:{pk}')
+        except CheckoutError as error:
+            return Response({'Status': False, 'Description': str(error), 'Errors': {
+                pk: {'requested': wanted, 'available': available}
+                for pk, (wanted, available) in error.shortages.items()}})
+        return Response({'Status': True, 'Description': f'Order with id{pk} change status to NEW'})
+
+
+class MetricsViewSet(ViewSet):
+    """
+    Счётчики кэшей и пулов для администраторов
+    """
+
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(description='Counters shared by all workers and database pools of the serving process')
+    def list(self, request, *args, **kwargs):
+        return Response({**metrics.snapshot(), **pool_stats()})
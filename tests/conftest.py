@@ -1,9 +1,26 @@
 import pytest
 import uuid
+from django.core.cache import cache
 from rest_framework.test import APIClient
 from rest_framework.authtoken.models import Token
 from model_bakery import baker
 from EShops_API.celery import app
+from orders import metrics
+from orders.authentication import local_tokens
+from orders.importer import identity_cache
+
+
+# Drop ids cached by the importer, cached tokens, counters and throttling history,
+# the test database is rolled back after each test
+@pytest.fixture(autouse=True)
+def clear_caches():
+    identity_cache.clear()
+    local_tokens.clear()
+    metrics.reset()
+    cache.clear()
+    yield
+    identity_cache.clear()
+    local_tokens.clear()
 
 
 # Password for test-user
@@ -0,0 +1,83 @@
+import json
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.status import HTTP_200_OK, HTTP_429_TOO_MANY_REQUESTS
+
+from orders.management.commands.bench_login import asgi_request
+from orders.models import OutboxEvent, User
+
+
+def async_post(url, data):
+    return async_to_sync(AsyncClient().post)(url, data, content_type='application/json')
+
+
+@pytest.mark.django_db(transaction=True)
+def test_async_login_returns_token(client, create_user, test_email, test_password, settings):
+    """
+    In this test the async login answers with the same JSON as the sync one, with AUTH_INLINE_TOKEN it is the token
+    """
+    user = create_user()
+    data = {'email': test_email, 'password': test_password}
+
+    response = async_post(reverse('orders:auth-async-login'), data)
+    assert response.status_code == HTTP_200_OK
+    assert response.content == client.post(reverse('orders:auth-login'), data, format='json').content
+    assert response.json() == {'Status': True, 'Token': 'send to email'}
+    assert OutboxEvent.objects.count() == 2
+
+    settings.AUTH_INLINE_TOKEN = True
+    response = async_post(reverse('orders:auth-async-login'), data)
+    assert response.json() == {'Status': True, 'Token': Token.objects.get(user=user).key}
+    assert OutboxEvent.objects.count() == 2
+
+    response = async_post(reverse('orders:auth-async-login'), {'email': test_email, 'password': 'wrong'})
+    assert response.json() == {'Status': False, 'Errors': 'Не удалось авторизовать'}
+
+
+@pytest.mark.django_db(transaction=True)
+def test_async_registration_and_throttling():
+    """
+    In this test the async registration creates the user and its confirm mail event, the auth bucket still applies
+    """
+    response = async_post(reverse('orders:auth-async-registration'), {
+        'first_name': 'Foo', 'last_name': 'Bar', 'email': 'async@example.com', 'password': 'Valid1Password',
+        'company': 'MU', 'position': 'Fw', 'type': 'CLIENT'})
+
+    assert response.json() == {'Status': True, 'Info': 'To your email send confirm token'}
+    user = User.objects.get(email='async@example.com')
+    assert user.check_password('Valid1Password')
+    assert OutboxEvent.objects.get().key == f'confirm:{user.id}'
+
+    for _ in range(4):
+        assert async_post(reverse('orders:auth-async-login'), {}).status_code == HTTP_200_OK
+    response = async_post(reverse('orders:auth-async-login'), {})
+    assert response.status_code == HTTP_429_TOO_MANY_REQUESTS
+    assert response['X-RateLimit-Remaining'] == '0'
+    assert 'Retry-After' in response
+
+
+@pytest.mark.django_db(transaction=True)
+def test_async_auth_through_asgi_application(create_user, test_email, test_password):
+    """
+    In this test login and registration go through EShops_API.asgi.application with the full middleware stack
+    """
+    from EShops_API.asgi import application
+
+    create_user()
+    headers = [(b'content-type', b'application/json')]
+    status, body = async_to_sync(asgi_request)(
+        application, 'POST', reverse('orders:auth-async-login'),
+        json.dumps({'email': test_email, 'password': test_password}).encode(), headers)
+    assert status == HTTP_200_OK
+    assert json.loads(body) == {'Status': True, 'Token': 'send to email'}
+
+    status, body = async_to_sync(asgi_request)(
+        application, 'POST', reverse('orders:auth-async-registration'), json.dumps({
+            'first_name': 'Foo', 'last_name': 'Bar', 'email': 'asgi@example.com', 'password': 'Valid1Password',
+            'company': 'MU', 'position': 'Fw', 'type': 'CLIENT'}).encode(), headers)
+    assert status == HTTP_200_OK
+    assert User.objects.filter(email='asgi@example.com').exists()
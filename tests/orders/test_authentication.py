@@ -0,0 +1,86 @@
+import pytest
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.status import HTTP_200_OK, HTTP_401_UNAUTHORIZED
+
+from orders import metrics
+from orders.authentication import CachedTokenAuthentication, local_tokens
+from orders.models import User
+
+
+@pytest.mark.django_db
+def test_token_is_cached(client, get_or_create_token, django_assert_num_queries):
+    """
+    In this test only the first request reads the token from the database
+    """
+    client.credentials(HTTP_AUTHORIZATION='Token ' + get_or_create_token.key)
+    url = reverse('orders:user-list')
+    client.get(url)
+
+    # contacts of the user, the token comes from the memory of the process
+    with django_assert_num_queries(1):
+        assert client.get(url).status_code == HTTP_200_OK
+
+    counters = metrics.snapshot()
+    assert (counters['auth.miss'], counters['auth.local_hit'], counters['auth.latency.count']) == (1, 1, 2)
+
+
+@pytest.mark.django_db
+def test_cached_user_is_invalidated(client, get_or_create_token, test_password):
+    """
+    In this test changes of the user are seen at once and saving the cached user keeps the password
+    """
+    token = get_or_create_token
+    client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+    url = reverse('orders:user-list')
+    client.get(url)
+
+    user, _ = CachedTokenAuthentication().authenticate_credentials(token.key)
+    user.company = 'Рога и копыта'
+    user.save()
+    assert client.get(url).data['company'] == 'Рога и копыта'
+    token.user.refresh_from_db()
+    assert token.user.check_password(test_password)
+
+    token.delete()
+    assert client.get(url).status_code == HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.django_db
+def test_token_deleted_during_lookup_is_not_cached(get_or_create_token, monkeypatch):
+    """
+    In this test a token deleted while its row is read from the database is not served from the caches afterwards
+    """
+    token = get_or_create_token
+    fetch = CachedTokenAuthentication.fetch
+
+    def racing(key):
+        row = fetch(key)
+        Token.objects.filter(key=key).delete()
+        return row
+
+    monkeypatch.setattr(CachedTokenAuthentication, 'fetch', staticmethod(racing))
+    CachedTokenAuthentication().authenticate_credentials(token.key)
+    assert token.key not in local_tokens
+    monkeypatch.undo()
+
+    with pytest.raises(AuthenticationFailed):
+        CachedTokenAuthentication().authenticate_credentials(token.key)
+
+
+@pytest.mark.django_db
+def test_change_info_does_not_write_back_cached_user(celery_app, client, get_or_create_token):
+    """
+    In this test a user blocked behind the back of the token cache stays blocked after changing their info
+    with the cached token
+    """
+    token = get_or_create_token
+    client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+    client.get(reverse('orders:user-list'))
+    User.objects.filter(pk=token.user.pk).update(is_active=False, type='SHOP')
+
+    response = client.patch(reverse('orders:user-change-info'), data={'company': 'Рога и копыта'}, format='json')
+    assert response.status_code == HTTP_200_OK
+    user = User.objects.get(pk=token.user.pk)
+    assert (user.company, user.is_active, user.type) == ('Рога и копыта', False, 'SHOP')
@@ -0,0 +1,176 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from django.conf import settings as django_settings
+from django.db import connection
+from django.urls import reverse
+from model_bakery import baker
+
+from orders.caching import stock_stamp
+from orders.checkout import CheckoutError, checkout
+from orders.models import Order, ProductInfo, TypeAvailability
+
+
+@pytest.fixture
+def basket(order_factory, order_items_factory):
+    def factory(user, info, quantity):
+        order = order_factory(user=user, state='BASKET')
+        order_items_factory(order=order, product_info=info, quantity=quantity)
+        return order
+
+    return factory
+
+
+@pytest.mark.django_db
+def test_checkout_reserves_stock(celery_app, client, get_or_create_token, basket, category_factory,
+                                 products_factory, product_info_factory, shops_factory):
+    """
+    In this test checkout decrements the stock and the next buyer can not take more than is left
+    """
+    user = get_or_create_token.user
+    info = product_info_factory(product=products_factory(category=category_factory()), shop=shops_factory(),
+                                quantity=3)
+    order = basket(user, info, 2)
+    client.credentials(HTTP_AUTHORIZATION='Token ' + get_or_create_token.key)
+    response = client.patch(reverse('orders:order-detail', args=[order.id]),
+                            data={'contact_id': baker.make('Contact', user=user).id}, format='json')
+
+    assert response.json()['Status'] is True
+    assert Order.objects.get(id=order.id).state == 'NEW'
+    assert ProductInfo.objects.get(id=info.id).quantity == 1
+
+    other = baker.make('orders.User', email='other@example.com')
+    late = basket(other, info, 2)
+    with pytest.raises(CheckoutError) as error:
+        checkout(late.id, other.id, baker.make('Contact', user=other).id)
+
+    assert error.value.shortages == {info.id: (2, 1)}
+    assert Order.objects.get(id=late.id).state == 'BASKET'
+    assert ProductInfo.objects.get(id=info.id).quantity == 1
+
+    response = client.patch(reverse('orders:order-detail', args=[order.id]),
+                            data={'contact_id': baker.make('Contact', user=user).id}, format='json')
+    assert response.json()['Status'] is False
+
+
+@pytest.mark.django_db
+def test_change_basket_item(client, get_or_create_token, basket, category_factory, products_factory,
+                            product_info_factory, shops_factory):
+    """
+    In this test a basket item is read and its quantity is changed within the stock, the order total follows it
+    """
+    token = get_or_create_token
+    info = product_info_factory(product=products_factory(category=category_factory()), shop=shops_factory(),
+                                price=10, quantity=5)
+    order = basket(token.user, info, 1)
+    item = order.orders.get()
+    client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+    url = reverse('orders:shopping_cart-detail', args=[item.id])
+
+    response = client.get(url)
+    assert response.json()['Description'][0]['id'] == item.id
+
+    response = client.patch(url, {'quantity': 3}, format='json')
+    assert response.json() == {'Status': True, 'Description': {'id': item.id, 'quantity': 3}}
+    assert Order.objects.get(id=order.id).total_sum == 30
+
+    response = client.patch(url, {'quantity': 6}, format='json')
+    assert response.json()['Status'] is False
+    assert Order.objects.get(id=order.id).total_sum == 30
+    assert client.patch(reverse('orders:shopping_cart-detail', args=[item.id + 100]), {'quantity': 1},
+                        format='json').status_code == 404
+
+
+@pytest.mark.django_db
+def test_retired_goods_are_not_listed_or_sold(client, get_or_create_token, basket, category_factory,
+                                              products_factory, product_info_factory, shops_factory):
+    """
+    In this test goods which left the price list are hidden from the catalog and can not be checked out
+    """
+    user = get_or_create_token.user
+    info = product_info_factory(product=products_factory(category=category_factory()), shop=shops_factory(),
+                                quantity=3, availability=TypeAvailability.EOS)
+    client.credentials(HTTP_AUTHORIZATION='Token ' + get_or_create_token.key)
+    assert client.get(reverse('orders:product_info-list')).data['results'] == []
+    assert client.get(reverse('orders:product_info-detail', args=[info.id])).status_code == 404
+
+    order = basket(user, info, 1)
+    with pytest.raises(CheckoutError) as error:
+        checkout(order.id, user.id, baker.make('Contact', user=user).id)
+    assert error.value.shortages == {info.id: (1, 0)}
+    assert Order.objects.get(id=order.id).state == 'BASKET'
+    assert ProductInfo.objects.get(id=info.id).quantity == 3
+
+
+@pytest.mark.django_db
+def test_checkout_refreshes_only_its_scopes(celery_app, client, get_or_create_token, basket, category_factory,
+                                           products_factory, product_info_factory, shops_factory, monkeypatch,
+                                           django_capture_on_commit_callbacks):
+    """
+    In this test an order refreshes the listing of its category at once, while the unfiltered listing and the
+    categories keep their cached responses until the next stock window
+    """
+    user = get_or_create_token.user
+    category = category_factory()
+    info = product_info_factory(product=products_factory(category=category), shop=shops_factory(), quantity=3)
+    order = basket(user, info, 2)
+    client.credentials(HTTP_AUTHORIZATION='Token ' + get_or_create_token.key)
+    products = reverse('orders:product_info-list')
+    by_category = f'{products}?category={category.id}'
+    categories = reverse('orders:category-list')
+    for url in (products, by_category, categories):
+        client.get(url)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client.patch(reverse('orders:order-detail', args=[order.id]),
+                                data={'contact_id': baker.make('Contact', user=user).id}, format='json')
+    assert response.json()['Status'] is True
+
+    response = client.get(by_category)
+    assert (response['X-Cache'], response.data['results'][0]['quantity']) == ('MISS', 1)
+    response = client.get(products)
+    assert (response['X-Cache'], response.data['results'][0]['quantity']) == ('HIT', 3)
+    assert client.get(categories)['X-Cache'] == 'HIT'
+
+    window = stock_stamp()
+    monkeypatch.setattr('orders.views.stock_stamp', lambda: window + 1)
+    response = client.get(products)
+    assert (response['X-Cache'], response.data['results'][0]['quantity']) == ('MISS', 1)
+
+
+@pytest.mark.skipif('postgresql' not in django_settings.DATABASES['default']['ENGINE'],
+                    reason='SQLite serializes writers and ignores SELECT ... FOR UPDATE, row locks need PostgreSQL')
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_checkouts_do_not_oversell(category_factory, products_factory, product_info_factory,
+                                              shops_factory):
+    """
+    In this test buyers check out the same item from parallel threads at once and exactly the stock is sold
+    """
+    stock, buyers = 5, 20
+    info = product_info_factory(product=products_factory(category=category_factory()), shop=shops_factory(),
+                                quantity=stock)
+    jobs = []
+    for i in range(buyers):
+        user = baker.make('orders.User', email=f'buyer{i}@example.com')
+        order = baker.make('Order', user=user, state='BASKET')
+        baker.make('OrderItem', order=order, product_info=info, quantity=1)
+        jobs.append((order.id, user.id, baker.make('Contact', user=user).id))
+    barrier = threading.Barrier(buyers)
+
+    def buy(job):
+        barrier.wait()
+        try:
+            checkout(*job)
+            return True
+        except CheckoutError:
+            return False
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=buyers) as pool:
+        sold = sum(pool.map(buy, jobs))
+
+    assert sold == stock
+    assert ProductInfo.objects.get(id=info.id).quantity == 0
+    assert Order.objects.filter(id__in=[job[0] for job in jobs], state='NEW').count() == stock
@@ -0,0 +1,50 @@
+import pytest
+from django.urls import reverse
+from rest_framework.status import HTTP_200_OK, HTTP_304_NOT_MODIFIED
+
+from orders.caching import bump_versions
+
+
+@pytest.mark.django_db
+def test_catalog_not_modified(client, get_or_create_token, category_factory, django_assert_max_num_queries):
+    """
+    In this test the second request with the ETag gets 304 without reading categories, a new import changes the ETag
+    """
+    category_factory(_quantity=2)
+    bump_versions(('category', 'all'))
+    client.credentials(HTTP_AUTHORIZATION='Token ' + get_or_create_token.key)
+    url = reverse('orders:category-list')
+
+    response = client.get(url)
+    assert response.status_code == HTTP_200_OK
+    assert response['Last-Modified']
+
+    # only the token is read from the database
+    with django_assert_max_num_queries(1):
+        assert client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code == HTTP_304_NOT_MODIFIED
+    assert client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code == HTTP_304_NOT_MODIFIED
+    assert client.get(url, {'page': 2}, HTTP_IF_NONE_MATCH=response['ETag']).status_code != HTTP_304_NOT_MODIFIED
+
+    bump_versions(('category', 'all'))
+    assert client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code == HTTP_200_OK
+
+
+@pytest.mark.django_db
+def test_orders_not_modified(client, get_or_create_token, order_factory, order_items_factory, category_factory,
+                             products_factory, product_info_factory, shops_factory):
+    """
+    In this test the list of carts is not modified until an item is added to one of them
+    """
+    user = get_or_create_token.user
+    order = order_factory(user=user)
+    client.credentials(HTTP_AUTHORIZATION='Token ' + get_or_create_token.key)
+    url = reverse('orders:shopping_cart-all')
+
+    etag = client.get(url)['ETag']
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == HTTP_304_NOT_MODIFIED
+
+    info = product_info_factory(product=products_factory(category=category_factory()), shop=shops_factory())
+    order_items_factory(order=order, product_info=info, quantity=1)
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == HTTP_200_OK
+    assert response['ETag'] != etag
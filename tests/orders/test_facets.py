@@ -0,0 +1,68 @@
+import pytest
+from django.urls import reverse
+from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST
+
+from orders.models import Parameter, ProductParameter
+from orders.tasks import import_yaml
+from orders.management.commands.bench_import import make_price_list
+
+MEMORY = 'Встроенная память (Гб)'
+DIAGONAL = 'Диагональ (дюйм)'
+
+
+def phones_price_list(memory):
+    data = make_price_list(len(memory), categories=1)
+    for item, size in zip(data['goods'], memory):
+        item['parameters'] = {MEMORY: size, DIAGONAL: '6,1', 'Цвет': 'черный'}
+    return data
+
+
+@pytest.mark.django_db
+def test_filter_by_parameter_range(client, get_or_create_token_shop):
+    """
+    In this test goods are filtered by numeric ranges of parameters, text values don't match any range
+    """
+    import_yaml(get_or_create_token_shop.user_id, phones_price_list([64, 128, 256, 512]))
+    memory, diagonal, color = (Parameter.objects.get(name=name).id for name in (MEMORY, DIAGONAL, 'Цвет'))
+    assert ProductParameter.objects.filter(parameter_id=diagonal, numeric_value=6.1).count() == 4
+    assert not ProductParameter.objects.filter(parameter_id=color, numeric_value__isnull=False).exists()
+
+    client.credentials(HTTP_AUTHORIZATION='Token ' + get_or_create_token_shop.key)
+    url = reverse('orders:product_info-list')
+    response = client.get(url, {'param': [f'{memory}:128:256', f'{diagonal}:6:6.5']})
+    assert response.status_code == HTTP_200_OK
+    assert response.data['count'] == 2
+
+    assert client.get(url, {'param': f'{memory}:256:'}).data['count'] == 2
+    assert client.get(url, {'param': f'{color}:0:'}).data['count'] == 0
+    assert client.get(url, {'param': f'{memory}:many:'}).status_code == HTTP_400_BAD_REQUEST
+    for bound in ('nan', 'inf', '-inf'):
+        assert client.get(url, {'param': f'{memory}:{bound}:'}).status_code == HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db(transaction=True)
+def test_facets_are_invalidated_by_import(client, get_or_create_token_shop, django_assert_max_num_queries):
+    """
+    In this test facet counts are cached per category and recomputed after the shop imports the price list again
+    """
+    user = get_or_create_token_shop.user
+    data = phones_price_list([64, 128, 128])
+    import_yaml(user.id, data)
+    category = data['categories'][0]['id']
+
+    client.credentials(HTTP_AUTHORIZATION='Token ' + get_or_create_token_shop.key)
+    url = reverse('orders:product_info-list')
+    response = client.get(url, {'category': category, 'facets': 1})
+    assert response.status_code == HTTP_200_OK
+    facets = {facet['parameter']: facet['values'] for facet in response.data['facets']}
+    assert facets[MEMORY] == [{'value': '128', 'count': 2}, {'value': '64', 'count': 1}]
+
+    # token, count, page and two prefetches, facets come from the cache
+    with django_assert_max_num_queries(5):
+        cached = client.get(url, {'category': category, 'facets': 1})
+    assert cached.data['facets'] == response.data['facets']
+
+    import_yaml(user.id, phones_price_list([64, 64, 128]))
+    response = client.get(url, {'category': category, 'facets': 1})
+    facets = {facet['parameter']: facet['values'] for facet in response.data['facets']}
+    assert facets[MEMORY] == [{'value': '128', 'count': 1}, {'value': '64', 'count': 2}]
@@ -0,0 +1,43 @@
+import json
+
+import pytest
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.status import HTTP_200_OK
+
+from orders.models import ProductInfo
+from orders.renderers import UJSONRenderer
+from orders.serializers import ProductInfoSerializer, ProductInfoFastSerializer
+from orders.tasks import import_yaml
+from orders.management.commands.bench_import import make_price_list
+
+
+@pytest.mark.django_db
+def test_fast_serializer_same_json(create_user_shop):
+    """
+    In this test the fast serializer and the ujson renderer give the same JSON as the DRF path
+    """
+    import_yaml(create_user_shop().id, make_price_list(30, categories=3))
+    queryset = ProductInfo.objects.order_by('id').select_related('product__category'). \
+        prefetch_related('product_parameters__parameter')
+
+    expected = JSONRenderer().render(ProductInfoSerializer(queryset, many=True).data)
+    fast = UJSONRenderer().render(ProductInfoFastSerializer(ProductInfoFastSerializer.rows(queryset), many=True).data)
+
+    assert json.loads(fast) == json.loads(expected)
+
+
+@pytest.mark.django_db
+def test_product_list_fast_path(client, get_or_create_token_shop, django_assert_max_num_queries):
+    """
+    In this test a page of the catalog takes the same queries regardless of the number of goods
+    """
+    import_yaml(get_or_create_token_shop.user_id, make_price_list(60))
+    client.credentials(HTTP_AUTHORIZATION='Token ' + get_or_create_token_shop.key)
+
+    # token, count, page rows and parameters of the page
+    with django_assert_max_num_queries(4):
+        response = client.get(reverse('orders:product_info-list'))
+    assert response.status_code == HTTP_200_OK
+    assert len(response.data['results']) == 40
+    assert len(response.json()['results'][0]['product_parameters']) == 4
@@ -0,0 +1,265 @@
+import pytest
+import yaml
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import transaction
+from django.urls import reverse
+from rest_framework.status import HTTP_200_OK
+
+from orders.importer import ImportMode
+from orders.import_jobs import split_price_list
+from orders.importer import identity_cache
+from orders.models import ProductInfo, ProductParameter, Category, Parameter, TypeAvailability, Shop, ImportJob, \
+    StatusImport, OutboxEvent, ImportShard
+from orders.price_list import PriceListStream
+from orders.outbox import relay
+from orders.tasks import dispatch_shards, import_yaml, import_shard, start_import
+from orders.management.commands.bench_import import make_price_list
+
+
+@pytest.fixture
+def price_list():
+    with open(settings.BASE_DIR / 'data' / 'shop1.yaml', encoding='utf-8') as file:
+        return yaml.load(file, yaml.SafeLoader)
+
+
+@pytest.mark.django_db
+def test_import_yaml(create_user_shop, price_list):
+    """
+    In this test import the demo price-list and check goods and their parameters
+    """
+    user = create_user_shop()
+    import_yaml(user.id, price_list)
+
+    goods = price_list['goods']
+    assert ProductInfo.objects.filter(shop__user=user).count() == len(goods)
+    assert Category.objects.filter(shop__user=user).count() == len(price_list['categories'])
+    assert ProductParameter.objects.count() == sum(len(item['parameters']) for item in goods)
+
+    info = ProductInfo.objects.get(external_id=goods[0]['id'])
+    parameters = {p.parameter.name: p.value for p in info.product_parameters.all()}
+    assert parameters == {name: str(value) for name, value in goods[0]['parameters'].items()}
+
+
+@pytest.mark.django_db
+def test_import_yaml_query_count(create_user_shop, django_assert_max_num_queries):
+    """
+    In this test check that the number of queries doesn't depend on the number of goods
+    """
+    user = create_user_shop()
+    with django_assert_max_num_queries(40):
+        import_yaml(user.id, make_price_list(500))
+
+    assert ProductInfo.objects.count() == 500
+    assert Parameter.objects.count() == 4
+
+
+@pytest.mark.django_db
+def test_import_yaml_incremental(create_user_shop, price_list, order_factory, order_items_factory,
+                                 django_assert_max_num_queries):
+    """
+    In this test re-upload the price-list: unchanged goods are kept, removed goods go to End of sales
+    """
+    user = create_user_shop()
+    first = import_yaml(user.id, price_list)
+    assert first['added'] == len(price_list['goods'])
+
+    ordered = ProductInfo.objects.get(external_id=price_list['goods'][0]['id'])
+    order_items_factory(order=order_factory(user=user), product_info=ordered, quantity=1)
+    ids = dict(ProductInfo.objects.values_list('external_id', 'id'))
+
+    with django_assert_max_num_queries(10):
+        summary = import_yaml(user.id, price_list)
+    assert (summary['added'], summary['changed'], summary['retired']) == (0, 0, 0)
+    assert summary['unchanged'] == len(price_list['goods'])
+
+    removed = price_list['goods'].pop()
+    price_list['goods'][0]['price'] += 100
+    price_list['goods'][1]['parameters']['Цвет'] = 'фиолетовый'
+    summary = import_yaml(user.id, price_list)
+
+    assert (summary['added'], summary['changed'], summary['retired']) == (0, 2, 1)
+    assert dict(ProductInfo.objects.values_list('external_id', 'id')) == ids
+    assert ProductInfo.objects.get(external_id=removed['id']).availability == TypeAvailability.EOS
+    assert ProductInfo.objects.get(external_id=price_list['goods'][1]['id']). \
+        product_parameters.get(parameter__name='Цвет').value == 'фиолетовый'
+    assert ordered.ordered_items.count() == 1
+
+
+@pytest.mark.django_db
+def test_import_yaml_replace(create_user_shop, price_list):
+    """
+    In this test the replace mode recreates the shop catalog
+    """
+    user = create_user_shop()
+    import_yaml(user.id, price_list)
+    ids = set(ProductInfo.objects.values_list('id', flat=True))
+    summary = import_yaml(user.id, price_list, ImportMode.REPLACE)
+
+    assert summary['added'] == len(price_list['goods'])
+    assert ids.isdisjoint(ProductInfo.objects.values_list('id', flat=True))
+
+
+@pytest.mark.django_db(transaction=True)
+def test_import_identity_cache(create_user_shop, price_list):
+    """
+    In this test the second import takes parameters, categories and products from the worker cache
+    """
+    user = create_user_shop()
+    first = import_yaml(user.id, price_list)
+    assert first['cache_hits'] == 0
+
+    second = import_yaml(user.id, price_list)
+    assert second['cache_misses'] == 0
+    assert second['cache_hit_rate'] == 1.0
+    assert second['saved_queries'] == 3
+
+    Parameter.objects.get(name='Цвет').delete()
+    assert 'Цвет' not in identity_cache.parameters
+    third = import_yaml(user.id, price_list)
+    assert third['parameters'] == 1
+    assert ProductParameter.objects.filter(parameter__name='Цвет').count() == len(price_list['goods'])
+
+
+@pytest.mark.django_db(transaction=True)
+def test_import_identity_cache_rollback_and_rename(create_user_shop, price_list):
+    """
+    In this test ids of a rolled back import do not get into the worker cache and a renamed parameter
+    is not found by its old name
+    """
+    user = create_user_shop()
+    with pytest.raises(RuntimeError), transaction.atomic():
+        import_yaml(user.id, price_list)
+        raise RuntimeError
+    assert not Parameter.objects.exists()
+    assert 'Цвет' not in identity_cache.parameters
+
+    import_yaml(user.id, price_list)
+    assert 'Цвет' in identity_cache.parameters
+    parameter = Parameter.objects.get(name='Цвет')
+    parameter.name = 'Окраска'
+    parameter.save()
+    assert 'Цвет' not in identity_cache.parameters
+
+
+def test_price_list_stream(price_list):
+    """
+    In this test the streaming reader gives the same data as yaml.load, whatever the order of keys
+    """
+    with open(settings.BASE_DIR / 'data' / 'shop1.yaml', 'rb') as file:
+        stream = PriceListStream(file)
+        assert (stream.shop, stream.categories) == (price_list['shop'], price_list['categories'])
+        assert list(stream.goods()) == price_list['goods']
+
+    reordered = yaml.dump({'goods': price_list['goods'], 'categories': price_list['categories'],
+                           'shop': price_list['shop']}, allow_unicode=True)
+    stream = PriceListStream(reordered)
+    assert stream.shop == price_list['shop']
+    assert list(stream.goods()) == price_list['goods']
+
+
+@pytest.mark.django_db
+def test_seller_upload(celery_app, client, get_or_create_token_shop, settings, tmp_path):
+    """
+    In this test upload the price-list file: it is stored on disk and imported from there in parts
+    """
+    settings.MEDIA_ROOT = tmp_path
+    settings.IMPORT_SHARD_SIZE = 2
+    token = get_or_create_token_shop
+    client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+    content = (settings.BASE_DIR / 'data' / 'shop1.yaml').read_bytes()
+    response = client.post(reverse('orders:partners-list'),
+                           {'file': SimpleUploadedFile('shop1.yaml', content)}, format='multipart')
+
+    assert response.status_code == HTTP_200_OK
+    filename = response.json()['Price is uploaded']
+    assert default_storage.exists(filename)
+    assert not Shop.objects.filter(user=token.user).exists()
+
+    # импорт запускается после коммита запроса, задачу в брокер отправляет relay
+    relay()
+    shop = Shop.objects.get(user=token.user)
+    assert shop.filename.name == filename
+    assert shop.product_info.count() == 5
+
+    response = client.get(reverse('orders:partner_import-detail', args=[response.json()['Import']]))
+    assert response.status_code == HTTP_200_OK
+    job = response.json()
+    assert (job['state'], job['total'], job['progress'], job['shards_total'], job['shards_done']) == \
+           ('DONE', 5, 100.0, 3, 3)
+    assert job['summary']['added'] == 5
+    assert not default_storage.exists(f'uploads/imports/{job["id"]}/0.json')
+
+
+@pytest.mark.django_db
+def test_import_resume(create_user_shop, price_list, settings, tmp_path):
+    """
+    In this test the import is interrupted after the first part and resumed from the checkpoint
+    """
+    settings.MEDIA_ROOT = tmp_path
+    settings.IMPORT_SHARD_SIZE = 2
+    user = create_user_shop()
+    import_yaml(user.id, price_list)
+    price_list['goods'].pop()
+    price_list['goods'][3]['price'] += 1
+    filename = default_storage.save('uploads/shop1.yaml', ContentFile(yaml.dump(price_list, allow_unicode=True)))
+    job = ImportJob.objects.create(user=user, filename=filename)
+
+    split_price_list(job)
+    assert job.shards.count() == 2
+    import_shard(job.id, 0)
+    assert ImportJob.objects.get(pk=job.pk).processed == 2
+
+    start_import(job.id)
+    job.refresh_from_db()
+    assert job.state == StatusImport.DONE
+    assert job.shards.filter(state=StatusImport.DONE).count() == 2
+    assert (job.summary['unchanged'], job.summary['changed'], job.summary['retired']) == (3, 1, 1)
+
+
+@pytest.mark.django_db
+def test_resume_only_failed_import(client, get_or_create_token_shop):
+    """
+    In this test only a failed import is resumed, and only once until it fails again
+    """
+    token = get_or_create_token_shop
+    client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+    job = ImportJob.objects.create(user=token.user, filename='uploads/shop1.yaml', state=StatusImport.RUNNING)
+    url = reverse('orders:partner_import-resume', args=[job.id])
+
+    assert client.post(url).json()['Status'] is False
+    ImportJob.objects.filter(pk=job.pk).update(state=StatusImport.FAILED)
+    assert client.post(url).json()['Status'] is True
+    assert client.post(url).json()['Status'] is False
+    assert ImportJob.objects.get(pk=job.pk).state == StatusImport.PENDING
+    assert OutboxEvent.objects.filter(task='orders.tasks.start_import').count() == 1
+
+
+@pytest.mark.django_db
+def test_import_shards_are_dispatched_in_turns(create_user_shop, settings, monkeypatch):
+    """
+    In this test a job has at most IMPORT_JOB_INFLIGHT parts queued, the next part is queued when one finishes,
+    so the parts of another job queued meanwhile are not behind the whole first price list
+    """
+    settings.IMPORT_JOB_INFLIGHT = 2
+    user = create_user_shop()
+    jobs = [ImportJob.objects.create(user=user, filename='uploads/shop1.yaml', state=StatusImport.RUNNING)
+            for _ in range(2)]
+    for job, count in zip(jobs, (5, 2)):
+        ImportShard.objects.bulk_create(ImportShard(job=job, index=index, filename=f'{index}.json', size=1)
+                                        for index in range(count))
+    queued = []
+    monkeypatch.setattr('orders.tasks.import_shard.delay', lambda job_id, index: queued.append((job_id, index)))
+    monkeypatch.setattr('orders.tasks.finish_import.delay', lambda job_id: queued.append((job_id, 'finish')))
+
+    big, small = jobs[0].id, jobs[1].id
+    dispatch_shards(big)
+    dispatch_shards(small)
+    assert queued == [(big, 0), (big, 1), (small, 0), (small, 1)]
+
+    for job_id, index in list(queued):
+        ImportShard.objects.filter(job_id=job_id, index=index).update(state=StatusImport.DONE)
+        dispatch_shards(job_id)
+    assert queued[4:] == [(big, 2), (big, 3), (small, 'finish')]
@@ -0,0 +1,141 @@
+import smtplib
+
+import pytest
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.locmem import EmailBackend
+from django.utils import timezone
+
+from orders.mail import drain, enqueue
+from orders.models import OutboxEvent, OutboxMessage
+from orders.outbox import relay
+from orders.tasks import SendTokens, send_outbox
+
+
+class RefusingBackend(EmailBackend):
+    """
+    Почтовый сервер, который не принимает письма на refused.example.com
+    """
+    opened = 0
+    connection = None
+
+    def open(self):
+        if self.connection:
+            return None
+        RefusingBackend.opened += 1
+        self.connection = True
+        return True
+
+    def close(self):
+        self.connection = None
+
+    def send_messages(self, messages):
+        if messages[0].to[0].endswith('@refused.example.com'):
+            raise smtplib.SMTPRecipientsRefused({messages[0].to[0]: (550, b'no such user')})
+        return super().send_messages(messages)
+
+
+@pytest.mark.django_db
+def test_token_mail_goes_through_outbox(create_user):
+    """
+    In this test the token mail is queued instead of sent by the task and delivered by the sender afterwards
+    """
+    user = create_user()
+    SendTokens.send_auth_token(user.id)
+
+    assert mail.outbox == []
+    message = OutboxMessage.objects.get()
+    assert (message.to, message.domain, message.state) == (user.email, user.email.split('@')[1], 'PENDING')
+
+    assert drain() == (1, 0)
+    assert [email.to for email in mail.outbox] == [[user.email]]
+    assert OutboxMessage.objects.get().state == 'SENT'
+    assert drain() == (0, 0)
+
+
+@pytest.mark.django_db
+def test_outbox_batch_reuses_connection_and_retries(settings):
+    """
+    In this test one connection delivers the whole queue, a refused address is retried later and given up
+    after MAIL_MAX_ATTEMPTS
+    """
+    settings.MAIL_MAX_ATTEMPTS = 2
+    for i in range(5):
+        enqueue(f'user{i}@example.com', 'subject', 'body')
+    refused = enqueue('nobody@refused.example.com', 'subject', 'body')
+
+    RefusingBackend.opened = 0
+    assert drain(batch_size=2, connection=RefusingBackend()) == (5, 1)
+    assert RefusingBackend.opened == 1
+    assert len(mail.outbox) == 5
+    refused.refresh_from_db()
+    assert (refused.state, refused.attempts) == ('PENDING', 1)
+    assert refused.next_attempt_at > timezone.now()
+    assert 'no such user' in refused.error
+
+    OutboxMessage.objects.filter(id=refused.id).update(next_attempt_at=timezone.now())
+    assert drain(connection=RefusingBackend()) == (0, 1)
+    refused.refresh_from_db()
+    assert (refused.state, refused.attempts) == ('FAILED', 2)
+
+
+@pytest.mark.django_db
+def test_outbox_domain_concurrency(settings):
+    """
+    In this test a domain with all sender slots taken waits, other domains are delivered
+    """
+    settings.MAIL_DOMAIN_CONCURRENCY = 1
+    enqueue('a@busy.example.com', 'subject', 'body')
+    enqueue('b@example.com', 'subject', 'body')
+    cache.add('mail:domain:busy.example.com:0', 1)
+
+    assert drain() == (1, 0)
+    assert [email.to for email in mail.outbox] == [['b@example.com']]
+
+    cache.delete('mail:domain:busy.example.com:0')
+    assert drain() == (1, 0)
+    assert OutboxMessage.objects.filter(state='SENT').count() == 2
+
+
+@pytest.mark.django_db
+def test_outbox_reschedules_while_mail_waits(settings, monkeypatch):
+    """
+    In this test a run that could not send anything because of busy domain slots still plans the next one,
+    an empty queue plans nothing
+    """
+    settings.MAIL_DOMAIN_CONCURRENCY = 1
+    settings.MAIL_BATCH_DELAY = 5
+    enqueue('a@busy.example.com', 'subject', 'body')
+    cache.add('mail:domain:busy.example.com:0', 1)
+    planned = []
+    monkeypatch.setattr('orders.tasks.schedule', planned.append)
+
+    assert send_outbox.run() == (0, 0)
+    assert planned == [6]
+
+    cache.delete('mail:domain:busy.example.com:0')
+    assert send_outbox.run() == (1, 0)
+    assert planned == [6]
+
+
+@pytest.mark.django_db
+def test_mail_wakeup_goes_through_outbox(celery_app, settings, monkeypatch, django_capture_on_commit_callbacks):
+    """
+    In this test queued mail wakes the sender with one outbox event per batch window at the window's end,
+    the request itself touches neither the cache nor the broker
+    """
+    settings.MAIL_BATCH_DELAY = 60
+    monkeypatch.setattr(send_outbox, 'apply_async', None)
+    monkeypatch.setattr('orders.mail.cache', None)
+    with django_capture_on_commit_callbacks(execute=True):
+        enqueue('a@example.com', 'subject', 'body')
+    with django_capture_on_commit_callbacks(execute=True):
+        enqueue('b@example.com', 'subject', 'body')
+
+    event = OutboxEvent.objects.get()
+    assert (event.task, event.key) == (send_outbox.name, f'mail:wake:{event.eta.timestamp() // 60:.0f}')
+    assert event.eta > event.created_at
+    monkeypatch.undo()
+
+    assert relay() == 1
+    assert sorted(email.to[0] for email in mail.outbox) == ['a@example.com', 'b@example.com']
@@ -0,0 +1,57 @@
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from model_bakery import baker
+
+from orders.checkout import checkout
+from orders.models import Order, OrderItem, ProductInfo
+
+
+@pytest.mark.django_db
+def test_total_follows_items_and_is_frozen_at_checkout(client, get_or_create_token, order_factory, category_factory,
+                                                       products_factory, product_info_factory, shops_factory,
+                                                       django_assert_max_num_queries):
+    """
+    In this test the order total follows its items and does not change when prices change after checkout
+    """
+    user = get_or_create_token.user
+    product = products_factory(category=category_factory())
+    first = product_info_factory(product=product, shop=shops_factory(), price=100, quantity=10)
+    second = product_info_factory(product=product, shop=shops_factory(), price=30, quantity=10)
+    order = order_factory(user=user, state='BASKET')
+
+    item = OrderItem.objects.create(order=order, product_info=first, quantity=2)
+    OrderItem.objects.create(order=order, product_info=second, quantity=1)
+    assert Order.objects.get(id=order.id).total_sum == 230
+
+    item.quantity = 3
+    item.save()
+    assert Order.objects.get(id=order.id).total_sum == 330
+
+    ProductInfo.objects.filter(id=first.id).update(price=110)
+    checkout(order.id, user.id, baker.make('Contact', user=user).id)
+    assert Order.objects.get(id=order.id).total_sum == 360
+
+    ProductInfo.objects.update(price=1)
+    client.credentials(HTTP_AUTHORIZATION='Token ' + get_or_create_token.key)
+    with django_assert_max_num_queries(3):
+        response = client.get(reverse('orders:order-list'))
+    assert response.json() == [{'id': order.id, 'user': user.id, 'total_sum': 360}]
+
+
+@pytest.mark.django_db
+def test_backfill_order_totals(get_or_create_token, order_factory, order_items_factory, category_factory,
+                               products_factory, product_info_factory, shops_factory):
+    """
+    In this test orders created before the price snapshot get item prices and totals from the price list
+    """
+    info = product_info_factory(product=products_factory(category=category_factory()), shop=shops_factory(), price=7)
+    order = order_factory(user=get_or_create_token.user, state='NEW')
+    order_items_factory(order=order, product_info=info, quantity=3)
+    OrderItem.objects.update(price=None)
+    Order.objects.update(total_sum=0)
+
+    call_command('backfill_order_totals', batch_size=1)
+
+    assert OrderItem.objects.get(order=order).price == 7
+    assert Order.objects.get(id=order.id).total_sum == 21
@@ -0,0 +1,68 @@
+import pytest
+from django.db import transaction
+from django.urls import reverse
+
+from orders.models import ConfirmEmailToken, OutboxEvent, OutboxMessage, User
+from orders.outbox import emit, purge, relay
+from orders.tasks import token_postman
+
+
+@pytest.mark.django_db
+def test_registration_task_goes_through_outbox(celery_app, client):
+    """
+    In this test registration only records the confirm mail task, the relay publishes it and the worker runs it
+    """
+    response = client.post(reverse('orders:auth-registration'), data={
+        'first_name': 'Foo', 'last_name': 'Bar', 'email': 'outbox@example.com', 'password': 'Valid1Password',
+        'company': 'MU', 'position': 'Fw', 'type': 'CLIENT'}, format='json')
+
+    assert response.json()['Status'] is True
+    user = User.objects.get(email='outbox@example.com')
+    event = OutboxEvent.objects.get()
+    assert (event.task, event.args, event.key, event.published_at) == \
+           (token_postman.send_confirm_token.name, [user.id], f'confirm:{user.id}', None)
+    assert not ConfirmEmailToken.objects.exists()
+
+    assert relay() == 1
+    assert ConfirmEmailToken.objects.filter(user=user).exists()
+    assert OutboxMessage.objects.get().to == 'outbox@example.com'
+    assert OutboxEvent.objects.get().published_at is not None
+    assert relay() == 0
+
+
+@pytest.mark.django_db
+def test_outbox_dedupe_and_rollback(create_user):
+    """
+    In this test an event with a known key is recorded once and an event of a rolled back transaction never
+    """
+    user = create_user()
+    emit(token_postman.send_auth_token, user.id, key='login:1')
+    emit(token_postman.send_auth_token, user.id, key='login:1')
+    emit(token_postman.send_auth_token, user.id)
+
+    with pytest.raises(RuntimeError):
+        with transaction.atomic():
+            emit(token_postman.send_auth_token, user.id, key='login:2')
+            raise RuntimeError
+
+    assert list(OutboxEvent.objects.order_by('id').values_list('key', flat=True)) == ['login:1', None]
+
+
+@pytest.mark.django_db
+def test_outbox_unknown_task_does_not_block(celery_app, create_user, settings):
+    """
+    In this test an event of an unknown task is set aside with an error and the events after it are published
+    """
+    user = create_user()
+    OutboxEvent.objects.create(task='orders.tasks.renamed', args=[user.id])
+    emit(token_postman.send_confirm_token, user.id)
+
+    assert relay() == 2
+    assert ConfirmEmailToken.objects.filter(user=user).exists()
+    failed = OutboxEvent.objects.get(task='orders.tasks.renamed')
+    assert failed.error == 'Unknown task orders.tasks.renamed'
+    assert relay() == 0
+
+    settings.OUTBOX_KEEP = -1
+    assert purge() == 1
+    assert OutboxEvent.objects.get() == failed
@@ -0,0 +1,57 @@
+import pytest
+from django.urls import reverse
+from rest_framework.status import HTTP_200_OK
+
+
+@pytest.mark.django_db
+def test_products_cursor_pagination(client, get_or_create_token, category_factory, shops_factory, products_factory,
+                                    product_info_factory, django_assert_max_num_queries):
+    """
+    In this test the catalog is walked with cursors, every item is returned once and no COUNT(*) is done
+    """
+    products = products_factory(_quantity=5, category=category_factory())
+    infos = product_info_factory(_quantity=5, product=iter(products), shop=shops_factory())
+    client.credentials(HTTP_AUTHORIZATION='Token ' + get_or_create_token.key)
+
+    seen = []
+    url = reverse('orders:product_info-list') + '?pagination=cursor&page_size=2'
+    while url:
+        with django_assert_max_num_queries(4):
+            response = client.get(url)
+        assert response.status_code == HTTP_200_OK
+        assert 'count' not in response.data
+        seen += [item['id'] for item in response.data['results']]
+        url = response.data['next']
+
+    assert seen == sorted(info.id for info in infos)
+
+
+@pytest.mark.django_db
+def test_products_search_keeps_its_ordering(client, get_or_create_token, category_factory, shops_factory,
+                                            products_factory, product_info_factory):
+    """
+    In this test a search asked for with cursors gets the usual pages in the order of the search backend
+    """
+    products = products_factory(_quantity=2, name=iter(['Phone', 'Case']), category=category_factory())
+    product_info_factory(_quantity=2, product=iter(products), name=iter(['Phone', 'Case']), shop=shops_factory())
+    client.credentials(HTTP_AUTHORIZATION='Token ' + get_or_create_token.key)
+
+    response = client.get(reverse('orders:product_info-list'), {'search': 'Phone', 'pagination': 'cursor'})
+    assert response.data['count'] == 1
+    assert response.data['results'][0]['name'] == 'Phone'
+
+
+@pytest.mark.django_db
+def test_orders_cursor_pagination_is_opt_in(client, get_or_create_token, order_factory):
+    """
+    In this test carts are listed as before without the parameter and from the newest one with cursors
+    """
+    orders = order_factory(_quantity=3, user=get_or_create_token.user)
+    client.credentials(HTTP_AUTHORIZATION='Token ' + get_or_create_token.key)
+    url = reverse('orders:shopping_cart-all')
+
+    assert len(client.get(url).data) == 3
+
+    response = client.get(url, {'pagination': 'cursor', 'page_size': 2})
+    assert [order['id'] for order in response.data['results']] == [orders[2].id, orders[1].id]
+    assert client.get(response.data['next']).data['results'][0]['id'] == orders[0].id
@@ -0,0 +1,20 @@
+import pytest
+from django.urls import reverse
+from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_json_is_compact_and_not_escaped(client):
+    """
+    In this test the JSON body is parsed by ujson and the Cyrillic answer is not escaped
+    """
+    url = reverse('orders:auth-login')
+    response = client.post(url, '{"email": "nobody@example.com", "password": "пароль"}',
+                           content_type='application/json')
+
+    assert response.status_code == HTTP_200_OK
+    assert response['Content-Type'] == 'application/json'
+    assert response.content == '{"Status":false,"Errors":"Не удалось авторизовать"}'.encode()
+
+    response = client.post(url, '{"email": ', content_type='application/json')
+    assert response.status_code == HTTP_400_BAD_REQUEST
@@ -0,0 +1,52 @@
+import pytest
+from django.conf import settings as django_settings
+from django.urls import reverse
+from model_bakery import baker
+
+from EShops_API.db import router
+from orders import metrics
+from orders.checkout import checkout
+from orders.models import Category
+
+
+def test_lagging_replica_is_skipped(settings, monkeypatch):
+    """
+    In this test reads go to the replica while it keeps up and to the primary when it lags behind
+    """
+    settings.DATABASE_REPLICAS = ['replica']
+    lag = {'replica': 1}
+    monkeypatch.setattr(router, 'replica_lag', lag.get)
+
+    with router.read_from_replica():
+        assert router.ReplicaRouter().db_for_read(Category) == 'replica'
+        assert router.ReplicaRouter().db_for_write(Category) == 'default'
+    assert router.ReplicaRouter().db_for_read(Category) is None
+
+    lag['replica'] = 60
+    with router.read_from_replica():
+        assert router.ReplicaRouter().db_for_read(Category) is None
+    assert metrics.snapshot()['db.replica.fallback'] == 1
+
+
+@pytest.mark.skipif('replica' not in django_settings.DATABASES,
+                    reason='needs a separate "replica" database alias, e.g. a second SQLite database')
+@pytest.mark.django_db(databases=['default', 'replica'])
+def test_seller_reads_own_writes(client, get_or_create_token_shop, shops_factory, category_factory, products_factory,
+                                 product_info_factory, order_factory, order_items_factory, settings):
+    """
+    In this test the seller report is read from the (empty) replica until the seller changes something
+    """
+    settings.DATABASE_REPLICAS = ['replica']
+    user = get_or_create_token_shop.user
+    info = product_info_factory(product=products_factory(category=category_factory()), shop=shops_factory(user=user))
+    order = order_factory(user=user)
+    order_items_factory(order=order, product_info=info, quantity=1)
+    checkout(order.id, user.id, baker.make('Contact', user=user).id)
+    client.credentials(HTTP_AUTHORIZATION='Token ' + get_or_create_token_shop.key)
+    url = reverse('orders:partners-list')
+
+    assert client.get(url).json()['results'] == []
+
+    client.post(reverse('orders:contacts-list'), data={'city': 'Moscow', 'street': 'Lenina', 'phone': '123'},
+                format='json')
+    assert len(client.get(url).json()['results']) == 1
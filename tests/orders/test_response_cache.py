@@ -0,0 +1,73 @@
+import pytest
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework.request import Request
+from rest_framework.status import HTTP_200_OK
+
+from orders import metrics
+from orders.caching import response_key, bump_versions
+
+
+@pytest.mark.django_db
+def test_shops_cache_is_invalidated_by_status(client, get_or_create_token_shop, shops_factory, category_factory,
+                                              products_factory, product_info_factory,
+                                              django_capture_on_commit_callbacks):
+    """
+    In this test the list of shops and the catalog with shops come from the cache until the seller closes the shop
+    """
+    token = get_or_create_token_shop
+    shop = shops_factory(user=token.user, state='Open')
+    category = category_factory(shop=[shop])
+    product_info_factory(product=products_factory(category=category), shop=shop)
+    client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+    url = reverse('orders:shops-list')
+    products = reverse('orders:product_info-list') + '?expand=shop'
+    by_category = f'{products}&category={category.id}'
+
+    assert client.get(url)['X-Cache'] == 'MISS'
+    for catalog in (products, by_category):
+        client.get(catalog)
+        assert client.get(catalog)['X-Cache'] == 'HIT'
+    response = client.get(url)
+    assert response['X-Cache'] == 'HIT'
+    assert [item['id'] for item in response.data['results']] == [shop.id]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        client.patch(reverse('orders:partner-detail', args=[shop.id]), data={'state': 'Closed'})
+
+    response = client.get(url)
+    assert response.status_code == HTTP_200_OK
+    assert response['X-Cache'] == 'MISS'
+    assert response.data['results'] == []
+    assert metrics.snapshot()['response_cache.hit'] == 3
+    for catalog in (products, by_category):
+        response = client.get(catalog)
+        assert response['X-Cache'] == 'MISS'
+        assert response.data['results'][0]['shop']['state'] == 'Closed'
+
+
+@pytest.mark.django_db
+def test_stale_response_while_revalidating(client, get_or_create_token, category_factory,
+                                           django_assert_max_num_queries):
+    """
+    In this test the outdated list is served without queries while another request rebuilds it
+    """
+    category_factory(name='Phones')
+    client.credentials(HTTP_AUTHORIZATION='Token ' + get_or_create_token.key)
+    url = reverse('orders:category-list')
+    response = client.get(url)
+    lock = response_key(Request(response.wsgi_request)) + ':lock'
+
+    category_factory(name='Toys')
+    bump_versions(('category', 'all'))
+    cache.add(lock, 1)
+    # only the token is read from the database
+    with django_assert_max_num_queries(1):
+        stale = client.get(url)
+    assert stale['X-Cache'] == 'STALE'
+    assert stale.data == response.data
+
+    cache.delete(lock)
+    fresh = client.get(url)
+    assert fresh['X-Cache'] == 'MISS'
+    assert fresh.data['count'] == 2
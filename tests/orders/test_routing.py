@@ -0,0 +1,64 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from EShops_API.celery import app
+from orders.models import ImportJob
+from orders.routing import configure_worker, import_queue, latency_report, stamp_enqueued, task_finished, \
+    task_started
+
+
+@pytest.mark.django_db
+def test_task_routes(create_user_shop, settings):
+    """
+    In this test mails and imports go to their own queues, every part of one import goes to the queue of its seller
+    """
+    user = create_user_shop()
+    job = ImportJob.objects.create(user=user, filename='price.yaml')
+    router = app.amqp.router
+
+    assert router.route({}, 'orders.tasks.send_confirm_token', args=(user.id,))['queue'].name == 'email'
+    assert router.route({}, 'orders.tasks.new_order', args=(user.id, {}))['queue'].name == 'notifications'
+    queues = {router.route({}, name, args=args)['queue'].name for name, args in (
+        ('orders.tasks.import_yaml', (user.id, {})), ('orders.tasks.start_import', (job.id,)),
+        ('orders.tasks.import_shard', (job.id, 3)), ('orders.tasks.finish_import', (job.id,)))}
+    assert queues == {import_queue(user.id)}
+    assert len({import_queue(seller) for seller in range(100)}) == settings.IMPORT_QUEUE_SHARDS
+
+
+def test_worker_queue_profile():
+    """
+    In this test a worker of the import queues gets one task per process without prefetch unless told otherwise
+    """
+    conf = SimpleNamespace()
+    configure_worker(conf=conf, options={'queues': 'imports.0,imports.1'})
+    assert (conf.worker_concurrency, conf.worker_prefetch_multiplier) == (4, 1)
+
+    conf = SimpleNamespace()
+    configure_worker(conf=conf, options={'queues': ['email'], 'concurrency': 8})
+    assert not hasattr(conf, 'worker_concurrency') and conf.worker_prefetch_multiplier == 4
+
+    conf = SimpleNamespace()
+    configure_worker(conf=conf, options={'queues': 'email,imports.0'})
+    assert vars(conf) == {}
+
+
+def test_task_latency_report():
+    """
+    In this test the publish header and the run signals of a task end up in the latency of its queue
+    """
+    headers = {}
+    stamp_enqueued(headers=headers)
+    task = SimpleNamespace(name='orders.tasks.send_auth_token', request=SimpleNamespace(
+        enqueued_at=headers['enqueued_at'] - 0.3, delivery_info={'routing_key': 'email'}))
+
+    task_started(task_id='1', task=task)
+    time.sleep(0.02)
+    task_finished(task_id='1', task=task)
+
+    email = latency_report()['email']
+    assert (email['wait']['count'], email['run']['count'], email['total']['count']) == (1, 1, 1)
+    assert email['wait']['p50'] == 0.5
+    assert email['run']['p50'] == 0.025
+    assert latency_report()['imports']['wait'] == {'count': 0, 'p50': None, 'p90': None, 'p99': None}
@@ -0,0 +1,23 @@
+import pytest
+from django.urls import reverse
+from rest_framework.status import HTTP_200_OK
+
+from orders.search import get_search_backend, SimpleSearchBackend
+
+
+@pytest.mark.django_db
+def test_product_search_words(client, get_or_create_token, category_factory, shops_factory, products_factory,
+                              product_info_factory):
+    """
+    In this test every word of the query has to be found in the name of the product
+    """
+    products = products_factory(_quantity=3, name=iter(['Смартфон Apple', 'Смартфон Xiaomi', 'Чехол Apple']),
+                                category=category_factory())
+    product_info_factory(_quantity=3, product=iter(products), name=iter(p.name for p in products),
+                         shop=shops_factory())
+    client.credentials(HTTP_AUTHORIZATION='Token ' + get_or_create_token.key)
+    response = client.get(reverse('orders:product_info-list'), {'search': 'Смартфон apple'})
+
+    assert isinstance(get_search_backend(), SimpleSearchBackend)
+    assert response.status_code == HTTP_200_OK
+    assert [item['name'] for item in response.data['results']] == ['Смартфон Apple']
@@ -0,0 +1,56 @@
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from model_bakery import baker
+
+from orders.checkout import checkout
+
+
+@pytest.mark.django_db
+def test_seller_reports(client, get_or_create_token_shop, shops_factory, category_factory, products_factory,
+                        product_info_factory, order_factory, order_items_factory):
+    """
+    In this test the seller sees only the lines of their own shop in orders, revenue per day and top goods,
+    and a rebuild from placed orders gives the same reports
+    """
+    seller = get_or_create_token_shop.user
+    product = products_factory(category=category_factory())
+    phone = product_info_factory(product=product, shop=shops_factory(user=seller), price=100, quantity=10)
+    case = product_info_factory(product=product, shop=phone.shop, price=10, quantity=10)
+    alien = product_info_factory(product=product, shop=shops_factory(), price=1000, quantity=10)
+    buyer = baker.make('orders.User', email='buyer@example.com')
+    orders = []
+    for items in ([(phone, 1), (case, 2), (alien, 1)], [(case, 3)]):
+        order = order_factory(user=buyer)
+        for info, quantity in items:
+            order_items_factory(order=order, product_info=info, quantity=quantity)
+        checkout(order.id, buyer.id, baker.make('Contact', user=buyer).id)
+        orders.append(order)
+    order_factory(user=buyer)
+    client.credentials(HTTP_AUTHORIZATION='Token ' + get_or_create_token_shop.key)
+    today = timezone.localdate().isoformat()
+
+    def reports():
+        return (client.get(reverse('orders:partners-list')).json()['results'],
+                client.get(reverse('orders:partner_report-list')).json(),
+                client.get(reverse('orders:partner_report-daily')).json()['results'],
+                client.get(reverse('orders:partner_report-top'), {'limit': 1}).json())
+
+    expected = (
+        [{'id': orders[1].id, 'user': buyer.id, 'total_sum': 30, 'units': 3, 'date': today},
+         {'id': orders[0].id, 'user': buyer.id, 'total_sum': 120, 'units': 3, 'date': today}],
+        {'orders': 2, 'units': 6, 'revenue': 150},
+        [{'date': today, 'orders': 2, 'units': 6, 'revenue': 150}],
+        [{'product_info': phone.id, 'name': phone.name, 'units': 1, 'revenue': 100}],
+    )
+    assert reports() == expected
+    page = client.get(reverse('orders:partners-list'), {'page_size': 1}).json()
+    assert [order['id'] for order in page['results']] == [orders[1].id]
+    assert [order['id'] for order in client.get(page['next']).json()['results']] == [orders[0].id]
+    assert client.get(reverse('orders:partner_report-list'), {'date_to': '2000-01-01'}).json()['revenue'] == 0
+    assert client.get(reverse('orders:partner_report-top'), {'limit': -1}).json() == expected[3]
+    assert client.get(reverse('orders:partner_report-top'), {'limit': 'x'}).status_code == 400
+
+    call_command('backfill_seller_reports')
+    assert reports() == expected
@@ -0,0 +1,45 @@
+import pytest
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST
+
+from orders.tasks import import_yaml
+from orders.management.commands.bench_import import make_price_list
+
+
+@pytest.mark.parametrize('fast', [True, False])
+@pytest.mark.django_db
+def test_products_sparse_fields(fast, client, get_or_create_token_shop, django_assert_max_num_queries):
+    """
+    In this test the catalog returns only the requested fields without reading parameters of the goods
+    """
+    import_yaml(get_or_create_token_shop.user_id, make_price_list(5))
+    client.credentials(HTTP_AUTHORIZATION='Token ' + get_or_create_token_shop.key)
+    url = reverse('orders:product_info-list')
+
+    with override_settings(CATALOG_FAST_SERIALIZER=fast):
+        # token, count and page
+        with django_assert_max_num_queries(3):
+            response = client.get(url, {'fields': 'id,name,price'})
+        assert response.status_code == HTTP_200_OK
+        assert set(response.data['results'][0]) == {'id', 'name', 'price'}
+
+        response = client.get(url, {'fields': 'id,shop', 'expand': 'shop'})
+        assert response.data['results'][0]['shop']['name'] == 'Benchmark shop'
+
+        assert client.get(url, {'fields': 'id,secret'}).status_code == HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_orders_sparse_fields(client, get_or_create_token, order_factory):
+    """
+    In this test carts are listed with the embedded user and without the state
+    """
+    user = get_or_create_token.user
+    order_factory(_quantity=2, user=user)
+    client.credentials(HTTP_AUTHORIZATION='Token ' + get_or_create_token.key)
+
+    response = client.get(reverse('orders:shopping_cart-all'), {'fields': 'id,user', 'expand': 'user'})
+    assert response.status_code == HTTP_200_OK
+    assert response.data[0]['user'] == {'id': user.id, 'first_name': user.first_name, 'last_name': user.last_name}
+    assert 'state' not in response.data[0]
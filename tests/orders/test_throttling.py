@@ -0,0 +1,41 @@
+import pytest
+from django.urls import reverse
+from rest_framework.status import HTTP_200_OK, HTTP_429_TOO_MANY_REQUESTS
+
+from orders import metrics
+
+
+@pytest.mark.django_db
+def test_login_is_throttled(client):
+    """
+    In this test login has its own strict 'auth' bucket: the sixth attempt in a minute gets 429 and Retry-After
+    """
+    url = reverse('orders:auth-login')
+    data = {'email': 'nobody@example.com', 'password': 'wrong'}
+    for remaining in range(4, -1, -1):
+        response = client.post(url, data)
+        assert response.status_code == HTTP_200_OK
+        assert response['X-RateLimit-Limit'] == '5'
+        assert response['X-RateLimit-Remaining'] == str(remaining)
+
+    response = client.post(url, data)
+    assert response.status_code == HTTP_429_TOO_MANY_REQUESTS
+    assert response['X-RateLimit-Remaining'] == '0'
+    assert 1 <= int(response['Retry-After']) <= 12
+    assert metrics.snapshot()['throttle.denied'] == 1
+
+
+@pytest.mark.django_db
+def test_catalog_scope(client, get_or_create_token):
+    """
+    In this test the catalog has a cheaper bucket of its own, separate from the default 'user' one
+    """
+    client.credentials(HTTP_AUTHORIZATION='Token ' + get_or_create_token.key)
+    response = client.get(reverse('orders:category-list'))
+
+    assert response.status_code == HTTP_200_OK
+    assert response['X-RateLimit-Limit'] == '120'
+    assert response['X-RateLimit-Remaining'] == '119'
+
+    response = client.get(reverse('orders:user-list'))
+    assert response['X-RateLimit-Limit'] == '20'
@@ -0,0 +1,114 @@
+import threading
+
+import pytest
+from psycopg2 import extensions
+
+from EShops_API.db.pool import ConnectionPool, PoolTimeout, get_pool
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+        self.rollbacks = 0
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def make_pool():
+    def factory(**kwargs):
+        return ConnectionPool(FakeConnection, **kwargs)
+    return factory
+
+
+def test_connection_is_reused(make_pool):
+    """
+    In this test a returned connection is handed out again instead of opening a new one
+    """
+    pool = make_pool(max_size=2, max_overflow=0)
+    first = pool.checkout()
+    first.status = extensions.TRANSACTION_STATUS_INERROR
+    pool.checkin(first)
+
+    assert first.rollbacks == 1
+    assert pool.checkout() is first
+    assert pool.stats() == {'size': 1, 'idle': 0, 'in_use': 1, 'max_size': 2, 'max_overflow': 0}
+
+
+def test_overflow_and_timeout(make_pool):
+    """
+    In this test overflow connections are closed when returned and an exhausted pool raises PoolTimeout
+    """
+    pool = make_pool(max_size=1, max_overflow=1, timeout=0.05)
+    first, second = pool.checkout(), pool.checkout()
+    with pytest.raises(PoolTimeout):
+        pool.checkout()
+
+    pool.checkin(first)
+    pool.checkin(second)
+    assert not first.closed
+    assert second.closed
+    assert pool.stats()['size'] == 1
+
+
+def test_broken_connection_is_replaced(make_pool):
+    """
+    In this test a connection closed by the server while idle is replaced by a new one on checkout
+    """
+    pool = make_pool(max_size=1, max_overflow=0)
+    first = pool.checkout()
+    pool.checkin(first)
+    first.closed = 2
+
+    second = pool.checkout()
+    assert second is not first
+    assert pool.stats()['size'] == 1
+
+
+def test_waiters_get_returned_connection(make_pool):
+    """
+    In this test a thread waiting on a full pool gets the connection as soon as it is returned
+    """
+    pool = make_pool(max_size=1, max_overflow=0, timeout=5)
+    first = pool.checkout()
+    result = []
+    waiter = threading.Thread(target=lambda: result.append(pool.checkout()))
+    waiter.start()
+    pool.checkin(first)
+    waiter.join(1)
+
+    assert result == [first]
+
+
+def test_pool_follows_connection_params():
+    """
+    In this test new connection parameters of the alias get a new pool, idle and returned connections
+    of the old one are closed
+    """
+    opened = []
+
+    def connect(params):
+        opened.append(FakeConnection())
+        opened[-1].params = params
+        return opened[-1]
+
+    old = get_pool('params-test', {}, {'dbname': 'shop'}, connect)
+    assert get_pool('params-test', {}, {'dbname': 'shop'}, connect) is old
+    idle, busy = old.checkout(), old.checkout()
+    old.checkin(idle)
+
+    new = get_pool('params-test', {}, {'dbname': 'test_shop'}, connect)
+    assert new is not old
+    assert idle.closed
+    old.checkin(busy)
+    assert busy.closed
+    assert new.checkout().params == {'dbname': 'test_shop'}